@@ -2,8 +2,8 @@ import os
 import logging
 from typing import List, Optional
 
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
@@ -11,10 +11,17 @@ from pathlib import Path
 
 import json
 from observability.setup_observer import setup_instrumentor
+from observability import metrics
+from observability.metrics import stage_timer
 from retrieval.hybridrag import HybridRAG
 from utils.embeddings import create_embeddings
-from utils.query_processor import preprocess_query
+from utils.query_processor import apreprocess_query
+from utils.gazetteer import get_gazetteer
+from utils.models import get_encoder, get_batched_reranker
+from utils import concurrency
+from utils.concurrency import run_blocking, chat_limiter, ChatQueueFull
 from langchain_agent.agents.agent_initializer import LangchainReactAgent
+from langchain_agent.memory.conversation_memory import SessionStore
 from llama_index.core import global_handler
 import uuid
 from fastapi.middleware.cors import CORSMiddleware
@@ -24,14 +31,15 @@ from sentence_transformers import SentenceTransformer
 from huggingface_hub import InferenceClient
 from flashrank import Ranker, RerankRequest
 import torch
-from bs4 import BeautifulSoup
 import re
 import os 
+import time
+from datetime import datetime, timezone
 
 from dotenv import load_dotenv
-from langchain_agent.llm.huggingface_llm import get_huggingface_llm, load_system_prompt
+from langchain_agent.llm.huggingface_llm import get_huggingface_llm, load_system_prompt, count_tokens, LLM_REPO_ID
 from langchain_core.messages import HumanMessage
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
 
 
 load_dotenv()
@@ -61,61 +69,43 @@ app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 # Set up Jinja2 templates
 templates = Jinja2Templates(directory=BASE_DIR / "templates")
 
-def clean_html(text: str) -> str:
-    """Strip HTML/JS/CSS and collapse whitespace."""
-    # remove scripts/styles
-    soup = BeautifulSoup(text, "html.parser")
-    for tag in soup(["script", "style"]):
-        tag.decompose()
-    cleaned = soup.get_text(separator=" ", strip=True)
-    # collapse any long run of whitespace/newlines into single spaces
-    cleaned = re.sub(r"\s+", " ", cleaned)
-    return cleaned
-
-def refine_rag_results(raw_results, max_chars=300):
-    """
-    1. Clean each raw HTML/text block
-    2. Dedupe identical snippets
-    3. Truncate to max_chars with an ellipsis
-    """
-    seen = set()
-    refined = []
-    for item in raw_results:
-        text = clean_html(item)
-        if not text or text in seen:
-            continue
-        seen.add(text)
-        if len(text) > max_chars:
-            text = text[: max_chars].rsplit(" ", 1)[0] + "…"
-        refined.append(text)
-    return refined
-
-
 instrumentor = setup_instrumentor()
 
-def query_with_observability(agent_executor, user_query: str,session_id,user_id, reranker, embed_model):
+async def chat_events(agent_executor, user_query: str, session_id, user_id, reranker, embed_model):
+    """
+    Run the retrieval + agent pipeline as a stream of events (dicts with a "type"):
+    "status" as each stage starts, "token" for every piece of answer text as the LLM
+    generates it, and "done" with the full answer and timings. Time-to-first-token is
+    measured from the start of the request.
+    """
+    started = time.perf_counter()
     with instrumentor.observe(trace_id=f"agent-{uuid.uuid4()}", session_id=session_id,
                                user_id='user-id', metadata={"app_version": "1.0"}) as trace:
+        # Stage timers below add their spans to this trace
+        trace_binding = metrics.bind_trace(trace)
+        outcome = "error"
         try:
             # preprocessing step
+            yield {"type": "status", "stage": "preprocess", "message": "Understanding your question…"}
+            with stage_timer("preprocess_query"):
+                processed_query, entities = await apreprocess_query(user_query)
+            logger.debug("Processed query: %s", processed_query)
 
-            processed_query, entities = preprocess_query(user_query)
-            print(f" Processed query is {processed_query}")
-     
             # Get embeddings for processed query
             #query_embeddings = create_embeddings(processed_query)
             #query_embeddings = embed_model.embed_query(user_query)
-            query_embeddings = embed_model.encode(processed_query)
-
-            hybrid_rag=HybridRAG()
-            # Retrieve with processed query and its embeddings
-            results = hybrid_rag.query_hybrid(processed_query, query_embeddings, reranker= reranker, limit=5)
-            print("Hybrid RAG Results:\n", results)
-
-            hybrid_rag.close()
-
-            raw_results = results  # your list of long HTML/text strings
-            snippets = refine_rag_results(raw_results, max_chars=200) 
+            yield {"type": "status", "stage": "retrieval", "message": "Searching restaurants and menus…"}
+            with stage_timer("embedding"):
+                # Batched with the queries of concurrent chats
+                query_embeddings = await embed_model.aencode(processed_query)
+
+            # Retrieve with processed query and its embeddings (shared retriever, opened at startup);
+            # passages come back cleaned, deduplicated and packed into the context token budget
+            snippets = await hybrid_rag.aquery_hybrid(processed_query, query_embeddings, reranker= reranker, limit=5,
+                                                     entities=entities)
+            logger.debug("Retrieved %d passages: %s", len(snippets), snippets)
+            yield {"type": "status", "stage": "generation", "passages": len(snippets),
+                   "message": f"Found {len(snippets)} relevant passages, writing the answer…"}
 
             # stringify the top-k passages into a context block
             context_block = "\n".join(f"{i+1}. {s}" for i, s in enumerate(snippets))
@@ -130,44 +120,94 @@ def query_with_observability(agent_executor, user_query: str,session_id,user_id,
 
             config= {"configurable": {"thread_id": session_id}}
 
-            response=[]
+            answer=[]
+            first_token_at=None
+            first_token_wall=None
             total_tokens=0
             input_tokens=0
             output_tokens=0
-    
-            for step in agent_executor.stream({"messages": [HumanMessage(content=full_input)]}, config, stream_mode="values"):      
-                
-                for msg in step["messages"]:
-                    response.append(msg.content)
-
-                    if "usage_metadata" in msg:
-                        total_tokens = msg["usage_metadata"].get("total_tokens", 0)
-                        input_tokens = msg["usage_metadata"].get("input_tokens", 0)
-                        output_tokens = msg["usage_metadata"].get("output_tokens", 0)
-            
-            # Combine the partial responses
-            final_response = "".join(response[-1])    
 
+            generated=[]
+
+            # "messages" mode yields LLM output chunk by chunk instead of whole graph states
+            with stage_timer("llm_stream"):
+                async for chunk, metadata in agent_executor.astream(
+                        {"messages": [HumanMessage(content=full_input)]}, config, stream_mode="messages"):
+                    if isinstance(chunk, ToolMessage):
+                        # The agent called a tool; whatever it said before that is not the answer
+                        answer = []
+                        yield {"type": "status", "stage": "tool", "message": f"Checked {chunk.name}, continuing…"}
+                        continue
+                    if not isinstance(chunk, AIMessageChunk) or metadata.get("langgraph_node") != "agent":
+                        continue
+
+                    if chunk.usage_metadata:
+                        total_tokens += chunk.usage_metadata.get("total_tokens", 0)
+                        input_tokens += chunk.usage_metadata.get("input_tokens", 0)
+                        output_tokens += chunk.usage_metadata.get("output_tokens", 0)
+
+                    text = chunk.content if isinstance(chunk.content, str) else ""
+                    if text:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            first_token_wall = datetime.now(timezone.utc)
+                            logger.info(f"Time to first token: {(first_token_at - started) * 1000:.0f} ms")
+                        answer.append(text)
+                        generated.append(text)
+                        yield {"type": "token", "text": text}
+
+            # Combine the partial responses
+            final_response = "".join(answer)
+            if not total_tokens:
+                # The inference endpoint does not report usage when streaming; count with the model's tokenizer
+                input_tokens = await run_blocking(count_tokens, full_input)
+                output_tokens = await run_blocking(count_tokens, "".join(generated))
+                total_tokens = input_tokens + output_tokens
+            ttft = first_token_at - started if first_token_at else None
+            ttft_ms = round(ttft * 1000) if ttft is not None else None
+            total_ms = round((time.perf_counter() - started) * 1000)
+            outcome = "success"
+            metrics.record_request(outcome, total_seconds=total_ms / 1000, ttft_seconds=ttft,
+                                   input_tokens=input_tokens, output_tokens=output_tokens)
 
             trace.score(name="query_success", value=1.0)
-            trace.score(name="relevance", value=0.95)
-            trace.score(name="response_quality", value=0.88)
-            trace.update(user_id=user_id,session_id=session_id, input=user_query, output=final_response,tokens=total_tokens) 
+            trace.update(user_id=user_id,session_id=session_id, input=user_query, output=final_response)
+            # Token usage and time-to-first-token belong to the LLM generation, not the trace
+            trace.generation(name="agent", model=LLM_REPO_ID, input=full_input, output=final_response,
+                             completion_start_time=first_token_wall,
+                             usage={"input": input_tokens, "output": output_tokens, "total": total_tokens, "unit": "TOKENS"})
              
             trace.update(metadata={
                 "session_id": session_id,
                 "original_query": user_query,
                 "processed_query": processed_query,
                 "entities": entities,
-                "agent_response": final_response
+                "agent_response": final_response,
+                "time_to_first_token_ms": ttft_ms,
+                "total_time_ms": total_ms,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens
             })
-            return final_response
+            yield {"type": "done", "response": final_response, "session_id": session_id,
+                   "ttft_ms": ttft_ms, "total_ms": total_ms}
         
         except Exception as e:
             trace.score(name="query_error", value=0.0)
             raise e
         finally:
-            instrumentor.flush()
+            if outcome != "success":
+                metrics.record_request(outcome, total_seconds=time.perf_counter() - started)
+            metrics.unbind_trace(trace_binding)
+            await run_blocking(instrumentor.flush)
+
+
+async def query_with_observability(agent_executor, user_query: str,session_id,user_id, reranker, embed_model):
+    """Non-streaming variant: run the pipeline and return only the final answer."""
+    final_response = ""
+    async for event in chat_events(agent_executor, user_query, session_id, user_id, reranker, embed_model):
+        if event["type"] == "done":
+            final_response = event["response"]
+    return final_response
 
 # Pydantic models
 class ChatHistoryEntry(BaseModel):
@@ -177,23 +217,43 @@ class ChatHistoryEntry(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     history: Optional[List[ChatHistoryEntry]] = []
+    # Conversation to continue; the server keeps its history. Omit to start a new one.
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
     history: List[ChatHistoryEntry]
+    session_id: str
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,128}$")
+
+
+def resolve_session_id(session_id: Optional[str]) -> str:
+    """The client's session id, or a new one when it sent none"""
+    if not session_id:
+        return str(uuid.uuid4())
+    if not SESSION_ID_RE.match(session_id):
+        raise HTTPException(status_code=400, detail="session_id must be 8-128 letters, digits, '-' or '_'")
+    return session_id
 
 
 langchain_agent = None
 reranker = None
 embed_model = None
+hybrid_rag = None
+sessions = None
 
 @app.on_event("startup")
-def load_model():
+async def load_model():
     session_id=str(uuid.uuid4())
     user_id="agampandey"
+    global sessions
+    # Conversation checkpoints (SQLite or Redis), shared by every worker
+    sessions = SessionStore()
+    checkpointer = await sessions.open()
     global langchain_agent
-    # Initialize the Langchain agent with a unique session ID
-    langchain_agent=LangchainReactAgent(session_id).get_agent()
+    # Initialize the Langchain agent; each chat continues the thread of its session_id
+    langchain_agent=LangchainReactAgent(session_id, checkpointer=checkpointer).get_agent()
     global reranker
     """
     Due to the CPU and app load limitation and slow process
@@ -208,7 +268,9 @@ def load_model():
         )
     """
   
-    reranker = Ranker(max_length=128)
+    # Shared process-wide models (already loaded when a gunicorn master preloaded them),
+    # micro-batched across concurrent chats and the ZomatoRAG tool
+    reranker = get_batched_reranker()
   
     global embed_model
     HF_TOKEN= os.getenv("HUGGINGFACE_API_KEY")
@@ -219,7 +281,23 @@ def load_model():
     embed_model = HuggingFaceEmbeddings(
             model_name="BAAI/bge-m3")
     """
-    embed_model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")  # 80MB model
+    embed_model = get_encoder()  # all-MiniLM-L6-v2, 80MB model
+
+    # Connections are opened here, per worker process
+    global hybrid_rag
+    hybrid_rag = HybridRAG()
+
+    # Compile the query gazetteer now rather than on the first chat (no-op if preloaded)
+    get_gazetteer()
+
+
+@app.on_event("shutdown")
+async def close_clients():
+    if hybrid_rag is not None:
+        await hybrid_rag.aclose()
+        hybrid_rag.close()
+    if sessions is not None:
+        await sessions.close()
     
 
 # Routes
@@ -236,21 +314,69 @@ async def chat_endpoint(payload: ChatRequest):
     user_msg = payload.message
     history = payload.history or []
     user_query = user_msg
-    session_id=str(uuid.uuid4())
+    session_id=resolve_session_id(payload.session_id)
     user_id="agampandey"
     global langchain_agent
     global reranker
     global embed_model
-    response = query_with_observability(langchain_agent,user_query, session_id,user_id, reranker, embed_model)
+    try:
+        # Bounded concurrency: excess requests wait for a slot, and are refused once the line is full
+        async with chat_limiter.slot():
+            await sessions.touch(session_id)
+            response = await query_with_observability(langchain_agent,user_query, session_id,user_id, reranker, embed_model)
+    except ChatQueueFull:
+        raise HTTPException(status_code=503, detail="Too many chats in progress, please retry shortly")
     
     logger.debug(f"Received message: {user_msg}")
     history.append(ChatHistoryEntry(role="user", content=user_msg))
 
     history.append(ChatHistoryEntry(role="assistant", content=response))
 
-    instrumentor.flush()
+    return ChatResponse(response=response, history=history, session_id=session_id)
 
-    return ChatResponse(response=response, history=history)
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(payload: ChatRequest):
+    """
+    Stream the answer as Server-Sent Events: one `data: {json}` line per pipeline event
+    (status / token / done / error), so the client can render while the LLM generates.
+    """
+    logger.debug(" Chat stream endpoint hit!")
+    user_query = payload.message
+    session_id=resolve_session_id(payload.session_id)
+    user_id="agampandey"
+    # Refuse up front while the line is full, so an overloaded server still answers 503
+    if chat_limiter.full():
+        chat_limiter.rejected += 1
+        raise HTTPException(status_code=503, detail="Too many chats in progress, please retry shortly")
+
+    async def event_stream():
+        # The slot is taken inside the body: if the client leaves before the body starts,
+        # the generator never runs and there is nothing to release
+        try:
+            async with chat_limiter.slot():
+                await sessions.touch(session_id)
+                async for event in chat_events(langchain_agent, user_query, session_id, user_id, reranker, embed_model):
+                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except ChatQueueFull:
+            # The line filled up between the check and the start of the stream
+            yield f"data: {json.dumps({'type': 'error', 'message': 'busy'})}\n\n"
+        except Exception as e:
+            logger.exception("Streaming chat failed")
+            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/stats")
+async def stats_endpoint():
+    """Chat concurrency, blocking-pool queue depths and recent per-stage latency percentiles"""
+    return {**concurrency.stats(), "latency_seconds": metrics.quantiles()}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
 
 
 
@@ -10,6 +10,10 @@ document.addEventListener('DOMContentLoaded', function() {
     // Chat history
     let chatHistory = [];
     
+    // The server keeps the conversation under this id, across reloads
+    const SESSION_KEY = 'chatSessionId';
+    let sessionId = localStorage.getItem(SESSION_KEY);
+    
     // Auto-resize textarea
     messageInput.addEventListener('input', function() {
         this.style.height = 'auto';
@@ -104,41 +108,109 @@ document.addEventListener('DOMContentLoaded', function() {
             // Show typing indicator
             showTypingIndicator();
             
-            // Process the message and generate response using the FastAPI endpoint
-            fetch('/api/chat', {
+            // Stream the response from the FastAPI endpoint (Server-Sent Events over fetch)
+            streamResponse(message, formattedHistory);
+        }
+    }
+    
+    // Read the SSE stream and render the answer as tokens arrive
+    async function streamResponse(message, formattedHistory) {
+        const startedAt = performance.now();
+        let botContent = null;
+        let botText = '';
+        
+        function handleEvent(event) {
+            switch (event.type) {
+                case 'status':
+                    if (event.stage === 'tool') {
+                        // The agent is using a tool; text so far was not the final answer
+                        botText = '';
+                        if (botContent) {
+                            botContent.innerHTML = '';
+                        }
+                    }
+                    if (!botContent) {
+                        updateTypingIndicator(event.message);
+                    }
+                    break;
+                case 'token':
+                    if (!botContent) {
+                        removeTypingIndicator();
+                        botContent = addMessage('', 'bot');
+                        console.debug(`Time to first token: ${Math.round(performance.now() - startedAt)} ms`);
+                    }
+                    botText += event.text;
+                    botContent.innerHTML = formatMessageText(botText);
+                    chatContainer.scrollTop = chatContainer.scrollHeight;
+                    break;
+                case 'done':
+                    removeTypingIndicator();
+                    botText = event.response || botText || "Sorry, I didn't understand that.";
+                    if (!botContent) {
+                        botContent = addMessage('', 'bot');
+                    }
+                    botContent.innerHTML = formatMessageText(botText);
+                    chatHistory.push({ role: 'assistant', content: botText });
+                    if (event.session_id && event.session_id !== sessionId) {
+                        sessionId = event.session_id;
+                        localStorage.setItem(SESSION_KEY, sessionId);
+                    }
+                    console.debug(`Server time to first token: ${event.ttft_ms} ms, total: ${event.total_ms} ms`);
+                    break;
+                case 'error':
+                    throw new Error(event.message);
+            }
+        }
+        
+        try {
+            const response = await fetch('/api/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({ 
                     message: message,
-                    history: formattedHistory
+                    history: formattedHistory,
+                    session_id: sessionId
                 })
-            })
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error('Network response was not ok');
+            });
+            if (response.status === 503) {
+                throw new Error('busy');
+            }
+            if (!response.ok || !response.body) {
+                throw new Error('Network response was not ok');
+            }
+            
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) {
+                    break;
                 }
-                return response.json();
-            })
-            .then(data => {
-                removeTypingIndicator();
-                const botResponse = data.response || "Sorry, I didn't understand that.";
-                addMessage(botResponse, 'bot');
-                
-                // Update chat history from response
-                chatHistory = data.history || chatHistory;
-                
-                // If history wasn't returned, add the response to our local history
-                if (!data.history) {
-                    chatHistory.push({ role: 'assistant', content: botResponse });
+                buffer += decoder.decode(value, { stream: true });
+                // Events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    const data = rawEvent.split('\n')
+                        .filter(line => line.startsWith('data:'))
+                        .map(line => line.slice(5).trim())
+                        .join('\n');
+                    if (data) {
+                        handleEvent(JSON.parse(data));
+                    }
                 }
-            })
-            .catch(error => {
-                removeTypingIndicator();
-                console.error('Error communicating with FastAPI:', error);
-                addMessage("Oops! Something went wrong. Please try again later.", 'bot');
-            });
+            }
+        } catch (error) {
+            removeTypingIndicator();
+            console.error('Error communicating with FastAPI:', error);
+            const notice = error.message === 'busy'
+                ? "We're handling a lot of requests right now. Please try again in a moment."
+                : "Oops! Something went wrong. Please try again later.";
+            addMessage(notice, 'bot');
         }
     }
     
@@ -165,6 +237,9 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Scroll to bottom
         chatContainer.scrollTop = chatContainer.scrollHeight;
+        
+        // Returned so streamed responses can keep writing into it
+        return contentDiv;
     }
     
     // Format message text (handle newlines, links, etc.)
@@ -199,6 +274,21 @@ document.addEventListener('DOMContentLoaded', function() {
         chatContainer.scrollTop = chatContainer.scrollHeight;
     }
     
+    // Show pipeline progress (e.g. "Searching restaurants…") next to the typing dots
+    function updateTypingIndicator(text) {
+        const typingContent = document.querySelector('.typing-indicator .message-content');
+        if (!typingContent || !text) {
+            return;
+        }
+        let status = typingContent.querySelector('.typing-status');
+        if (!status) {
+            status = document.createElement('div');
+            status.className = 'typing-status';
+            typingContent.appendChild(status);
+        }
+        status.textContent = text;
+    }
+    
     // Remove typing indicator
     function removeTypingIndicator() {
         const typingIndicator = document.querySelector('.typing-indicator');
@@ -218,8 +308,10 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         }
         
-        // Reset chat history
+        // Reset chat history and start a new server-side conversation
         chatHistory = [];
+        sessionId = null;
+        localStorage.removeItem(SESSION_KEY);
         
         // Add back the welcome screen
         welcomeScreen.style.display = 'block';
@@ -245,6 +337,12 @@ document.addEventListener('DOMContentLoaded', function() {
             animation: pulse 1.5s infinite ease-in-out;
         }
         
+        .typing-status {
+            margin-top: 6px;
+            font-size: 0.85em;
+            color: #86898E;
+        }
+        
         .typing-dots span:nth-child(2) {
             animation-delay: 0.2s;
         }
@@ -0,0 +1,42 @@
+"""
+Multi-worker serving: gunicorn -c gunicorn.conf.py app.api.app:app
+
+The master imports the app and loads the embedding model, reranker and tokenizer once
+(`preload_app` + `when_ready`), then forks WEB_WORKERS uvicorn workers that share those
+weights copy-on-write, so adding workers adds throughput without adding a model copy each.
+Connections (Weaviate, Neo4j, the session store) are opened per worker in the app's
+startup hook, never in the master, so no socket is shared across processes.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_WORKERS", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = 30
+# Recycle workers now and then to bound any slow leak; jitter keeps them from restarting together
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "2000"))
+max_requests_jitter = 200
+
+# Threads each worker's torch kernels may use; workers x threads should not exceed the cores
+TORCH_THREADS_PER_WORKER = int(os.getenv("TORCH_THREADS_PER_WORKER", "2"))
+
+# Tokenizer thread pools do not survive fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any worker is forked
+    from utils.models import preload
+    from utils.gazetteer import get_gazetteer
+
+    get_gazetteer()
+    preload(freeze=True)
+
+
+def post_fork(server, worker):
+    import torch
+
+    torch.set_num_threads(TORCH_THREADS_PER_WORKER)
+    server.log.info(f"Worker {worker.pid} ready with {TORCH_THREADS_PER_WORKER} torch threads")
@@ -0,0 +1,118 @@
+"""
+Content-addressed, zstd-compressed blob store for raw page bodies.
+
+Crawl rows keep only metadata in MongoDB; the large `html`, `markdown` and `media` bodies are
+written once per distinct content to `<root>/<sha[:2]>/<sha[2:4]>/<sha>.zst` and referenced from
+the row as `<field>_ref = {"sha256", "size", "codec"}`. Readers get a `LazyRecord`, which only
+fetches and decompresses a body the first time a chunker asks for it.
+"""
+import os
+import json
+import hashlib
+
+import zstandard
+
+from ingestion.datalake import content_hash
+
+BODY_FIELDS = ("html", "markdown", "media")
+BLOB_STORE_PATH = os.getenv(
+    "BLOB_STORE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "datalake_blobs")
+)
+ZSTD_LEVEL = int(os.getenv("BLOB_ZSTD_LEVEL", "10"))
+
+
+class BlobStore:
+    def __init__(self, root: str = BLOB_STORE_PATH, level: int = ZSTD_LEVEL):
+        self.root = os.path.abspath(root)
+        self.level = level
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], f"{sha256}.zst")
+
+    def put(self, data) -> dict:
+        """Store bytes/str once per distinct content and return its reference."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self._path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Compressor objects are not thread-safe, so use one per call
+            compressed = zstandard.ZstdCompressor(level=self.level).compress(data)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+        return {"sha256": sha256, "size": len(data), "codec": "zstd"}
+
+    def get(self, ref: dict) -> bytes:
+        with open(self._path(ref["sha256"]), "rb") as f:
+            return zstandard.ZstdDecompressor().decompress(f.read(), max_output_size=ref.get("size", 0))
+
+    def get_text(self, ref: dict) -> str:
+        return self.get(ref).decode("utf-8")
+
+
+_blob_store = None
+
+def get_blob_store() -> BlobStore:
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = BlobStore()
+    return _blob_store
+
+
+def offload_bodies(row: dict, store: BlobStore = None) -> dict:
+    """
+    Move a crawl row's bodies into the blob store, leaving metadata plus `<field>_ref`s.
+    The content hash is taken first so content-keyed upserts still see the real bodies.
+    """
+    store = store or get_blob_store()
+    row = dict(row)
+    row.setdefault("content_hash", content_hash(row))
+    for field in BODY_FIELDS:
+        if field not in row:
+            continue
+        value = row.pop(field)
+        if field == "media" and not isinstance(value, str):
+            value = json.dumps(value, default=str)
+        row[f"{field}_ref"] = store.put(value or "")
+    return row
+
+
+class LazyRecord(dict):
+    """
+    A record whose bodies stay in the blob store until read.
+    `record["markdown"]` / `record.get("html")` decompress on first access and cache the result.
+    """
+    def __init__(self, *args, store: BlobStore = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._store = store
+
+    def _load(self, key):
+        ref = super().get(f"{key}_ref")
+        if key in BODY_FIELDS and ref is not None and not super().__contains__(key):
+            store = self._store or get_blob_store()
+            value = store.get_text(ref)
+            if key == "media":
+                value = json.loads(value) if value else {}
+            super().__setitem__(key, value)
+
+    def __getitem__(self, key):
+        self._load(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self._load(key)
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        return super().__contains__(key) or super().__contains__(f"{key}_ref")
+
+
+def resolve_bodies(record: dict, store: BlobStore = None) -> dict:
+    """Wrap a record holding body refs in a LazyRecord; plain records pass through."""
+    if any(f"{field}_ref" in record for field in BODY_FIELDS):
+        return LazyRecord(record, store=store)
+    return record
@@ -1,9 +1,58 @@
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from pymongo import MongoClient, ASCENDING, UpdateOne
+from pymongo.errors import ConnectionFailure, BulkWriteError
+from bson import ObjectId
+from datetime import datetime
 import os
+import json
+import hashlib
 from dotenv import load_dotenv
 load_dotenv()
 
+# Rows are unique on what was crawled, not on when: re-crawling an unchanged page is a no-op
+CONTENT_KEY = ("restaurant_name", "url", "content_hash")
+
+
+def content_hash(row: dict) -> str:
+    """sha256 over the page bodies of a crawl row."""
+    h = hashlib.sha256()
+    for key in ("markdown", "html"):
+        h.update((row.get(key) or "").encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class ReadCheckpoint:
+    """
+    Resume position of a streaming read, persisted as JSON.
+    Documents are read in (timestamp, _id) order, so the last pair processed is enough to resume.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.position = None
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.position = (datetime.fromisoformat(data["timestamp"]), ObjectId(data["_id"]))
+
+    def advance(self, timestamp, _id):
+        self.position = (timestamp, _id)
+
+    def save(self):
+        if self.position is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": self.position[0].isoformat(), "_id": str(self.position[1])}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """Forget the position once a read has completed."""
+        self.position = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
 class DataLake:
     def __init__(self, db_name: str = "restaurant_data", collection_name: str = "scraped_content"):
         # Get the MongoDB Atlas URI from environment variables or hardcode it
@@ -25,13 +74,85 @@ class DataLake:
         # This method ensures the collection exists
         if self.collection.name not in self.db.list_collection_names():
             self.db.create_collection(self.collection.name)
+        self.create_indexes()
         return self.collection
 
+    def create_indexes(self):
+        """Indexes for lookups, streaming reads and content-keyed upserts (idempotent)."""
+        self.collection.create_index([("url", ASCENDING)], name="url")
+        self.collection.create_index([("restaurant_name", ASCENDING)], name="restaurant_name")
+        # Streaming reads sort and resume on (timestamp, _id)
+        self.collection.create_index([("timestamp", ASCENDING), ("_id", ASCENDING)], name="timestamp")
+        # Rows written before upserts existed have no content_hash and are left out
+        self.collection.create_index(
+            [(k, ASCENDING) for k in CONTENT_KEY],
+            name="content_key",
+            unique=True,
+            partialFilterExpression={"content_hash": {"$exists": True}},
+        )
+
     def append_rows(self, rows: list[dict]):
         if rows:
             self.collection.insert_many(rows)
         else:
             print("No data to insert.")
+
+    def upsert_rows(self, rows: list[dict], chunk_size: int = 500) -> dict:
+        """
+        Insert only content we haven't stored yet, keyed on (restaurant_name, url, content_hash).
+
+        Writes go out as unordered bulk_write batches of `chunk_size`. A row whose content is
+        already stored keeps its id and bodies, but its `timestamp` and `last_seen_at` move up
+        to the latest crawl: watermark reads filter on `timestamp`, so a page that reverts to
+        earlier content (A -> B -> A) is read again and re-indexed as A.
+
+        Returns:
+            dict: {"inserted": new rows, "updated": re-seen rows, "skipped": unchanged/duplicate rows}
+        """
+        counts = {"inserted": 0, "updated": 0, "skipped": 0}
+        if not rows:
+            print("No data to insert.")
+            return counts
+
+        # Collapse duplicates within this call; concurrent upserts of one key would collide
+        unique = {}
+        for row in rows:
+            row = dict(row)
+            row.setdefault("content_hash", content_hash(row))
+            key = tuple(row.get(k) for k in CONTENT_KEY)
+            if key in unique:
+                counts["skipped"] += 1
+            unique[key] = row
+
+        ops = []
+        for row in unique.values():
+            last_seen = row.pop("timestamp", None)
+            ops.append(UpdateOne(
+                {k: row.get(k) for k in CONTENT_KEY},
+                {"$setOnInsert": row, "$max": {"timestamp": last_seen, "last_seen_at": last_seen}},
+                upsert=True,
+            ))
+
+        for i in range(0, len(ops), chunk_size):
+            batch = ops[i:i + chunk_size]
+            try:
+                result = self.collection.bulk_write(batch, ordered=False)
+                details = result.bulk_api_result
+            except BulkWriteError as e:
+                details = e.details
+                # Another writer inserted the same content first; anything else is a real error
+                dupes = [err for err in details.get("writeErrors", []) if err.get("code") == 11000]
+                if len(dupes) != len(details.get("writeErrors", [])):
+                    raise
+                counts["skipped"] += len(dupes)
+            upserted = details.get("nUpserted", 0)
+            modified = details.get("nModified", 0)
+            matched = details.get("nMatched", 0)
+            counts["inserted"] += upserted
+            counts["updated"] += modified
+            counts["skipped"] += matched - modified
+        print(f"Upserted rows: {counts}")
+        return counts
     def find_rows(self, query: dict, projection: dict = None, limit: int = 10) -> list[dict]:
         """
         Fetch documents based on a query dictionary.
@@ -53,3 +174,58 @@ class DataLake:
             return []
     def get_all_documents(self):
         return list(self.collection.find({}))  # Optional: exclude _id
+
+    def iter_documents(self, query: dict = None, projection: dict = None, batch_size: int = 200,
+                       since: datetime = None, checkpoint: ReadCheckpoint = None,
+                       resume_after: tuple = None):
+        """
+        Stream documents through a batched cursor instead of materializing the collection.
+
+        Args:
+            query (dict): extra server-side filter
+            projection (dict): fields to fetch, e.g. {"url": 1, "markdown": 1}
+            batch_size (int): documents per round-trip; bounds client memory
+            since (datetime): only documents with timestamp > since (watermark)
+            checkpoint (ReadCheckpoint): resume after its position and advance it as documents
+                are consumed; saved every batch and when the stream ends
+            resume_after (tuple): (timestamp, _id) to resume after when the caller tracks
+                its own position instead of passing a checkpoint
+
+        Yields:
+            dict: one document at a time, in (timestamp, _id) order
+        """
+        clauses = [query] if query else []
+        if since is not None:
+            clauses.append({"timestamp": {"$gt": since}})
+        if checkpoint is not None:
+            resume_after = checkpoint.position
+        if resume_after is not None:
+            ts, last_id = resume_after
+            clauses.append({"$or": [
+                {"timestamp": {"$gt": ts}},
+                {"timestamp": ts, "_id": {"$gt": last_id}},
+            ]})
+        filt = {"$and": clauses} if len(clauses) > 1 else (clauses[0] if clauses else {})
+        if projection and any(projection.values()):
+            # The resume position needs the sort keys
+            projection = {**projection, "timestamp": 1}
+
+        cursor = self.collection.find(filt, projection)\
+                                .sort([("timestamp", 1), ("_id", 1)])\
+                                .batch_size(batch_size)
+        try:
+            for n, doc in enumerate(cursor, start=1):
+                yield doc
+                # Only advance once the consumer has come back for the next document
+                if checkpoint is not None:
+                    checkpoint.advance(doc.get("timestamp"), doc["_id"])
+                    if n % batch_size == 0:
+                        checkpoint.save()
+        finally:
+            cursor.close()
+            if checkpoint is not None:
+                checkpoint.save()
+
+    def distinct_values(self, field: str) -> list:
+        """Server-side DISTINCT, e.g. every url currently in the lake."""
+        return self.collection.distinct(field)
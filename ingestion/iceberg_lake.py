@@ -0,0 +1,184 @@
+"""
+Local lakehouse for crawl rows: PyIceberg with a SQLite catalog under `iceberg_catalog/warehouse/`.
+
+Everything runs on local disk (no Atlas, no object store): the catalog lives in
+`iceberg_catalog/warehouse/pyiceberg.db`, next to the Parquet data files it points at, so
+neither is tracked by git (CATALOG_URI / WAREHOUSE_PATH move them elsewhere).
+Rows are appended in Arrow batches into a table partitioned by restaurant and crawl day,
+and every append is a snapshot, so consumers can read only what was added since the last
+snapshot they processed.
+"""
+import os
+import json
+import logging
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyiceberg.catalog.sql import SqlCatalog
+from pyiceberg.schema import Schema
+from pyiceberg.types import NestedField, StringType, TimestamptzType
+from pyiceberg.partitioning import PartitionSpec, PartitionField
+from pyiceberg.transforms import IdentityTransform, DayTransform
+from pyiceberg.table.snapshots import Operation
+from pyiceberg.manifest import ManifestEntryStatus
+from dotenv import load_dotenv
+
+from ingestion.datalake import content_hash
+
+load_dotenv()
+
+ICEBERG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "iceberg_catalog", "warehouse"))
+CATALOG_NAME = os.getenv("CATALOG_NAME", "local_datalake")
+CATALOG_URI = os.getenv("CATALOG_URI", f"sqlite:///{os.path.join(ICEBERG_DIR, 'pyiceberg.db')}")
+WAREHOUSE_PATH = os.getenv("WAREHOUSE_PATH", f"file://{ICEBERG_DIR}")
+NAMESPACE = os.getenv("NAMESPACE", "restaurant_data")
+TABLE_NAME = os.getenv("TABLE_NAME", "scraped_content")
+
+SCHEMA = Schema(
+    NestedField(1, "id", StringType(), required=False),
+    NestedField(2, "restaurant_name", StringType(), required=False),
+    NestedField(3, "scraper_name", StringType(), required=False),
+    NestedField(4, "url", StringType(), required=False),
+    NestedField(5, "markdown", StringType(), required=False),
+    NestedField(6, "html", StringType(), required=False),
+    NestedField(7, "media", StringType(), required=False),  # JSON-encoded
+    NestedField(8, "content_hash", StringType(), required=False),
+    NestedField(9, "timestamp", TimestamptzType(), required=False),
+)
+PARTITION_SPEC = PartitionSpec(
+    PartitionField(source_id=2, field_id=1000, transform=IdentityTransform(), name="restaurant_name"),
+    PartitionField(source_id=9, field_id=1001, transform=DayTransform(), name="crawl_day"),
+)
+ARROW_SCHEMA = pa.schema([
+    pa.field("id", pa.string()),
+    pa.field("restaurant_name", pa.string()),
+    pa.field("scraper_name", pa.string()),
+    pa.field("url", pa.string()),
+    pa.field("markdown", pa.string()),
+    pa.field("html", pa.string()),
+    pa.field("media", pa.string()),
+    pa.field("content_hash", pa.string()),
+    pa.field("timestamp", pa.timestamp("us", tz="UTC")),
+])
+
+
+def _to_utc(ts):
+    if isinstance(ts, str):
+        try:
+            ts = datetime.fromisoformat(ts)
+        except ValueError:
+            ts = None
+    if not isinstance(ts, datetime):
+        return datetime.now(timezone.utc)
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+class IcebergDataLake:
+    def __init__(self, catalog_name: str = CATALOG_NAME, warehouse_path: str = None,
+                 namespace: str = NAMESPACE, table_name: str = TABLE_NAME, catalog_uri: str = None):
+        warehouse_path = warehouse_path or WAREHOUSE_PATH
+        if "://" not in warehouse_path:
+            warehouse_path = f"file://{os.path.abspath(warehouse_path)}"
+        if warehouse_path.startswith("file://"):
+            os.makedirs(warehouse_path[len("file://"):], exist_ok=True)
+        catalog_uri = catalog_uri or CATALOG_URI
+        if catalog_uri.startswith("sqlite:///"):
+            # SQLite creates the database file, not its directory
+            os.makedirs(os.path.dirname(catalog_uri[len("sqlite:///"):]) or ".", exist_ok=True)
+
+        self.catalog = SqlCatalog(
+            catalog_name,
+            uri=catalog_uri,
+            warehouse=warehouse_path,
+        )
+        self.namespace = namespace
+        self.table_identifier = (namespace, table_name)
+        print(f"Loaded Iceberg catalog '{catalog_name}' at '{warehouse_path}'")
+
+    def create_table(self, identifier=None):
+        """Create the namespace and partitioned table if needed and return the table."""
+        identifier = tuple(identifier or self.table_identifier)
+        self.catalog.create_namespace_if_not_exists(identifier[0])
+        return self.catalog.create_table_if_not_exists(
+            identifier, schema=SCHEMA, partition_spec=PARTITION_SPEC
+        )
+
+    def load_table(self, identifier=None):
+        return self.catalog.load_table(tuple(identifier or self.table_identifier))
+
+    # --- Writes ---
+    @staticmethod
+    def rows_to_arrow(rows: list[dict]) -> pa.Table:
+        columns = {field.name: [] for field in ARROW_SCHEMA}
+        for row in rows:
+            media = row.get("media", {})
+            columns["id"].append(row.get("id"))
+            columns["restaurant_name"].append(row.get("restaurant_name"))
+            columns["scraper_name"].append(row.get("scraper_name"))
+            columns["url"].append(row.get("url"))
+            columns["markdown"].append(row.get("markdown", ""))
+            columns["html"].append(row.get("html", ""))
+            columns["media"].append(media if isinstance(media, str) else json.dumps(media, default=str))
+            columns["content_hash"].append(row.get("content_hash") or content_hash(row))
+            columns["timestamp"].append(_to_utc(row.get("timestamp")))
+        return pa.Table.from_pydict(columns, schema=ARROW_SCHEMA)
+
+    def append_rows(self, table, rows: list[dict], batch_size: int = 1000):
+        """
+        Append rows in Arrow batches inside one transaction, so a failed ingest leaves no
+        partial snapshot behind. Returns the id of the resulting snapshot.
+        """
+        if not rows:
+            print("No data to insert.")
+            return None
+        with table.transaction() as tx:
+            for i in range(0, len(rows), batch_size):
+                tx.append(self.rows_to_arrow(rows[i:i + batch_size]))
+        snapshot = table.current_snapshot()
+        print(f"Appended {len(rows)} rows to {'.'.join(self.table_identifier)} (snapshot {snapshot.snapshot_id})")
+        return snapshot.snapshot_id
+
+    # --- Reads ---
+    @staticmethod
+    def current_snapshot_id(table):
+        snapshot = table.current_snapshot()
+        return snapshot.snapshot_id if snapshot else None
+
+    def iter_batches_since(self, table, after_snapshot_id=None, columns: list[str] = None):
+        """
+        Yield RecordBatches of the rows added after `after_snapshot_id` (all rows if None).
+
+        Walks the snapshot lineage back to the watermark and reads only the data files those
+        append snapshots added. If anything other than appends happened in between, falls
+        back to a full scan of the current table.
+        """
+        table.refresh()
+        lineage = []
+        snapshot = table.current_snapshot()
+        while snapshot is not None and snapshot.snapshot_id != after_snapshot_id:
+            lineage.append(snapshot)
+            parent = snapshot.parent_snapshot_id
+            snapshot = table.snapshot_by_id(parent) if parent is not None else None
+
+        if after_snapshot_id is not None and snapshot is None:
+            logging.warning(f"Snapshot {after_snapshot_id} is not an ancestor of the current table; full scan")
+            lineage = None
+        elif any(s.summary is None or s.summary.operation != Operation.APPEND for s in lineage):
+            logging.warning("Non-append snapshots since the watermark; full scan")
+            lineage = None
+
+        if lineage is None:
+            scan = table.scan(selected_fields=tuple(columns) if columns else ("*",))
+            yield from scan.to_arrow_batch_reader()
+            return
+
+        for snap in reversed(lineage):
+            for manifest in snap.manifests(table.io):
+                if manifest.added_snapshot_id != snap.snapshot_id:
+                    continue
+                for entry in manifest.fetch_manifest_entry(table.io):
+                    if entry.status != ManifestEntryStatus.ADDED:
+                        continue
+                    with table.io.new_input(entry.data_file.file_path).open() as f:
+                        yield from pq.ParquetFile(f).iter_batches(columns=columns)
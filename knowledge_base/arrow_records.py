@@ -0,0 +1,44 @@
+"""
+Row views over pyarrow RecordBatches for the chunkers.
+
+Chunkers only ever read a couple of fields (semantic chunking reads `markdown`, hierarchical
+reads `html`), so instead of turning every row into a dict of Python strings up front, an
+`ArrowRecord` converts a column value the first time it is accessed. The batch itself is
+never copied.
+"""
+from collections.abc import Mapping
+
+import pyarrow as pa
+
+
+class ArrowRecord(Mapping):
+    """Read-only, lazily converted view of one row of a RecordBatch."""
+    __slots__ = ("_batch", "_row", "_cache")
+
+    def __init__(self, batch: pa.RecordBatch, row: int):
+        self._batch = batch
+        self._row = row
+        self._cache = {}
+
+    def __getitem__(self, key):
+        if key not in self._cache:
+            idx = self._batch.schema.get_field_index(key)
+            if idx < 0:
+                raise KeyError(key)
+            self._cache[key] = self._batch.column(idx)[self._row].as_py()
+        return self._cache[key]
+
+    def __contains__(self, key):
+        return self._batch.schema.get_field_index(key) >= 0
+
+    def __iter__(self):
+        return iter(self._batch.schema.names)
+
+    def __len__(self):
+        return self._batch.num_columns
+
+
+def iter_batch_records(batch: pa.RecordBatch):
+    """Yield an ArrowRecord per row of the batch."""
+    for row in range(batch.num_rows):
+        yield ArrowRecord(batch, row)
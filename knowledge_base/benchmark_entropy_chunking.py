@@ -0,0 +1,48 @@
+"""
+Benchmark the legacy per-record TfidfVectorizer entropy chunker against the windowed,
+corpus-IDF chunker on the records currently in the datalake.
+
+    python ./knowledge_base/benchmark_entropy_chunking.py
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import asyncio
+import statistics
+
+from knowledge_base.fetch_datalake import DataLakeFetcher
+from knowledge_base.normalize_records import normalize_records
+from knowledge_base.corpus_stats import CorpusIDF, build_idf
+from knowledge_base.chunking import entropy_based_chunking, windowed_entropy_chunking
+
+
+def run(name, fn, records):
+    timings, sizes, n_chunks = [], [], 0
+    for rec in records:
+        start = time.perf_counter()
+        chunks = fn(rec)
+        timings.append(time.perf_counter() - start)
+        n_chunks += len(chunks)
+        sizes.extend(len(c["text"]) for c in chunks)
+    print(
+        f"{name:<10} total={sum(timings) * 1000:9.1f} ms  "
+        f"per_record={statistics.mean(timings) * 1000:7.2f} ms  "
+        f"chunks={n_chunks:5d}  "
+        f"chunk_chars median={statistics.median(sizes) if sizes else 0:7.0f} "
+        f"max={max(sizes) if sizes else 0}"
+    )
+
+
+if __name__ == "__main__":
+    raw = DataLakeFetcher().fetch_records_from_mongodbatlas()
+    records = asyncio.run(normalize_records(raw))
+    print(f"Benchmarking on {len(records)} datalake records")
+
+    start = time.perf_counter()
+    idf = CorpusIDF.load() or build_idf(records)
+    print(f"IDF ready over {idf.n_docs} documents in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    run("legacy", entropy_based_chunking, records)
+    run("windowed", lambda rec: windowed_entropy_chunking(rec, idf=idf), records)
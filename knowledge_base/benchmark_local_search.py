@@ -0,0 +1,74 @@
+"""
+Benchmark in-process retrieval on a local index version: vector-only, BM25-only and both
+fusion modes, plus (optionally) Weaviate hybrid search for the same queries.
+
+    VECTOR_BACKEND=local python ./knowledge_base/build_knowledgebase.py   # build it first
+    python ./knowledge_base/benchmark_local_search.py "paneer tikka under ₹300" "veg biryani"
+    python ./knowledge_base/benchmark_local_search.py --version 3 --weaviate "butter chicken"
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import argparse
+import statistics
+
+from knowledge_base.vector_store import LocalVectorBackend, WeaviateVectorBackend
+from knowledge_base.embeddings import embed_model
+
+DEFAULT_QUERIES = ["paneer butter masala", "veg biryani under ₹250", "dal makhni", "gulab jamun dessert"]
+
+
+def run(name, fn, queries, repeat):
+    timings = []
+    for q in queries:
+        fn(q)  # warm-up
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(q)
+            timings.append(time.perf_counter() - start)
+    print(f"{name:<14} median={statistics.median(timings) * 1000:8.3f} ms  "
+          f"p95={sorted(timings)[int(len(timings) * 0.95) - 1] * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES)
+    parser.add_argument("--version", type=int, default=None, help="index version (default: newest local)")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--weaviate", action="store_true", help="also time Weaviate hybrid search")
+    args = parser.parse_args()
+
+    backend = LocalVectorBackend()
+    versions = backend.list_versions()
+    if not versions:
+        sys.exit("No local index found; build one with VECTOR_BACKEND=local first")
+    version = args.version if args.version is not None else versions[-1]
+    index = backend.index(version)
+
+    start = time.perf_counter()
+    print(f"Loaded version {version}: {len(index)} chunks in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    vectors = {q: embed_model.encode(q) for q in args.queries}
+
+    run("vector", lambda q: index.search(vectors[q], args.limit), args.queries, args.repeat)
+    run("bm25", lambda q: index.keyword_search(q, args.limit), args.queries, args.repeat)
+    run("hybrid alpha", lambda q: index.hybrid_search(q, vectors[q], args.limit, fusion="alpha"),
+        args.queries, args.repeat)
+    run("hybrid rrf", lambda q: index.hybrid_search(q, vectors[q], args.limit, fusion="rrf"),
+        args.queries, args.repeat)
+    if args.weaviate:
+        weaviate_backend = WeaviateVectorBackend()
+        run("weaviate", lambda q: weaviate_backend.search(version, q, vectors[q], args.limit),
+            args.queries, args.repeat)
+        weaviate_backend.close()
+
+    for q in args.queries:
+        top = index.hybrid_search(q, vectors[q], 3)
+        print(f"\n{q!r}")
+        for hit in top:
+            text = (hit["properties"].get("markdown") or "")[:90].replace("\n", " ")
+            print(f"  {hit['score']:.3f}  {text}")
+    backend.close()
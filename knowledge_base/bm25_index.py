@@ -0,0 +1,268 @@
+"""
+Local BM25 keyword index over chunk text, to pair with the embedded vector backend.
+
+- Tokenizer tuned for menus: prices in any of "₹320", "Rs. 320", "INR 320", "320/-" become
+  one token "₹320"; Hindi transliterations are folded ("panner"/"paneer" -> "paner",
+  "daal"/"dhal" -> "dal", "biriyani" -> "biryani"), Devanagari words are kept whole, and
+  adjacent words also index as a bigram ("butter_chicken") so dish names match as phrases.
+- Postings are compact: per term a bytearray of varint-encoded (doc-id delta, tf) pairs.
+  Documents get increasing internal ids, so adding one only appends to its terms' lists;
+  removals are tombstones until `compact()`.
+- `fuse_alpha` / `fuse_rrf` combine keyword and vector rankings in-process.
+"""
+import os
+import re
+import math
+import unicodedata
+from array import array
+
+import numpy as np
+
+PRICE_RE = re.compile(r"(?:₹|\brs\.?|\binr)\s*(\d+(?:[.,]\d+)?)|\b(\d+(?:\.\d+)?)\s*/-", re.IGNORECASE)
+WORD_RE = re.compile(r"[0-9a-zऀ-ॿ]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or our the this to was were "
+    "with we you your all any can get more also".split()
+)
+# Decoded postings kept for hot query terms
+DECODE_CACHE_TERMS = 4096
+# Irregular romanizations that letter-run collapsing alone does not unify
+TRANSLITERATIONS = {
+    "biriyani": "biryani", "briyani": "biryani", "biriani": "biryani",
+    "dhal": "dal", "makhni": "makhani", "chhole": "chole", "cholay": "chole",
+    "ghosht": "gosht", "kofte": "kofta", "pakode": "pakora", "pakoda": "pakora",
+    "samose": "samosa", "rotis": "roti", "nans": "nan", "kulche": "kulcha", "dosai": "dosa",
+}
+
+
+def fold_word(word: str) -> str:
+    """Collapse repeated letters and map known spelling variants of Hindi dish words."""
+    if not word.isascii() or not word.isalpha():
+        return word
+    folded = re.sub(r"(.)\1+", r"\1", word)
+    return TRANSLITERATIONS.get(word, TRANSLITERATIONS.get(folded, folded))
+
+
+def tokenize(text: str, bigrams: bool = True) -> list[str]:
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens = []
+
+    def _price(m):
+        amount = (m.group(1) or m.group(2)).replace(",", "")
+        tokens.append(f"₹{int(float(amount))}")
+        return " "
+
+    text = PRICE_RE.sub(_price, text)
+    words = [fold_word(w) for w in WORD_RE.findall(text) if w not in STOPWORDS]
+    tokens.extend(words)
+    if bigrams:
+        tokens.extend(f"{a}_{b}" for a, b in zip(words, words[1:]) if not (a.isdigit() or b.isdigit()))
+    return tokens
+
+
+# --- Varint postings ---
+def _put_varint(buf: bytearray, n: int):
+    while n >= 0x80:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def _decode_varints(buf) -> list[int]:
+    out, n, shift = [], 0, 0
+    for byte in buf:
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            out.append(n)
+            n, shift = 0, 0
+    return out
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}          # term -> bytearray of varint (delta, tf) pairs
+        self.last_doc = {}          # term -> last internal doc id appended
+        self.doc_freq = {}          # term -> number of docs (tombstoned included until compact)
+        self.doc_ids = []           # internal id -> chunk_id
+        self.doc_lens = array("I")  # internal id -> token count
+        self.internal = {}          # chunk_id -> live internal id
+        self.deleted = set()
+        self.total_len = 0
+        self._decoded = {}          # term -> (docs, tfs) arrays, dropped when the term changes
+
+    def __len__(self):
+        return len(self.internal)
+
+    # --- Updates ---
+    def add(self, chunk_id: str, text: str):
+        """Index a chunk; re-adding a chunk id replaces its previous text."""
+        self.remove(chunk_id)
+        doc = len(self.doc_ids)
+        tokens = tokenize(text)
+        tf = {}
+        for token in tokens:
+            tf[token] = tf.get(token, 0) + 1
+        for term, count in tf.items():
+            buf = self.postings.get(term)
+            if buf is None:
+                buf = self.postings[term] = bytearray()
+            _put_varint(buf, doc - self.last_doc.get(term, 0))
+            _put_varint(buf, count)
+            self._decoded.pop(term, None)
+            self.last_doc[term] = doc
+            self.doc_freq[term] = self.doc_freq.get(term, 0) + 1
+        self.doc_ids.append(chunk_id)
+        self.doc_lens.append(len(tokens))
+        self.internal[chunk_id] = doc
+        self.total_len += len(tokens)
+
+    def remove(self, chunk_id: str):
+        doc = self.internal.pop(chunk_id, None)
+        if doc is not None:
+            self.deleted.add(doc)
+            self.total_len -= self.doc_lens[doc]
+
+    def _decode(self, term: str):
+        cached = self._decoded.get(term)
+        if cached is None:
+            values = _decode_varints(self.postings[term])
+            cached = (np.cumsum(np.asarray(values[0::2], dtype=np.int64)),
+                      np.asarray(values[1::2], dtype=np.float32))
+            if len(self._decoded) >= DECODE_CACHE_TERMS:
+                self._decoded.clear()
+            self._decoded[term] = cached
+        return cached
+
+    def compact(self):
+        """Rebuild postings without tombstoned documents."""
+        live = sorted(self.internal.items(), key=lambda kv: kv[1])
+        remap = {old: new for new, (_, old) in enumerate(live)}
+        postings, last_doc, doc_freq = {}, {}, {}
+        for term in self.postings:
+            docs, tfs = self._decode(term)
+            buf, prev = bytearray(), 0
+            for doc, tf in zip(docs.tolist(), tfs.tolist()):
+                if doc not in remap:
+                    continue
+                new = remap[doc]
+                _put_varint(buf, new - prev)
+                _put_varint(buf, int(tf))
+                prev = new
+                doc_freq[term] = doc_freq.get(term, 0) + 1
+            if buf:
+                postings[term], last_doc[term] = buf, prev
+        self.postings, self.last_doc, self.doc_freq = postings, last_doc, doc_freq
+        self.doc_ids = [chunk_id for chunk_id, _ in live]
+        self.doc_lens = array("I", (self.doc_lens[old] for _, old in live))
+        self.internal = {chunk_id: i for i, chunk_id in enumerate(self.doc_ids)}
+        self.deleted = set()
+        self._decoded = {}
+
+    # --- Search ---
+    def search(self, query: str, limit: int = 10, allowed=None) -> list[tuple[str, float]]:
+        """Top `limit` (chunk_id, bm25 score) pairs, only among `allowed` chunk ids if given."""
+        n_live = len(self.internal)
+        if not n_live:
+            return []
+        avgdl = self.total_len / n_live or 1.0
+        lens = np.frombuffer(self.doc_lens, dtype=np.uint32).astype(np.float32)
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            # doc_freq still counts tombstoned docs until compact(); keep idf positive
+            df = min(self.doc_freq[term], n_live)
+            idf = math.log(1 + (n_live - df + 0.5) / (df + 0.5))
+            docs, tfs = self._decode(term)
+            norm = self.k1 * (1 - self.b + self.b * lens[docs] / avgdl)
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        if self.deleted:
+            scores[list(self.deleted)] = 0.0
+        if allowed is not None:
+            keep = np.zeros(len(scores), dtype=bool)
+            keep[[self.internal[c] for c in allowed if c in self.internal]] = True
+            scores[~keep] = 0.0
+        k = min(limit, int(np.count_nonzero(scores > 0)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.doc_ids[i], float(scores[i])) for i in top]
+
+    # --- Persistence ---
+    def save(self, path: str, **extra):
+        """Write the index to one .npz; `extra` scalars (e.g. the log offset covered) ride along."""
+        terms = list(self.postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self.postings[t]) for t in terms])
+        blob = b"".join(bytes(self.postings[t]) for t in terms)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            terms=np.array(terms, dtype=str),
+            offsets=offsets,
+            postings=np.frombuffer(blob, dtype=np.uint8),
+            last_doc=np.array([self.last_doc[t] for t in terms], dtype=np.int64),
+            doc_freq=np.array([self.doc_freq[t] for t in terms], dtype=np.int64),
+            doc_ids=np.array(self.doc_ids, dtype=str),
+            doc_lens=np.frombuffer(self.doc_lens, dtype=np.uint32),
+            deleted=np.array(sorted(self.deleted), dtype=np.int64),
+            params=np.array([self.k1, self.b]),
+            **{k: np.array(v) for k, v in extra.items()},
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Return (index, extras) or (None, {}) if there is no saved index."""
+        if not os.path.exists(path):
+            return None, {}
+        data = np.load(path)
+        k1, b = data["params"]
+        index = cls(k1=float(k1), b=float(b))
+        blob = data["postings"].tobytes()
+        offsets = data["offsets"]
+        for i, term in enumerate(data["terms"].tolist()):
+            index.postings[term] = bytearray(blob[offsets[i]:offsets[i + 1]])
+            index.last_doc[term] = int(data["last_doc"][i])
+            index.doc_freq[term] = int(data["doc_freq"][i])
+        index.doc_ids = data["doc_ids"].tolist()
+        index.doc_lens = array("I", data["doc_lens"].tolist())
+        index.deleted = set(data["deleted"].tolist())
+        index.internal = {c: i for i, c in enumerate(index.doc_ids) if i not in index.deleted}
+        index.total_len = sum(index.doc_lens[i] for i in index.internal.values())
+        known = {"terms", "offsets", "postings", "last_doc", "doc_freq", "doc_ids", "doc_lens", "deleted", "params"}
+        extras = {k: data[k].item() for k in data.files if k not in known}
+        return index, extras
+
+
+# --- Fusion ---
+def fuse_rrf(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """Reciprocal rank fusion of several ranked id lists."""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def fuse_alpha(vector_hits: list[tuple[str, float]], keyword_hits: list[tuple[str, float]],
+               alpha: float = 0.25) -> list[tuple[str, float]]:
+    """
+    Weaviate-style relative score fusion: each list is min-max normalized and combined as
+    alpha * vector + (1 - alpha) * keyword (alpha=1 is pure vector, 0 pure keyword).
+    """
+    def _normalized(hits):
+        if not hits:
+            return {}
+        values = [s for _, s in hits]
+        lo, hi = min(values), max(values)
+        return {c: (s - lo) / (hi - lo) if hi > lo else 1.0 for c, s in hits}
+
+    vec, kw = _normalized(vector_hits), _normalized(keyword_hits)
+    scores = {c: alpha * vec.get(c, 0.0) + (1 - alpha) * kw.get(c, 0.0) for c in vec.keys() | kw.keys()}
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
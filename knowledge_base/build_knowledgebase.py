@@ -18,34 +18,70 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from knowledge_base.fetch_datalake import DataLakeFetcher
-from knowledge_base.normalize_records import normalize_records
+from knowledge_base.normalize_records import NormalizeStats, aiter_sync, normalize_stream
 from knowledge_base.chunking import chunk_record
-from knowledge_base.embeddings import generate_embeddings
+from knowledge_base.captioning import flush_captioner
+from knowledge_base.embeddings import generate_embeddings, EMBED_MODEL_NAME
 from knowledge_base.hybrid_rag import HybridRAG
+from knowledge_base.index_manifest import IndexManifest, page_hash, MANIFEST_PATH
+from knowledge_base.corpus_stats import CorpusIDF, build_idf
+from knowledge_base.near_dedup import NearDuplicateIndex
+from knowledge_base.chunk_ledger import ChunkLedger, SINKS
+from knowledge_base.text_cleaning import clean_chunk_text
+from ingestion.datalake import ReadCheckpoint
+from ingestion.blob_store import resolve_bodies
 from transformers import pipeline
 import asyncio
 import hashlib
+from datetime import datetime
 from tqdm import tqdm
 
+# "incremental" (default) only indexes new/changed pages into the live index version;
+# "full" rebuilds into a fresh version and flips the serving alias once it validates
+BUILD_MODE = os.getenv("KB_BUILD_MODE", "incremental")
+KEEP_VERSIONS = int(os.getenv("KB_KEEP_VERSIONS", "2"))
+# Resume point of the datalake read; removed once a build completes
+READ_CHECKPOINT_PATH = os.path.join(os.path.dirname(MANIFEST_PATH), "read_checkpoint.json")
+# Keep the near-duplicate index between incremental runs (KB_NEAR_DUP_THRESHOLD sets similarity)
+NEAR_DUP_PERSIST = os.getenv("KB_NEAR_DUP_PERSIST", "1") == "1"
+
 # 1. Fetch & normalize
 datalake = DataLakeFetcher()
-hybrid_rag = HybridRAG()
-raw_processed = datalake.fetch_records_from_mongodbatlas()
-print(f" raw processed:", raw_processed.keys())
+ledger = ChunkLedger()
+# A full rebuild that crashed resumes into the version it had started
+resume_version = ledger.unfinished_build("full") if BUILD_MODE == "full" else None
+hybrid_rag = HybridRAG(fresh_version=(BUILD_MODE == "full"), version=resume_version)
+ledger.start_build(hybrid_rag.version, BUILD_MODE)
+if resume_version is not None:
+    print(f"Resuming interrupted full build into version {resume_version}")
+manifest = IndexManifest()
+if BUILD_MODE == "full" or manifest.version != hybrid_rag.version:
+    manifest.reset(version=hybrid_rag.version)
+run_stats = manifest.start_run(BUILD_MODE)
+# The ledger knows which sinks already hold each chunk, so reruns only push what is missing.
+# Versions written before the ledger existed are adopted from the sinks once.
+if not ledger.has_version(hybrid_rag.version):
+    ledger.seed(hybrid_rag.version, *hybrid_rag.existing_chunk_ids(), embed_model=EMBED_MODEL_NAME)
+# Near-duplicates are dropped before they cost an embedding and two writes
+near_dups = NearDuplicateIndex.load() if NEAR_DUP_PERSIST and BUILD_MODE != "full" else NearDuplicateIndex()
+
+# Incremental runs only read documents crawled after the last indexed watermark.
+# Records are streamed from a batched cursor, so memory stays flat as the lake grows.
+since = None
+if BUILD_MODE != "full" and manifest.watermark:
+    since = datetime.fromisoformat(manifest.watermark)
+# The checkpoint follows what has been indexed, not what the prefetching reader has read
+read_checkpoint = ReadCheckpoint(READ_CHECKPOINT_PATH) if BUILD_MODE != "full" else None
+normalize_stats = NormalizeStats()
 
-print(f"Loaded processed data from DataLake MongoDB Atlas")
-normalized = asyncio.run(normalize_records(raw_processed))
+def stream_normalized():
+    """Normalized record batches; the Mongo cursor is read ahead on a worker thread."""
+    docs = datalake.iter_records_from_mongodbatlas(
+        since=since, resume_after=read_checkpoint.position if read_checkpoint else None
+    )
+    return normalize_stream(aiter_sync(docs), stats=normalize_stats)
 
-# assume `normalized` is your list of dicts
-if not normalized:
-    print("No records to show")
-else:
-    sample = normalized[0]           # get the first dict
-    for k, v in sample.items():      # now you can call .items()
-        t = type(v).__name__
-        # if it’s a sequence, show its length
-        size = f"len={len(v)}" if isinstance(v, (str, list, dict)) else ""
-        print(f"{k!r}: {t} {size}")
+print(f"Streaming processed data from DataLake MongoDB Atlas (since={since})")
 
 
 """
@@ -72,6 +108,12 @@ normalized = [
 ]
 """
 
+# Corpus IDF used by entropy chunking: one streaming pass, persisted for later runs
+if BUILD_MODE == "full" or CorpusIDF.load() is None:
+    # Offloaded bodies (DATALAKE_BODY_STORAGE=blob) live behind markdown_ref; read them one at a time
+    idf_records = datalake.iter_records_from_mongodbatlas(fields=["restaurant_name", "markdown", "markdown_ref"])
+    build_idf(resolve_bodies(doc) for doc in idf_records).save()
+
 print("Now creating KnowledgeBase from normalized records")
 
 # 4. Define chunking strategies in order of priority
@@ -95,12 +137,13 @@ Chunks will have these values
  'timestamp': datetime.datetime(2025, 4, 22, 8, 39, 58, 889000), 'prices': [], 'diet': []}}
 """
 
-def dedupe_and_add(chunks, seen_hashes,strat):
+def dedupe_and_add(chunks, seen_hashes, strat, page_chunk_ids):
     for ch in chunks:
         if not isinstance(ch, dict) or strat=="graph":
             print(f"Skipping chunk, not a dict or is a Grpah")
             continue
-        text = ch["text"].strip()
+        # Clean once here, so retrieval serves the stored text without re-parsing it
+        text = clean_chunk_text(ch["text"])
         if not text:
             continue
         fp = hashlib.sha256(text.encode()).hexdigest()
@@ -111,13 +154,66 @@ def dedupe_and_add(chunks, seen_hashes,strat):
         # Attach stable ID
         restaurant = ch["metadata"]["restaurant_name"]
         url = ch["metadata"]["url"]
-        ch["metadata"]["chunk_id"] = f"{restaurant}_{url}_{fp}"
+        chunk_id = f"{restaurant}_{url}_{fp}"
+        ch["metadata"]["chunk_id"] = chunk_id
         ch["metadata"]["markdown"] = text
+        # Suppressed duplicates still belong to their page, so they can replace the original later
+        page_chunk_ids.add(chunk_id)
+        dup_of = near_dups.check(restaurant, chunk_id, text)
+        if dup_of is not None and ledger.pending_sinks(chunk_id, hybrid_rag.version,
+                                                       EMBED_MODEL_NAME) == set(SINKS):
+            # Only a chunk that was never written may stand by as a duplicate; one already in
+            # the sinks stays indexed, or nothing would ever tombstone it
+            run_stats["chunks_near_dup"] += 1
+            ledger.record_duplicate(chunk_id, hybrid_rag.version, dup_of,
+                                    {"text": text, "metadata": ch["metadata"]}, strat)
+            continue
+        write_chunk(ch, text, fp, strat)
 
+
+def write_chunk(ch, text, fp, strat):
+    """Embed and push a chunk into the sinks that don't have it yet."""
+    chunk_id = ch["metadata"]["chunk_id"]
+    pending = ledger.pending_sinks(chunk_id, hybrid_rag.version, EMBED_MODEL_NAME)
+    if not pending:
+        return
+    ledger.record(chunk_id, hybrid_rag.version, fp, EMBED_MODEL_NAME,
+                  ch["metadata"]["url"], ch["metadata"]["restaurant_name"])
+    if "vector" in pending:
         # Generate embeddings list of dicts
         embeddings = generate_embeddings(text, ch["metadata"])
         hybrid_rag.push_vector_data(embeddings, strat)
+        ledger.mark_written(chunk_id, hybrid_rag.version, "vector", embed_model=EMBED_MODEL_NAME)
+        run_stats["chunks_added"] += 1
+    if "graph" in pending:
         hybrid_rag.push_graph_data(ch, strat)
+        ledger.mark_written(chunk_id, hybrid_rag.version, "graph")
+
+
+def retire_chunks(chunk_ids):
+    """
+    Tombstone chunks of changed or removed pages, then index the surviving near-duplicates
+    that had been suppressed in their favour.
+    """
+    chunk_ids = set(chunk_ids)
+    if not chunk_ids:
+        return
+    near_dups.remove(chunk_ids)
+    # Suppressed duplicates were never written anywhere; they only leave the ledger
+    indexed = chunk_ids - ledger.forget_duplicates(chunk_ids, hybrid_rag.version)
+    run_stats["chunks_tombstoned"] += hybrid_rag.tombstone_chunks(list(indexed))
+    ledger.mark_tombstoned(indexed, hybrid_rag.version)
+
+    for chunk_id, chunk, strat in ledger.duplicates_of(indexed, hybrid_rag.version):
+        ledger.forget_duplicates([chunk_id], hybrid_rag.version)
+        metadata = chunk["metadata"]
+        dup_of = near_dups.check(metadata["restaurant_name"], chunk_id, chunk["text"])
+        if dup_of is not None:
+            # Another copy is still indexed; stand by for that one instead
+            ledger.record_duplicate(chunk_id, hybrid_rag.version, dup_of, chunk, strat)
+            continue
+        write_chunk(chunk, chunk["text"], chunk_id.rsplit("_", 1)[-1], strat)
+        run_stats["chunks_readmitted"] += 1
 
 
 llm=pipeline(
@@ -137,7 +233,18 @@ example_chunks =
 
 # 5. Orchestrate chunking, dedupe, indexing
 seen = set()
-for rec in tqdm(normalized, desc="Processing normalized records"):
+
+def index_record(rec):
+    url = rec.get("url", "")
+    content_hash = page_hash(rec)
+    manifest.advance_watermark(rec.get("timestamp"))
+    if manifest.is_unchanged(url, content_hash):
+        run_stats["pages_skipped"] += 1
+        return
+
+    # The page's previous chunks must not count as near-duplicates of its new ones
+    near_dups.remove(manifest.chunk_ids(url))
+    page_chunk_ids = set()
     for strat in tqdm(strategies, desc="Processing strategies", leave=False):
         kwargs = {}
         if strat in ("llm_guided", "attribute"):
@@ -154,8 +261,65 @@ for rec in tqdm(normalized, desc="Processing normalized records"):
         """
         print(f"strategy is ", strat)
         chunks = chunk_record(rec, strat, **kwargs)
-        dedupe_and_add(chunks, seen, strat)
+        dedupe_and_add(chunks, seen, strat, page_chunk_ids)
+
+    # Chunks the page produced last time but not anymore belong to old content
+    stale = manifest.chunk_ids(url) - page_chunk_ids
+    retire_chunks(stale)
+    manifest.record_page(url, rec.get("restaurant_name", ""), content_hash, page_chunk_ids)
+    run_stats["pages_indexed"] += 1
+    if run_stats["pages_indexed"] % 50 == 0:
+        manifest.save()
+        flush_captioner()
+        if NEAR_DUP_PERSIST:
+            near_dups.save()
+        if read_checkpoint is not None:
+            read_checkpoint.save()
+
+async def index_all():
+    with tqdm(desc="Processing normalized records") as progress:
+        async for batch in stream_normalized():
+            for rec in batch:
+                index_record(rec)
+                if read_checkpoint is not None and rec.get("source_position"):
+                    read_checkpoint.advance(*rec["source_position"])
+                progress.update()
+
+asyncio.run(index_all())
+print(f"Normalized records: {normalize_stats.summary()}")
+
+# 6. Pages that vanished from the datalake take their chunks with them
+for url in manifest.urls() - datalake.fetch_urls_from_mongodbatlas():
+    retire_chunks(manifest.drop_page(url))
+    run_stats["pages_removed"] += 1
+
+# 7. Blue/green: only a validated version may take over the alias
+if BUILD_MODE == "full":
+    ok, reason = hybrid_rag.validate()
+    if not ok:
+        print(f"Validation of {hybrid_rag.collection_name} failed: {reason}. Alias left on version {hybrid_rag.live_version}.")
+        hybrid_rag.close()
+        ledger.close()
+        sys.exit(1)
+    print(f"Validated {hybrid_rag.collection_name}: {reason}")
+    hybrid_rag.promote()
+    for version in hybrid_rag.garbage_collect(keep=KEEP_VERSIONS):
+        ledger.drop_version(version)
 
+run_stats["records_rejected"] = sum(normalize_stats.rejected.values())
+ledger.finish_build(hybrid_rag.version)
+manifest.finish_run()
+manifest.save()
+flush_captioner()
+if NEAR_DUP_PERSIST:
+    near_dups.save()
+if read_checkpoint is not None:
+    read_checkpoint.clear()
 
 print(f"Indexed {len(seen)} unique chunks into the knowledge base.")
-hybrid_rag.close()
\ No newline at end of file
+print(f"Near-duplicate filter: {near_dups.skipped} of {near_dups.checked} chunks skipped "
+      f"(embeddings and writes saved)")
+print(f"Run summary: {run_stats}")
+print(f"Chunk ledger (vector/graph status): {ledger.stats(hybrid_rag.version)}")
+hybrid_rag.close()
+ledger.close()
\ No newline at end of file
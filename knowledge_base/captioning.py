@@ -0,0 +1,190 @@
+"""
+Image captioning service for multimodal chunking.
+
+The captioning model is loaded once per process. Images are downloaded concurrently with a
+per-image size cap, captioned in batches, and captions are cached on disk by image URL and
+by content hash, so the same picture served from two URLs is only captioned once. The cache
+is written by `flush()` (the build calls `flush_captioner()` at its checkpoints and at the end,
+and it runs at exit), not after every call, which would rewrite the whole file each time.
+
+Model choice: CAPTION_MODEL if set, otherwise BLIP-2 (2.7B) on GPU and the small BLIP base
+captioner on CPU-only machines.
+"""
+import os
+import io
+import json
+import atexit
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image
+
+GPU_CAPTION_MODEL = "Salesforce/blip2-opt-2.7b"
+CPU_CAPTION_MODEL = "Salesforce/blip-image-captioning-base"
+CAPTION_MODEL = os.getenv("CAPTION_MODEL")
+CAPTION_BATCH_SIZE = int(os.getenv("CAPTION_BATCH_SIZE", "8"))
+CAPTION_FETCH_WORKERS = int(os.getenv("CAPTION_FETCH_WORKERS", "8"))
+MAX_IMAGE_BYTES = int(os.getenv("CAPTION_MAX_IMAGE_BYTES", str(5 * 1024 * 1024)))
+FETCH_TIMEOUT = 10
+CAPTION_CACHE_PATH = os.getenv(
+    "CAPTION_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "state", "captions.json")
+)
+
+
+class ImageCaptioner:
+    def __init__(self, model_name: str = None, batch_size: int = CAPTION_BATCH_SIZE,
+                 fetch_workers: int = CAPTION_FETCH_WORKERS, max_image_bytes: int = MAX_IMAGE_BYTES,
+                 cache_path: str = CAPTION_CACHE_PATH):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.fetch_workers = fetch_workers
+        self.max_image_bytes = max_image_bytes
+        self.cache_path = cache_path
+        self.processor = None
+        self.model = None
+        self.device = None
+        self._lock = threading.Lock()
+
+        # url -> content hash, content hash -> caption
+        self.url_hashes = {}
+        self.captions = {}
+        self._dirty = False
+        if os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.url_hashes = data.get("url_hashes", {})
+            self.captions = data.get("captions", {})
+
+    # --- Model ---
+    def _load(self):
+        """Load processor + model on first use only."""
+        with self._lock:
+            if self.model is not None:
+                return
+            import torch
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            name = self.model_name or CAPTION_MODEL or (
+                GPU_CAPTION_MODEL if self.device == "cuda" else CPU_CAPTION_MODEL
+            )
+            dtype = torch.float16 if self.device == "cuda" else torch.float32
+            if "blip2" in name.lower():
+                from transformers import Blip2Processor, Blip2ForConditionalGeneration
+                self.processor = Blip2Processor.from_pretrained(name)
+                self.model = Blip2ForConditionalGeneration.from_pretrained(name, torch_dtype=dtype)
+            else:
+                from transformers import BlipProcessor, BlipForConditionalGeneration
+                self.processor = BlipProcessor.from_pretrained(name)
+                self.model = BlipForConditionalGeneration.from_pretrained(name, torch_dtype=dtype)
+            self.model.to(self.device).eval()
+            self.model_name = name
+            print(f"Loaded captioning model {name} on {self.device}")
+
+    # --- Fetching ---
+    def _fetch(self, url: str):
+        """Download one image, giving up on anything larger than max_image_bytes."""
+        try:
+            with requests.get(url, stream=True, timeout=FETCH_TIMEOUT) as resp:
+                resp.raise_for_status()
+                declared = int(resp.headers.get("Content-Length") or 0)
+                if declared > self.max_image_bytes:
+                    logging.info(f"Skipping {url}: {declared} bytes exceeds cap")
+                    return None
+                body = bytearray()
+                for block in resp.iter_content(64 * 1024):
+                    body.extend(block)
+                    if len(body) > self.max_image_bytes:
+                        logging.info(f"Skipping {url}: exceeds {self.max_image_bytes} bytes")
+                        return None
+                return bytes(body)
+        except Exception as e:
+            logging.warning(f"Could not fetch image {url}: {e}")
+            return None
+
+    def _fetch_all(self, urls: list[str]) -> dict:
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as pool:
+            return dict(zip(urls, pool.map(self._fetch, urls)))
+
+    # --- Captioning ---
+    def _generate(self, images: list) -> list[str]:
+        import torch
+        self._load()
+        captions = []
+        for i in range(0, len(images), self.batch_size):
+            batch = images[i:i + self.batch_size]
+            inputs = self.processor(images=batch, return_tensors="pt").to(self.device, self.model.dtype)
+            with torch.no_grad():
+                out = self.model.generate(**inputs, max_new_tokens=40)
+            captions.extend(c.strip() for c in self.processor.batch_decode(out, skip_special_tokens=True))
+        return captions
+
+    def caption_urls(self, urls) -> dict:
+        """Return {url: caption} for every url that could be fetched and decoded."""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        result = {u: self.captions[self.url_hashes[u]] for u in urls
+                  if self.url_hashes.get(u) in self.captions}
+        todo = [u for u in urls if u not in result]
+        if not todo:
+            return result
+
+        pending = {}  # content hash -> (image, [urls])
+        for url, body in self._fetch_all(todo).items():
+            if body is None:
+                continue
+            digest = hashlib.sha256(body).hexdigest()
+            self.url_hashes[url] = digest
+            if digest in self.captions:
+                result[url] = self.captions[digest]
+                continue
+            if digest in pending:
+                pending[digest][1].append(url)
+                continue
+            try:
+                img = Image.open(io.BytesIO(body)).convert("RGB")
+            except Exception as e:
+                logging.warning(f"Could not decode image {url}: {e}")
+                continue
+            pending[digest] = (img, [url])
+
+        if pending:
+            digests = list(pending)
+            captions = self._generate([pending[d][0] for d in digests])
+            for digest, caption in zip(digests, captions):
+                self.captions[digest] = caption
+                for url in pending[digest][1]:
+                    result[url] = caption
+        self._dirty = True
+        return result
+
+    def flush(self):
+        """Write the cache if captions were added since it was last saved."""
+        if self._dirty:
+            self.save_cache()
+
+    def save_cache(self):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"url_hashes": self.url_hashes, "captions": self.captions}, f)
+        os.replace(tmp_path, self.cache_path)
+        self._dirty = False
+
+
+_captioner = None
+
+def get_captioner() -> ImageCaptioner:
+    """Process-wide captioner so the model is only ever loaded once."""
+    global _captioner
+    if _captioner is None:
+        _captioner = ImageCaptioner()
+        atexit.register(_captioner.flush)
+    return _captioner
+
+
+def flush_captioner():
+    """Persist the process-wide captioner's cache, if one was ever created."""
+    if _captioner is not None:
+        _captioner.flush()
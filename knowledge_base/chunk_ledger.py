@@ -0,0 +1,232 @@
+"""
+Persistent chunk ledger for knowledge-base builds (SQLite).
+
+One row per (chunk_id, index_version) records the chunk's text fingerprint, the embedding
+model its vector came from and the write status in each sink (Weaviate = "vector",
+Neo4j = "graph"). A sink is marked written only after its write returned, and every mark
+is committed immediately, so a build that crashes halfway picks up where it stopped: chunks
+already in both sinks are skipped, and half-written chunks only get the missing write.
+
+The ledger also remembers builds, so an interrupted full rebuild resumes into the index
+version it had started instead of opening yet another one, and the near-duplicate chunks that
+were suppressed in favour of an indexed one (`duplicates`), so a duplicate can take the
+original's place when the original is tombstoned.
+"""
+import os
+import json
+import sqlite3
+from datetime import datetime, timezone
+
+LEDGER_PATH = os.getenv(
+    "KB_LEDGER_PATH",
+    os.path.join(os.path.dirname(__file__), "state", "chunk_ledger.sqlite")
+)
+SINKS = ("vector", "graph")
+# SQLite's default limit on bound parameters is 999
+_IN_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk_id        TEXT    NOT NULL,
+    index_version   INTEGER NOT NULL,
+    fingerprint     TEXT    NOT NULL,
+    embed_model     TEXT,
+    url             TEXT,
+    restaurant_name TEXT,
+    vector_status   TEXT    NOT NULL DEFAULT 'pending',
+    graph_status    TEXT    NOT NULL DEFAULT 'pending',
+    updated_at      TEXT    NOT NULL,
+    PRIMARY KEY (chunk_id, index_version)
+);
+CREATE TABLE IF NOT EXISTS duplicates (
+    chunk_id      TEXT    NOT NULL,
+    index_version INTEGER NOT NULL,
+    duplicate_of  TEXT    NOT NULL,
+    strategy      TEXT,
+    chunk         TEXT    NOT NULL,
+    updated_at    TEXT    NOT NULL,
+    PRIMARY KEY (chunk_id, index_version)
+);
+CREATE INDEX IF NOT EXISTS duplicates_by_original ON duplicates (duplicate_of, index_version);
+CREATE TABLE IF NOT EXISTS builds (
+    index_version INTEGER NOT NULL,
+    mode          TEXT    NOT NULL,
+    started_at    TEXT    NOT NULL,
+    finished_at   TEXT
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class ChunkLedger:
+    def __init__(self, path: str = LEDGER_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    # --- Builds ---
+    def unfinished_build(self, mode: str):
+        """Index version of the latest build of this mode that never finished, if any."""
+        row = self.conn.execute(
+            "SELECT index_version, finished_at FROM builds WHERE mode = ? ORDER BY rowid DESC LIMIT 1",
+            (mode,)
+        ).fetchone()
+        return row[0] if row and row[1] is None else None
+
+    def start_build(self, version: int, mode: str):
+        if self.unfinished_build(mode) == version:
+            return
+        self.conn.execute("INSERT INTO builds (index_version, mode, started_at) VALUES (?, ?, ?)",
+                          (version, mode, _now()))
+        self.conn.commit()
+
+    def finish_build(self, version: int):
+        self.conn.execute("UPDATE builds SET finished_at = ? WHERE index_version = ? AND finished_at IS NULL",
+                          (_now(), version))
+        self.conn.commit()
+
+    # --- Chunks ---
+    def has_version(self, version: int) -> bool:
+        return self.conn.execute("SELECT 1 FROM chunks WHERE index_version = ? LIMIT 1",
+                                 (version,)).fetchone() is not None
+
+    def seed(self, version: int, vector_ids: set, graph_ids: set, embed_model: str):
+        """
+        Adopt chunks that are already in the sinks (e.g. written before the ledger existed).
+        Their vectors are assumed to come from the current embedding model.
+        """
+        now = _now()
+        rows = [
+            (chunk_id, version, chunk_id.rsplit("_", 1)[-1], embed_model,
+             "written" if chunk_id in vector_ids else "pending",
+             "written" if chunk_id in graph_ids else "pending", now)
+            for chunk_id in vector_ids | graph_ids
+        ]
+        self.conn.executemany("""
+            INSERT OR IGNORE INTO chunks
+                (chunk_id, index_version, fingerprint, embed_model, vector_status, graph_status, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        self.conn.commit()
+        print(f"Seeded chunk ledger with {len(rows)} chunks of version {version}")
+
+    def pending_sinks(self, chunk_id: str, version: int, embed_model: str) -> set:
+        """Sinks this chunk still has to be written to; vectors from another model are redone."""
+        row = self.conn.execute(
+            "SELECT embed_model, vector_status, graph_status FROM chunks WHERE chunk_id = ? AND index_version = ?",
+            (chunk_id, version)
+        ).fetchone()
+        if row is None:
+            return set(SINKS)
+        model, vector_status, graph_status = row
+        pending = set()
+        if vector_status != "written" or model != embed_model:
+            pending.add("vector")
+        if graph_status != "written":
+            pending.add("graph")
+        return pending
+
+    def record(self, chunk_id: str, version: int, fingerprint: str, embed_model: str,
+               url: str = None, restaurant_name: str = None):
+        """
+        Register a chunk about to be written with the model its vector will come from.
+        Existing sink statuses are kept; `mark_written` confirms the model once the vector is in.
+        """
+        self.conn.execute("""
+            INSERT INTO chunks (chunk_id, index_version, fingerprint, embed_model, url, restaurant_name, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (chunk_id, index_version) DO UPDATE SET
+                fingerprint = excluded.fingerprint,
+                url = excluded.url,
+                restaurant_name = excluded.restaurant_name,
+                updated_at = excluded.updated_at
+        """, (chunk_id, version, fingerprint, embed_model, url, restaurant_name, _now()))
+        self.conn.commit()
+
+    def mark_written(self, chunk_id: str, version: int, sink: str, embed_model: str = None):
+        if sink not in SINKS:
+            raise ValueError(f"Unknown sink {sink!r}")
+        if sink == "vector":
+            self.conn.execute(
+                "UPDATE chunks SET vector_status = 'written', embed_model = ?, updated_at = ? "
+                "WHERE chunk_id = ? AND index_version = ?",
+                (embed_model, _now(), chunk_id, version))
+        else:
+            self.conn.execute(
+                "UPDATE chunks SET graph_status = 'written', updated_at = ? "
+                "WHERE chunk_id = ? AND index_version = ?",
+                (_now(), chunk_id, version))
+        self.conn.commit()
+
+    def mark_tombstoned(self, chunk_ids, version: int):
+        now = _now()
+        self.conn.executemany(
+            "UPDATE chunks SET vector_status = 'tombstoned', graph_status = 'tombstoned', updated_at = ? "
+            "WHERE chunk_id = ? AND index_version = ?",
+            [(now, chunk_id, version) for chunk_id in chunk_ids])
+        self.conn.commit()
+
+    # --- Suppressed near-duplicates ---
+    def record_duplicate(self, chunk_id: str, version: int, duplicate_of: str, chunk: dict, strategy: str = None):
+        """Remember a chunk that was not indexed because `duplicate_of` was, with what it takes to index it."""
+        self.conn.execute("""
+            INSERT INTO duplicates (chunk_id, index_version, duplicate_of, strategy, chunk, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (chunk_id, index_version) DO UPDATE SET
+                duplicate_of = excluded.duplicate_of,
+                strategy = excluded.strategy,
+                chunk = excluded.chunk,
+                updated_at = excluded.updated_at
+        """, (chunk_id, version, duplicate_of, strategy, json.dumps(chunk, default=str), _now()))
+        self.conn.commit()
+
+    def duplicates_of(self, chunk_ids, version: int) -> list[tuple[str, dict, str]]:
+        """(chunk_id, chunk, strategy) of the suppressed duplicates of any of `chunk_ids`."""
+        chunk_ids = list(chunk_ids)
+        found = []
+        for i in range(0, len(chunk_ids), _IN_BATCH):
+            batch = chunk_ids[i:i + _IN_BATCH]
+            rows = self.conn.execute(
+                f"SELECT chunk_id, chunk, strategy FROM duplicates "
+                f"WHERE index_version = ? AND duplicate_of IN ({','.join('?' * len(batch))}) ORDER BY chunk_id",
+                (version, *batch)).fetchall()
+            found.extend((chunk_id, json.loads(chunk), strategy) for chunk_id, chunk, strategy in rows)
+        return found
+
+    def forget_duplicates(self, chunk_ids, version: int) -> set:
+        """Drop suppressed duplicates by their own id; returns the ids that were duplicates."""
+        chunk_ids = list(chunk_ids)
+        forgotten = set()
+        for i in range(0, len(chunk_ids), _IN_BATCH):
+            batch = chunk_ids[i:i + _IN_BATCH]
+            marks = ','.join('?' * len(batch))
+            forgotten.update(row[0] for row in self.conn.execute(
+                f"SELECT chunk_id FROM duplicates WHERE index_version = ? AND chunk_id IN ({marks})",
+                (version, *batch)))
+            self.conn.execute(f"DELETE FROM duplicates WHERE index_version = ? AND chunk_id IN ({marks})",
+                              (version, *batch))
+        self.conn.commit()
+        return forgotten
+
+    def drop_version(self, version: int):
+        """Forget a garbage-collected index version."""
+        self.conn.execute("DELETE FROM chunks WHERE index_version = ?", (version,))
+        self.conn.execute("DELETE FROM duplicates WHERE index_version = ?", (version,))
+        self.conn.commit()
+
+    def stats(self, version: int) -> dict:
+        rows = self.conn.execute("""
+            SELECT vector_status, graph_status, COUNT(*) FROM chunks
+            WHERE index_version = ? GROUP BY vector_status, graph_status
+        """, (version,)).fetchall()
+        return {f"{v}/{g}": n for v, g, n in rows}
+
+    def close(self):
+        self.conn.close()
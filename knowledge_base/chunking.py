@@ -1,19 +1,21 @@
 import re
 import json
-import requests
 import numpy as np
 import networkx as nx
-from itertools import combinations
+from scipy.sparse import csr_matrix
 from typing import List, Dict, Any
-from PIL import Image
 from dotenv import load_dotenv
 import os
 from sklearn.feature_extraction.text import TfidfVectorizer
+from collections import Counter
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter, HTMLHeaderTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from huggingface_hub import InferenceClient
 
+from knowledge_base.corpus_stats import tokenize, get_corpus_idf
+from knowledge_base.captioning import get_captioner
+from knowledge_base.arrow_records import iter_batch_records
 
 load_dotenv()
 HUGGINGFACE_API_KEY= os.getenv("HUGGINGFACE_API_KEY")
@@ -129,26 +131,23 @@ def multimodal_chunking(record: dict) -> List[Dict[str, Any]]:
     metadata = make_metadata(record)
     images = metadata.get("image_urls", {})
     chunks: List[Dict[str, Any]] = []
+    # Fetch + caption all images of the record in one batched call (model is loaded once)
+    try:
+        captions = get_captioner().caption_urls(images)
+    except Exception as e:
+        print(f"Image captioning failed: {e}")
+        captions = {}
     # Process each image alongside text
     for url in images:
-        try:
-            img = Image.open(requests.get(url, stream=True).raw).convert("RGB")
-            # Simple BLIP captioning
-            from transformers import BlipProcessor, BlipForConditionalGeneration
-            proc = BlipProcessor.from_pretrained("Salesforce/blip2-opt-2.7b")
-            blip = BlipForConditionalGeneration.from_pretrained("Salesforce/blip2-opt-2.7b")
-            inputs = proc(images=img, return_tensors="pt")
-            cap = blip.generate(**inputs)
-            caption = proc.decode(cap[0], skip_special_tokens=True)
-            fused = f"{text}\nVisual: {caption}"
-        except Exception:
-            fused = text
+        caption = captions.get(url)
+        fused = f"{text}\nVisual: {caption}" if caption else text
         chunks.append({"text": fused, "metadata": metadata})
     print(f"Multimodal chunking done.")
     return chunks
 
 # --- 5. Entropy-Based Chunking ---
 def entropy_based_chunking(record: dict, splitter_func=None):
+    """Legacy version: fits a TfidfVectorizer per document. Kept for benchmarking."""
     text = record.get("markdown", "")
     metadata= make_metadata(record)
 
@@ -172,6 +171,63 @@ def entropy_based_chunking(record: dict, splitter_func=None):
     splitter = splitter_func or char_splitter.split_text
     return [{"text": chunk, "metadata": metadata} for chunk in splitter(text)]
 
+def _entropy(weights: Counter) -> float:
+    """Shannon entropy (nats) of a weighted token distribution."""
+    total = sum(weights.values())
+    if total <= 0:
+        return 0.0
+    return -sum((w / total) * np.log(w / total) for w in weights.values() if w > 0)
+
+def windowed_entropy_chunking(record: dict, idf=None, window: int = 4, min_chars: int = 200,
+                              max_chars: int = 800, min_entropy: float = 2.0) -> List[Dict[str, Any]]:
+    """
+    Entropy-aware chunking against corpus-level IDF, in one pass over the document.
+
+    Each line is tokenized once and weighted by tf * corpus IDF. For every line boundary we
+    compare the entropy of the `window` lines on either side with the entropy of both together;
+    a large gain means the topic shifts there (e.g. starters -> mains), so that is where we cut.
+    Chunks are kept between `min_chars` and `max_chars` (a lone oversized line becomes its own
+    chunk), and low-entropy documents stay whole.
+    """
+    text = record.get("markdown", "")
+    metadata = make_metadata(record)
+    if not text.strip():
+        return [{"text": text, "metadata": metadata}]
+
+    idf = idf or get_corpus_idf()
+    weigh = idf.idf if idf is not None else (lambda _token: 1.0)
+    lines = [ln for ln in text.split("\n") if ln.strip()]
+    line_weights = []
+    for ln in lines:
+        tf = Counter(tokenize(ln))
+        line_weights.append(Counter({t: c * weigh(t) for t, c in tf.items()}))
+
+    doc_weights = sum(line_weights, Counter())
+    if _entropy(doc_weights) < min_entropy and len(text) <= max_chars:
+        return [{"text": text, "metadata": metadata}]
+
+    # Split score for the boundary before line b
+    scores = [0.0] * (len(lines) + 1)
+    for b in range(1, len(lines)):
+        left = sum(line_weights[max(0, b - window):b], Counter())
+        right = sum(line_weights[b:b + window], Counter())
+        scores[b] = _entropy(left + right) - 0.5 * (_entropy(left) + _entropy(right))
+
+    chunks: List[Dict[str, Any]] = []
+    start = 0
+    while start < len(lines):
+        size, best, end = 0, None, len(lines)
+        for b in range(start + 1, len(lines) + 1):
+            size += len(lines[b - 1]) + 1
+            if b < len(lines) and size >= min_chars and (best is None or scores[b] > scores[best]):
+                best = b
+            if size >= max_chars:
+                end = best or b
+                break
+        chunks.append({"text": "\n".join(lines[start:end]), "metadata": metadata})
+        start = end
+    return chunks
+
 # --- 6. Graph-Based Chunking ---
 def extract_dish_name(chunk_text: str) -> str:
     m = re.search(r"Name:\s*([^\n]+)", chunk_text)
@@ -183,15 +239,73 @@ def similarity(chunk1: dict, chunk2: dict) -> float:
     common = tokens1 & tokens2
     return len(common) / max(len(tokens1), len(tokens2), 1)
 
+def _token_matrix(token_sets: List[set], vocab: Dict[str, int], rank: Dict[int, tuple] = None,
+                  threshold: float = 0.0) -> csr_matrix:
+    """Binary chunk x token matrix. With `rank`, keep only each row's rare-token prefix."""
+    indptr, indices = [0], []
+    for toks in token_sets:
+        ids = [vocab[t] for t in toks]
+        if rank is not None:
+            # A pair can only clear `overlap > t * max(|A|, |B|)` if they share one of the
+            # |A| - floor(t*|A|) rarest tokens of A (prefix filtering); +1 guards float rounding
+            ids.sort(key=rank.__getitem__)
+            ids = ids[:len(ids) - int(threshold * len(ids)) + 1]
+        indices.extend(ids)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.int64)
+    return csr_matrix((data, indices, indptr), shape=(len(token_sets), len(vocab)))
+
+def similar_pairs(texts: List[str], threshold: float = 0.7, block_size: int = 2048) -> List[tuple]:
+    """
+    All index pairs (i, j), i < j, whose token overlap |A & B| / max(|A|, |B|, 1) exceeds
+    `threshold` -- the same test as `similarity()`, without comparing every pair.
+
+    Texts are tokenized once into a sparse binary matrix. Candidates come from a sparse product
+    of the rare-token prefixes only, so frequent tokens don't make the product quadratic, and
+    each candidate is verified exactly against the full token sets.
+    """
+    token_sets = [set(t.split()) for t in texts]
+    vocab: Dict[str, int] = {}
+    df: Dict[int, int] = {}
+    for toks in token_sets:
+        for t in toks:
+            tid = vocab.setdefault(t, len(vocab))
+            df[tid] = df.get(tid, 0) + 1
+    if not vocab:
+        return []
+
+    # Global order: rarest token first, ties broken by token id for determinism
+    rank = {tid: (df[tid], tid) for tid in df}
+    full = _token_matrix(token_sets, vocab)
+    prefix = _token_matrix(token_sets, vocab, rank, threshold)
+    prefix_t = prefix.T.tocsr()
+    sizes = np.diff(full.indptr)
+
+    pairs = []
+    for start in range(0, len(texts), block_size):
+        cand = (prefix[start:start + block_size] @ prefix_t).tocoo()
+        rows = cand.row.astype(np.int64) + start
+        cols = cand.col.astype(np.int64)
+        upper = cols > rows
+        rows, cols = rows[upper], cols[upper]
+        if not len(rows):
+            continue
+        overlap = np.asarray(full[rows].multiply(full[cols]).sum(axis=1)).ravel()
+        denom = np.maximum(np.maximum(sizes[rows], sizes[cols]), 1)
+        keep = overlap / denom > threshold
+        pairs.extend(zip(rows[keep].tolist(), cols[keep].tolist()))
+    # Same order itertools.combinations would visit them in, so the graph is identical
+    pairs.sort()
+    return pairs
+
 from networkx.readwrite import json_graph
 def build_menu_graph(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     G = nx.Graph()
-    for c in chunks:
-        dish = extract_dish_name(c["text"])
+    dishes = [extract_dish_name(c["text"]) for c in chunks]
+    for c, dish in zip(chunks, dishes):
         G.add_node(dish, **c.get("metadata", {}))
-    for a, b in combinations(chunks, 2):
-        if similarity(a, b) > 0.7:
-            G.add_edge(extract_dish_name(a["text"]), extract_dish_name(b["text"]))
+    for i, j in similar_pairs([c.get("text", "") for c in chunks], threshold=0.7):
+        G.add_edge(dishes[i], dishes[j])
     
     # Convert graph to dictionary
     graph_dict = json_graph.node_link_data(G)
@@ -240,7 +354,7 @@ def chunk_record(
         "llm_guided": llm_guided_chunking,
         "hierarchical": hierarchical_chunking,
         "multimodal": multimodal_chunking,
-        "entropy": lambda r: entropy_based_chunking(r, splitter_func),
+        "entropy": windowed_entropy_chunking,
         "graph": lambda r: build_menu_graph(semantic_menu_chunking(r)),
         "attribute": lambda r: [enrich_chunk(r)]
     }
@@ -248,6 +362,16 @@ def chunk_record(
         raise ValueError(f"Unknown strategy: {strategy}")
     return strategies[strategy](record)
 
+def chunk_record_batch(batch, strategy: str, **kwargs) -> List[Dict[str, Any]]:
+    """
+    Chunk every row of a pyarrow RecordBatch (e.g. from DataLakeFetcher.iter_batches_from_iceberg).
+    Rows are lazy views, so only the columns the strategy reads are converted to Python.
+    """
+    chunks: List[Dict[str, Any]] = []
+    for record in iter_batch_records(batch):
+        chunks.extend(chunk_record(record, strategy, **kwargs))
+    return chunks
+
 """
 Output is like this 
 
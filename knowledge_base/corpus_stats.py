@@ -0,0 +1,87 @@
+"""
+Corpus-level token statistics for entropy-aware chunking.
+
+Document frequencies are accumulated in a single streaming pass over the datalake records and
+persisted as JSON, so chunkers weigh tokens against the whole corpus instead of fitting a
+vectorizer on every document.
+
+    python -m knowledge_base.corpus_stats      # (re)build and persist the IDF table
+"""
+import os
+import re
+import json
+import math
+from collections import Counter
+
+# Same token pattern as sklearn's TfidfVectorizer (lowercased words of 2+ chars)
+TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+IDF_PATH = os.getenv(
+    "KB_IDF_PATH",
+    os.path.join(os.path.dirname(__file__), "state", "idf.json")
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class CorpusIDF:
+    """Streaming document-frequency table with sklearn-style smoothed IDF."""
+    def __init__(self, doc_freq: dict = None, n_docs: int = 0):
+        self.doc_freq = Counter(doc_freq or {})
+        self.n_docs = n_docs
+
+    def update(self, text: str):
+        """Count one document."""
+        self.doc_freq.update(set(tokenize(text)))
+        self.n_docs += 1
+
+    def idf(self, token: str) -> float:
+        # ln((1 + n) / (1 + df)) + 1; unseen tokens get the maximum weight
+        return math.log((1 + self.n_docs) / (1 + self.doc_freq.get(token, 0))) + 1.0
+
+    def save(self, path: str = IDF_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"n_docs": self.n_docs, "doc_freq": self.doc_freq}, f)
+        os.replace(tmp_path, path)
+        print(f"Saved IDF over {self.n_docs} documents ({len(self.doc_freq)} tokens) to {path}")
+
+    @classmethod
+    def load(cls, path: str = IDF_PATH):
+        """Load the persisted table, or None if it was never built."""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(doc_freq=data.get("doc_freq", {}), n_docs=data.get("n_docs", 0))
+
+
+def build_idf(records, field: str = "markdown") -> CorpusIDF:
+    """One pass over an iterable of records; never holds more than one body at a time."""
+    stats = CorpusIDF()
+    for rec in records:
+        stats.update(rec.get(field) or "")
+    return stats
+
+
+_corpus_idf = None
+
+def get_corpus_idf():
+    """Process-wide IDF table, loaded once from disk (None if not built yet)."""
+    global _corpus_idf
+    if _corpus_idf is None:
+        _corpus_idf = CorpusIDF.load()
+    return _corpus_idf
+
+
+if __name__ == "__main__":
+    import sys
+    import asyncio
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from knowledge_base.fetch_datalake import DataLakeFetcher
+    from knowledge_base.normalize_records import normalize_records
+
+    raw = DataLakeFetcher().fetch_records_from_mongodbatlas()
+    build_idf(asyncio.run(normalize_records(raw))).save()
@@ -10,13 +10,15 @@ embed_model = HuggingFaceEmbeddings(
 """
 
 from sentence_transformers import SentenceTransformer
-embed_model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")  # 80MB model
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+embed_model = SentenceTransformer(EMBED_MODEL_NAME, device="cpu")  # 80MB model
 
 def generate_embeddings(text, metadata):
     embeddings = []
     vector = embed_model.encode(text)
     embeddings.append({
-        "id": f"{metadata['restaurant_name']}_{metadata['url']}_{hash(text)}",
+        # chunk_id is content-addressed, so the Weaviate uuid stays stable across runs
+        "id": metadata.get("chunk_id") or f"{metadata['restaurant_name']}_{metadata['url']}_{hash(text)}",
         "vector": vector,
         "metadata": metadata
     })
@@ -1,12 +1,19 @@
 import json
-from pyiceberg.catalog import load_catalog
-from ingestion.datalake import DataLake
+from pyiceberg.expressions import AlwaysTrue
+from ingestion.datalake import DataLake, ReadCheckpoint
+from ingestion.iceberg_lake import IcebergDataLake
+from knowledge_base.arrow_records import iter_batch_records
 import pyarrow as pa
 import os 
 import logging
 from dotenv import load_dotenv
 load_dotenv()
 
+# Fields the knowledge-base build actually reads; everything else stays on the server
+RECORD_FIELDS = ["id", "scraper_name", "restaurant_name", "base_url", "url",
+                 "markdown", "html", "media", "timestamp", "content_hash",
+                 "markdown_ref", "html_ref", "media_ref"]
+
 class DataLakeFetcher:
 
     """
@@ -15,9 +22,9 @@ class DataLakeFetcher:
     It returnes list of records as dictionaries.
     """
     def __init__(self):
-        CATALOG_NAME = os.getenv("CATALOG_NAME")
+        CATALOG_NAME = os.getenv("CATALOG_NAME", "local_datalake")
         WAREHOUSE_PATH = os.getenv("WAREHOUSE_PATH")
-        NAMESPACE = os.getenv("NAMESPACE")
+        NAMESPACE = os.getenv("NAMESPACE", "restaurant_data")
         TABLE_NAME = os.getenv("TABLE_NAME")
         TABLE_IDENTIFIER = [NAMESPACE, TABLE_NAME]  
         DB_NAME=os.getenv("DB_NAME")
@@ -36,38 +43,69 @@ class DataLakeFetcher:
 
 
     # --- Data Lake Access: Load records from the Iceberg table --- 
-    def fetch_records_from_iceberg(self):
+    def _iceberg_lake(self):
+        return IcebergDataLake(
+            catalog_name=self.catalog_name,
+            warehouse_path=self.warehouse_path,
+            namespace=self.table_identifier[0],
+            table_name=self.table_name
+        )
+
+    def _load_iceberg_table(self):
+        # Local SQLite catalog under iceberg_catalog/warehouse/ (see ingestion/iceberg_lake.py)
+        table = self._iceberg_lake().load_table()
+        logging.info(f"Loaded table: {'.'.join(self.table_identifier)}")
+        return table
+
+    def iter_batches_from_iceberg(self, columns: list[str] = None, row_filter=None,
+                                  batch_size: int = None):
+        """
+        Stream the Iceberg table as pyarrow RecordBatches.
+
+        Args:
+            columns (list[str]): projection pushed into the scan (only these columns are read)
+            row_filter (str | BooleanExpression): predicate pushed into the scan, e.g.
+                "restaurant_name == 'sankalprestaurants'"; prunes whole data files/row groups
+            batch_size (int): optionally re-slice batches to at most this many rows (zero-copy)
+
+        Yields:
+            pyarrow.RecordBatch
+        """
+        table = self._load_iceberg_table()
+        scan = table.scan(
+            row_filter=row_filter if row_filter is not None else AlwaysTrue(),
+            selected_fields=tuple(columns) if columns else ("*",),
+        )
+        for batch in scan.to_arrow_batch_reader():
+            if not batch_size:
+                yield batch
+                continue
+            for offset in range(0, batch.num_rows, batch_size):
+                yield batch.slice(offset, batch_size)
+
+    def iter_new_batches_from_iceberg(self, after_snapshot_id=None, columns: list[str] = None):
+        """
+        Snapshot-based incremental read: only rows appended after `after_snapshot_id`.
+        Returns (batches, snapshot_id); store snapshot_id as the next watermark.
+        """
+        lake = self._iceberg_lake()
+        table = lake.load_table()
+        snapshot_id = lake.current_snapshot_id(table)
+        return lake.iter_batches_since(table, after_snapshot_id, columns=columns), snapshot_id
+
+    def iter_records_from_iceberg(self, columns: list[str] = None, row_filter=None):
+        """Row views over the batch stream; values are only converted when a chunker reads them."""
+        for batch in self.iter_batches_from_iceberg(columns=columns, row_filter=row_filter):
+            yield from iter_batch_records(batch)
+
+    def fetch_records_from_iceberg(self, columns: list[str] = None, row_filter=None):
         """Load all records from the Iceberg table into a list of dicts."""
         try:
-            # 1. Load the catalog
-            catalog = load_catalog(
-                name=self.catalog_name,
-                type="hadoop",
-                warehouse=self.warehouse_path
-            )
-            logging.info(f"Loaded Iceberg catalog '{self.catalog_name}' at '{self.warehouse_path}'")
-            
-            # 2. Load the table
-            table = catalog.load_table(self.table_identifier)
-            logging.info(f"Loaded table: {'.'.join(self.table_identifier)}")
-            
-            # 3. Scan to RecordBatches
-            scanner = table.new_scan()\
-                           .plan()\
-                           .build()
-            batches = scanner.to_pyarrow()  # returns a pyarrow.Table
-            pa_table: pa.Table = batches
-            
-            # 4. Convert to Python dicts
-            #    to_pydict returns {column: [values,...]}
-
-            column_dicts = pa_table.to_pydict()
-            #    transpose into list of row-dicts
-            records = [
-                {col: column_dicts[col][i] for col in column_dicts}
-                for i in range(pa_table.num_rows)
-            ]
-            
+            records = []
+            for batch in self.iter_batches_from_iceberg(columns=columns, row_filter=row_filter):
+                # Row conversion happens in Arrow's C++ code, one batch at a time
+                records.extend(batch.to_pylist())
+
             logging.info(f"Fetched {len(records)} records from Iceberg")
             return records
 
@@ -77,7 +115,11 @@ class DataLakeFetcher:
         
     # --- MongoDB Atlas Access ---
     def fetch_records_from_mongodbatlas(self):
-        """Fetch records from MongoDB Atlas collection."""
+        """
+        Fetch records from MongoDB Atlas collection.
+        Loads the whole collection and keeps one document per restaurant; prefer
+        `iter_records_from_mongodbatlas` for builds.
+        """
         try:
             datalake = DataLake(db_name=self.db_name, collection_name=self.collection_name)
             documents = datalake.get_all_documents()
@@ -95,4 +137,43 @@ class DataLakeFetcher:
             return records
         except Exception as e:
             logging.error(f"Error fetching from MongoDB Atlas: {e}", exc_info=True)
-            return {}
\ No newline at end of file
+            return {}
+
+    def iter_records_from_mongodbatlas(self, since=None, checkpoint_path: str = None,
+                                       fields: list[str] = None, query: dict = None,
+                                       batch_size: int = 200, resume_after: tuple = None):
+        """
+        Stream every document (not just the last one per restaurant) in constant memory.
+
+        Args:
+            since (datetime): watermark; only documents crawled after it are read
+            checkpoint_path (str): JSON file used to resume an interrupted read
+            fields (list[str]): projection pushed to the server (defaults to RECORD_FIELDS)
+            query (dict): extra server-side filter
+            resume_after (tuple): (timestamp, _id) position to resume after, for callers
+                that checkpoint what they processed rather than what was read
+        """
+        datalake = DataLake(db_name=self.db_name, collection_name=self.collection_name)
+        checkpoint = ReadCheckpoint(checkpoint_path) if checkpoint_path else None
+        projection = {f: 1 for f in (fields or RECORD_FIELDS)}
+        count = 0
+        try:
+            for doc in datalake.iter_documents(query=query, projection=projection,
+                                               batch_size=batch_size, since=since,
+                                               checkpoint=checkpoint, resume_after=resume_after):
+                if not doc.get("restaurant_name"):
+                    logging.warning("Document missing 'restaurant_name' field.")
+                    continue
+                count += 1
+                yield doc
+        finally:
+            datalake.client.close()
+            logging.info(f"Streamed {count} records from MongoDB Atlas")
+
+    def fetch_urls_from_mongodbatlas(self) -> set:
+        """Every url currently in the lake, computed server-side."""
+        datalake = DataLake(db_name=self.db_name, collection_name=self.collection_name)
+        try:
+            return set(datalake.distinct_values("url"))
+        finally:
+            datalake.client.close()
@@ -7,24 +7,24 @@ Neo4j (or your choice of graph DB) captures structured relationships (for instan
 Below is the code with inline comments explaining each step.
 
 """
-import weaviate
-from weaviate.classes.init import Auth
-import weaviate.classes as wvc
-from weaviate.classes.config import Property, DataType, Configure
 from neo4j import GraphDatabase
 import json
 import os 
 import uuid
 import hashlib
-import weaviate.util
 from dotenv import load_dotenv
 from sentence_transformers import CrossEncoder
+from knowledge_base.index_versions import (
+    collection_name, resolve_alias, switch_alias, list_versions, validate_version, garbage_collect
+)
+from knowledge_base.vector_store import get_vector_backend
 
 
 load_dotenv()
 
 # -------------------- WEAVIATE SETUP --------------------
-# Define your Weaviate endpoint (can be local or cloud)
+# Define your Weaviate endpoint (can be local or cloud); VECTOR_BACKEND=local uses the
+# embedded on-disk index from knowledge_base/vector_store.py instead
 WEAVIATE_URL= os.getenv("WEAVIATE_URL")  # e.g., "http://localhost:8080" or your cloud URL
 WEAVIATE_API_KEY=os.getenv("WEAVIATE_API_KEY")
 NEO4J_URI = os.getenv("NEO4J_URI")  # e.g., "bolt://localhost:7687"
@@ -35,33 +35,35 @@ class HybridRAG:
     """
     A class to manage the hybrid RAG system using Weaviate and Neo4j.
     """
-    def __init__(self):
-        self.weaviate_client = weaviate.connect_to_weaviate_cloud(cluster_url=WEAVIATE_URL, auth_credentials=Auth.api_key(WEAVIATE_API_KEY))
+    def __init__(self, fresh_version: bool = False, version: int = None):
+        """
+        fresh_version: build into a brand-new index version (blue/green full rebuild) instead of
+                       the live one. The live version keeps serving until `promote()` is called.
+        version: write into this existing version, e.g. to resume an interrupted rebuild.
+        """
+        # Weaviate Cloud or the local embedded index, per VECTOR_BACKEND
+        self.vectors = get_vector_backend()
         self.neo4j_driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+
+        # 0. Pick the index version this instance writes to
+        self.live_version = resolve_alias(self.neo4j_driver)
+        if version is not None:
+            self.version = version
+        elif fresh_version:
+            known = list_versions(self.vectors) + [self.live_version or 0]
+            self.version = max(known) + 1
+        else:
+            self.version = self.live_version or 0
+        self.collection_name = collection_name(self.version)
+
         # 1. Create or update schemas in both databases:
         self.create_weaviate_schema()
-        print(f"Created Weaviate Collection")
+        print(f"Vector collection {self.collection_name} ready ({self.vectors.name})")
         self.create_neo4j_schema()
         print(f"Created Neo4j Collection")
 
-    def create_weaviate_schema(self):
-        # Define the collection configuration
-
-        # Delete existing collection if it exists
-        if "RestaurantChunk" in self.weaviate_client.collections.list_all():
-            self.weaviate_client.collections.delete("RestaurantChunk")
-
-        # Create new collection
-        self.weaviate_client.collections.create(
-            name="RestaurantChunk",
-            description="Chunks of menu text + metadata + optionally image captions",
-            properties=[
-                Property(name="chunk_id", data_type=DataType.TEXT),
-                Property(name="vector_emb", data_type=DataType.NUMBER_ARRAY),
-                Property(name="metadata", data_type=DataType.TEXT),
-        ],
-           vectorizer_config=wvc.config.Configure.Vectorizer.none(), #since we already have embeddings from Huggingfacehub
-        )
+    def create_weaviate_schema(self, recreate: bool = False):
+        self.vectors.ensure_collection(self.version, recreate=recreate)
 
     def push_vector_data(self, embeddings: list[dict], strat: str):
         """
@@ -70,23 +72,15 @@ class HybridRAG:
           - vector: List[float]
           - metadata: dict (must include 'text' or you can merge with chunk separately)
         """
-        coll = self.weaviate_client.collections.get("RestaurantChunk")
+        items = []
         for emb in embeddings:
-            uuid_str = emb["id"]
-            vector   = emb["vector"]
-            metadata    = emb["metadata"].copy()
-            uuid = weaviate.util.generate_uuid5(uuid_str)
+            metadata = emb["metadata"].copy()
             # Move chunk text into a property, e.g. 'markdown'
             if "text" in metadata:
                 metadata = metadata.pop("text")
-
-            # Insert the object into Weaviate
-            coll.data.insert(
-                properties=metadata,
-                uuid=uuid,
-                vector=vector
-            )
-        print(f"Pushed chunk to Weviate Vector DB, Strategy {strat}")
+            items.append({"id": emb["id"], "vector": emb["vector"], "properties": metadata})
+        self.vectors.upsert(self.version, items)
+        print(f"Pushed chunk to {self.vectors.name} vector store, Strategy {strat}")
     # -------------------- NEO4J SETUP --------------------
 
     def create_neo4j_schema(self):
@@ -110,12 +104,20 @@ class HybridRAG:
                 REQUIRE d.name IS UNIQUE
             """)
 
-            # Chunk ID must be unique
+            # Chunk ID must be unique within an index version; the same chunk can live in
+            # the serving version and in the one being rebuilt
+            session.run("DROP CONSTRAINT chunk_id_unique IF EXISTS")
             session.run("""
-                CREATE CONSTRAINT chunk_id_unique 
+                CREATE CONSTRAINT chunk_version_unique 
                 IF NOT EXISTS 
                 FOR (c:Chunk) 
-                REQUIRE c.id IS UNIQUE
+                REQUIRE (c.id, c.version) IS UNIQUE
+            """)
+            # Chunks written before versioning belong to the legacy version 0
+            session.run("""
+                MATCH (c:Chunk) 
+                WHERE c.version IS NULL 
+                SET c.version = 0
             """)
 
             # Unique SERVES relationship key on restaurant_id, dish_id, price
@@ -163,10 +165,12 @@ class HybridRAG:
             # Create or merge Chunk node
             session.run(
                 """
-                MERGE (c:Chunk {id: $chunk_id})
+                MERGE (c:Chunk {id: $chunk_id, version: $version})
                 ON CREATE SET c.markdown = $markdown, c.source = $source, c.url = $url
+                REMOVE c.tombstoned_at
                 """,
                 chunk_id=chunk_id,
+                version=self.version,
                 markdown=markdown,
                 source=source,
                 url=url
@@ -176,21 +180,23 @@ class HybridRAG:
             if restaurant_name:
                 session.run(
                     """
-                    MATCH (r:Restaurant {name: $restaurant_name}), (c:Chunk {id: $chunk_id})
+                    MATCH (r:Restaurant {name: $restaurant_name}), (c:Chunk {id: $chunk_id, version: $version})
                     MERGE (r)-[:HAS_CHUNK]->(c)
                     """,
                     restaurant_name=restaurant_name,
-                    chunk_id=chunk_id
+                    chunk_id=chunk_id,
+                    version=self.version
                 )
 
             if dish_name:
                 session.run(
                     """
-                    MATCH (d:Dish {name: $dish_name}), (c:Chunk {id: $chunk_id})
+                    MATCH (d:Dish {name: $dish_name}), (c:Chunk {id: $chunk_id, version: $version})
                     MERGE (d)-[:HAS_CHUNK]->(c)
                     """,
                     dish_name=dish_name,
-                    chunk_id=chunk_id
+                    chunk_id=chunk_id,
+                    version=self.version
                 )
 
             if restaurant_name and dish_name:
@@ -205,7 +211,63 @@ class HybridRAG:
                     price=price
                 )
         print(f"Pushed chunk to Neo4j Grap DB, Strategy {strat}")
-     
+
+    # -------------------- INCREMENTAL INDEXING --------------------
+    def existing_chunk_ids(self):
+        """
+        Return (vector_ids, graph_ids): chunk ids currently live in the vector store and in Neo4j.
+        A chunk is fully indexed only when it is present in both.
+        """
+        vector_ids = self.vectors.chunk_ids(self.version)
+
+        with self.neo4j_driver.session() as session:
+            result = session.run("""
+                MATCH (c:Chunk {version: $version})
+                WHERE c.tombstoned_at IS NULL
+                RETURN c.id AS id
+            """, version=self.version)
+            graph_ids = {record["id"] for record in result if record["id"]}
+
+        print(f"Found {len(vector_ids)} chunks in the vector store and {len(graph_ids)} in Neo4j")
+        return vector_ids, graph_ids
+
+    def tombstone_chunks(self, chunk_ids, batch_size: int = 100):
+        """
+        Retire chunks of changed or removed pages.
+        Vectors are deleted so they stop matching searches; Neo4j Chunk nodes are
+        kept but marked with `tombstoned_at` and detached from their restaurants/dishes.
+        """
+        chunk_ids = [c for c in chunk_ids if c]
+        if not chunk_ids:
+            return 0
+        self.vectors.delete(self.version, chunk_ids)
+
+        with self.neo4j_driver.session() as session:
+            session.run("""
+                UNWIND $chunk_ids AS chunk_id
+                MATCH (c:Chunk {id: chunk_id, version: $version})
+                SET c.tombstoned_at = datetime()
+                WITH c
+                OPTIONAL MATCH ()-[h:HAS_CHUNK]->(c)
+                DELETE h
+            """, chunk_ids=chunk_ids, version=self.version)
+        print(f"Tombstoned {len(chunk_ids)} chunks")
+        return len(chunk_ids)
+
+    # -------------------- BLUE/GREEN VERSIONS --------------------
+    def validate(self, min_ratio: float = 0.5):
+        """Check the version this instance wrote before it is allowed to serve traffic."""
+        return validate_version(self.vectors, self.neo4j_driver, self.version,
+                                live_version=self.live_version, min_ratio=min_ratio)
+
+    def promote(self):
+        """Flip the serving alias to the version this instance wrote."""
+        switch_alias(self.neo4j_driver, self.version)
+        self.live_version = self.version
+
+    def garbage_collect(self, keep: int = 2):
+        return garbage_collect(self.vectors, self.neo4j_driver, keep=keep)
+
 
     # -------------------- HYBRID QUERY PIPELINE + ReRank--------------------
     def query_hybrid(self,user_query, user_query_embedding, limit=3):
@@ -253,24 +315,24 @@ class HybridRAG:
         """
         # Step 1: Semantic search in Weaviate with hybrid search
         # First fetch more results than we need for reranking
-        coll = self.weaviate_client.collections.get("RestaurantChunk")
-        vector_results = coll.query.hybrid(
-            query=user_query,
-            vector=user_query_embedding,
-            alpha=0.25,  # Balance between vector and keyword search (adjust as needed)
-            limit=rerank_limit  # Get more results initially for reranking
+        hits = self.vectors.search(
+            self.version,
+            user_query,
+            user_query_embedding,
+            limit=rerank_limit,  # Get more results initially for reranking
+            alpha=0.25  # Balance between vector and keyword search (adjust as needed)
         )
         
         # Extract chunk IDs and initial context
         initial_results = []
         chunk_ids = []
         
-        for obj in vector_results.objects:
+        for hit in hits:
             # Get metadata and text content from each result
-            metadata = obj.properties
-            chunk_id = metadata.get("chunk_id")
+            metadata = hit["properties"]
+            chunk_id = hit["chunk_id"]
             text_content = metadata.get("text", metadata.get("markdown", ""))
-            score = obj.metadata.score  # Get the hybrid search score
+            score = hit["score"]  # Get the hybrid search score
             
             # Store all information for reranking
             if text_content:
@@ -321,7 +383,7 @@ class HybridRAG:
                     
                 # Find the chunk and its connections
                 graph_query = """
-                MATCH (c:Chunk {id: $chunk_id})
+                MATCH (c:Chunk {id: $chunk_id, version: $version})
                 OPTIONAL MATCH (r:Restaurant)-[:HAS_CHUNK]->(c)
                 OPTIONAL MATCH (d:Dish)-[:HAS_CHUNK]->(c)
                 OPTIONAL MATCH (r:Restaurant)-[s:SERVES]->(d2:Dish)
@@ -331,7 +393,7 @@ class HybridRAG:
                     COLLECT(DISTINCT {name: d.name}) AS related_dishes,
                     COLLECT(DISTINCT {name: d2.name, price: s.price}) AS menu_items
                 """
-                graph_result = session.run(graph_query, chunk_id=chunk_id).single()
+                graph_result = session.run(graph_query, chunk_id=chunk_id, version=self.version).single()
                 
                 if graph_result:
                     # Get the original chunk text
@@ -372,8 +434,8 @@ class HybridRAG:
     def close(self):
         if self.neo4j_driver:
             self.neo4j_driver.close()
-        if self.weaviate_client:
-            self.weaviate_client.close()
+        if self.vectors:
+            self.vectors.close()
 
 
 # -------------------- MAIN PIPELINE --------------------
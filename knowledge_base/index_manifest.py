@@ -0,0 +1,129 @@
+"""
+Run manifest for incremental knowledge-base builds.
+
+For every source page (keyed by url) we remember the hash of the content that was last
+indexed and the chunk ids it produced. On the next run a page whose hash is unchanged is
+skipped entirely, a changed page has its stale chunks tombstoned, and pages that disappeared
+from the datalake are tombstoned as a whole. The manifest also keeps a watermark (latest crawl
+timestamp indexed), the index version the pages live in, and a short history of runs.
+"""
+import os
+import json
+from datetime import datetime, timezone
+
+from ingestion.datalake import content_hash
+
+MANIFEST_PATH = os.getenv(
+    "KB_MANIFEST_PATH",
+    os.path.join(os.path.dirname(__file__), "state", "manifest.json")
+)
+MAX_RUN_HISTORY = 20
+
+
+def page_hash(record: dict) -> str:
+    """Hash of the page bodies the chunkers read; any change here means re-chunking."""
+    # Rows ingested with upserts carry the datalake's content key already; reuse it so offloaded
+    # bodies don't have to be decompressed just to find out nothing changed. Other rows are
+    # hashed the same way, so the manifest and the datalake agree on what counts as a change
+    return record.get("content_hash") or content_hash(record)
+
+
+class IndexManifest:
+    """
+    JSON-backed manifest of what is currently indexed in Weaviate/Neo4j.
+
+    Layout:
+        {
+          "version": 3,
+          "watermark": "2025-04-22T08:39:58.889000",
+          "pages": {url: {"restaurant_name", "page_hash", "chunk_ids", "indexed_at"}},
+          "runs": [{"mode", "started_at", "finished_at", ...counts}]
+        }
+    """
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.pages = {}
+        self.watermark = None
+        self.version = None
+        self.runs = []
+        self._run = None
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.pages = data.get("pages", {})
+            self.watermark = data.get("watermark")
+            self.version = data.get("version")
+            self.runs = data.get("runs", [])
+
+    def reset(self, version=None):
+        """Forget everything indexed so far (full rebuilds, or the live version changed)."""
+        self.pages = {}
+        self.watermark = None
+        self.version = version
+
+    # --- Pages ---
+    def is_unchanged(self, url: str, content_hash: str) -> bool:
+        entry = self.pages.get(url)
+        return entry is not None and entry.get("page_hash") == content_hash
+
+    def chunk_ids(self, url: str) -> set:
+        return set(self.pages.get(url, {}).get("chunk_ids", []))
+
+    def urls(self) -> set:
+        return set(self.pages)
+
+    def record_page(self, url: str, restaurant_name: str, content_hash: str, chunk_ids):
+        self.pages[url] = {
+            "restaurant_name": restaurant_name,
+            "page_hash": content_hash,
+            "chunk_ids": sorted(chunk_ids),
+            "indexed_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def drop_page(self, url: str) -> set:
+        """Remove a page from the manifest and return the chunk ids it owned."""
+        return set(self.pages.pop(url, {}).get("chunk_ids", []))
+
+    # --- Watermark ---
+    def advance_watermark(self, ts):
+        if ts is None:
+            return
+        ts = ts.isoformat() if isinstance(ts, datetime) else str(ts)
+        if self.watermark is None or ts > self.watermark:
+            self.watermark = ts
+
+    # --- Runs ---
+    def start_run(self, mode: str):
+        self._run = {
+            "mode": mode,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "pages_indexed": 0,
+            "pages_skipped": 0,
+            "pages_removed": 0,
+            "chunks_added": 0,
+            "chunks_near_dup": 0,
+            "chunks_readmitted": 0,
+            "chunks_tombstoned": 0,
+        }
+        return self._run
+
+    def finish_run(self):
+        if self._run is None:
+            return
+        self._run["finished_at"] = datetime.now(timezone.utc).isoformat()
+        self._run["watermark"] = self.watermark
+        self._run["version"] = self.version
+        self.runs = (self.runs + [self._run])[-MAX_RUN_HISTORY:]
+        self._run = None
+
+    def save(self):
+        """Write atomically so a crash mid-save never leaves a truncated manifest."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": self.version, "watermark": self.watermark,
+                 "pages": self.pages, "runs": self.runs},
+                f, indent=2, default=str
+            )
+        os.replace(tmp_path, self.path)
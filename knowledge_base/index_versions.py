@@ -0,0 +1,112 @@
+"""
+Blue/green versions of the RestaurantChunk index.
+
+Every full rebuild writes into a fresh vector collection `RestaurantChunk_v{n}` and tags its
+Neo4j Chunk nodes with `version = n`. Readers never address a version directly; they resolve the
+`IndexAlias` node in Neo4j, which the builder flips in a single transaction once the new version
+passes validation. Version 0 is the legacy unversioned `RestaurantChunk` collection.
+"""
+import re
+
+INDEX_ALIAS = "RestaurantChunk"
+_VERSION_RE = re.compile(rf"^{INDEX_ALIAS}_v(\d+)$")
+
+
+def collection_name(version: int) -> str:
+    return INDEX_ALIAS if not version else f"{INDEX_ALIAS}_v{version}"
+
+
+def parse_collection_name(name: str):
+    """Index version of a collection name, or None if it is not one of ours."""
+    if name == INDEX_ALIAS:
+        return 0
+    m = _VERSION_RE.match(name)
+    return int(m.group(1)) if m else None
+
+
+def resolve_alias(neo4j_driver, alias: str = INDEX_ALIAS):
+    """Return the live index version the alias points to, or None if it was never set."""
+    with neo4j_driver.session() as session:
+        record = session.run(
+            "MATCH (a:IndexAlias {name: $alias}) RETURN a.version AS version",
+            alias=alias
+        ).single()
+    return record["version"] if record else None
+
+
+def switch_alias(neo4j_driver, version: int, alias: str = INDEX_ALIAS):
+    """Atomically point the alias at `version`; readers see either the old or the new one."""
+    with neo4j_driver.session() as session:
+        session.run(
+            """
+            MERGE (a:IndexAlias {name: $alias})
+            SET a.previous = a.version, a.version = $version, a.switched_at = datetime()
+            """,
+            alias=alias,
+            version=version
+        )
+    print(f"Alias {alias} now points to {collection_name(version)}")
+
+
+def list_versions(vectors) -> list[int]:
+    """All index versions that currently exist in the vector backend."""
+    return vectors.list_versions()
+
+
+def count_version(vectors, neo4j_driver, version: int):
+    """Return (vector_objects, neo4j_chunks) for one index version."""
+    vector_count = vectors.count(version)
+    with neo4j_driver.session() as session:
+        graph_count = session.run(
+            """
+            MATCH (c:Chunk {version: $version})
+            WHERE c.tombstoned_at IS NULL
+            RETURN count(c) AS n
+            """,
+            version=version
+        ).single()["n"]
+    return vector_count, graph_count
+
+
+def validate_version(vectors, neo4j_driver, version: int, live_version=None, min_ratio: float = 0.5):
+    """
+    Sanity checks before a version may go live:
+      - it is non-empty in both stores and both stores agree on the chunk count
+      - it is not drastically smaller than the version currently serving traffic
+    Returns (ok, reason).
+    """
+    vector_count, graph_count = count_version(vectors, neo4j_driver, version)
+    if vector_count == 0 or graph_count == 0:
+        return False, f"empty index (vectors={vector_count}, neo4j={graph_count})"
+    if vector_count != graph_count:
+        return False, f"stores disagree (vectors={vector_count}, neo4j={graph_count})"
+    if live_version is not None and live_version != version:
+        live_count, _ = count_version(vectors, neo4j_driver, live_version)
+        if live_count and vector_count < min_ratio * live_count:
+            return False, f"only {vector_count} chunks vs {live_count} in live version {live_version}"
+    return True, f"{vector_count} chunks"
+
+
+def garbage_collect(vectors, neo4j_driver, keep: int = 2, alias: str = INDEX_ALIAS):
+    """
+    Drop all but the newest `keep` versions. The live version is never dropped, and the
+    previous one is kept (when keep >= 2) so long-lived readers can finish on it.
+    """
+    live = resolve_alias(neo4j_driver, alias)
+    versions = list_versions(vectors)
+    retained = set(versions[-keep:]) if keep > 0 else set()
+    if live is not None:
+        retained.add(live)
+    dropped = [v for v in versions if v not in retained]
+    for version in dropped:
+        vectors.drop_version(version)
+        with neo4j_driver.session() as session:
+            session.run(
+                """
+                MATCH (c:Chunk {version: $version})
+                CALL { WITH c DETACH DELETE c } IN TRANSACTIONS OF 1000 ROWS
+                """,
+                version=version
+            )
+        print(f"Garbage-collected index version {version}")
+    return dropped
@@ -0,0 +1,163 @@
+"""
+Near-duplicate chunk filter (MinHash + LSH banding), applied before embedding.
+
+The chunking strategies overlap heavily, so many chunks differ from an already indexed one
+only by whitespace, punctuation or a line of boilerplate. Each chunk gets a MinHash signature
+over its word shingles; signatures are split into bands, and chunks sharing any band bucket
+are compared on their estimated Jaccard similarity. Chunks are only compared within the same
+restaurant, so a shared footer never removes another restaurant's menu.
+
+The index lives in memory and can be persisted next to the manifest between runs.
+"""
+import os
+import hashlib
+
+import numpy as np
+
+from knowledge_base.corpus_stats import tokenize
+
+NEAR_DUP_THRESHOLD = float(os.getenv("KB_NEAR_DUP_THRESHOLD", "0.9"))
+NEAR_DUP_NUM_PERM = int(os.getenv("KB_NEAR_DUP_NUM_PERM", "128"))
+NEAR_DUP_PATH = os.getenv(
+    "KB_NEAR_DUP_PATH",
+    os.path.join(os.path.dirname(__file__), "state", "near_dup.npz")
+)
+SHINGLE_SIZE = 3
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def _lsh_params(threshold: float, num_perm: int) -> tuple[int, int]:
+    """
+    Pick (bands, rows) with bands * rows == num_perm whose S-curve midpoint (1/b)^(1/r) is as
+    high as possible without exceeding the threshold, so true near-duplicates are rarely missed.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD, num_perm: int = NEAR_DUP_NUM_PERM,
+                 seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = _lsh_params(threshold, num_perm)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+        self.signatures = {}  # chunk_id -> (scope, signature)
+        self.buckets = {}     # (scope, band, band bytes) -> set of chunk_ids
+        self.checked = 0
+        self.skipped = 0
+
+    # --- Signatures ---
+    def signature(self, text: str):
+        """MinHash signature of the text's word shingles; None for texts without words."""
+        tokens = tokenize(text)
+        if not tokens:
+            return None
+        n = min(SHINGLE_SIZE, len(tokens))
+        shingles = {" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+             for s in shingles),
+            dtype=np.uint64, count=len(shingles),
+        )
+        hashes %= _MERSENNE_PRIME
+        # (a * x + b) mod p stays below 2^62, so uint64 never overflows
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+    def _band_keys(self, scope: str, signature):
+        for band in range(self.bands):
+            yield (scope, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+
+    # --- Lookup / update ---
+    def find(self, scope: str, signature):
+        """Chunk id of an indexed near-duplicate in the same scope, or None."""
+        if signature is None:
+            return None
+        candidates = set()
+        for key in self._band_keys(scope, signature):
+            candidates |= self.buckets.get(key, set())
+        best, best_sim = None, self.threshold
+        for chunk_id in candidates:
+            sim = float(np.mean(self.signatures[chunk_id][1] == signature))
+            if sim >= best_sim:
+                best, best_sim = chunk_id, sim
+        return best
+
+    def add(self, scope: str, chunk_id: str, signature):
+        if signature is None or chunk_id in self.signatures:
+            return
+        self.signatures[chunk_id] = (scope, signature)
+        for key in self._band_keys(scope, signature):
+            self.buckets.setdefault(key, set()).add(chunk_id)
+
+    def check(self, scope: str, chunk_id: str, text: str):
+        """
+        Return the chunk id this text duplicates, or None after indexing it under `chunk_id`.
+        Chunks that are already indexed under the same id are never their own duplicate.
+        """
+        self.checked += 1
+        if chunk_id in self.signatures:
+            return None
+        signature = self.signature(text)
+        dup_of = self.find(scope, signature)
+        if dup_of is not None:
+            self.skipped += 1
+            return dup_of
+        self.add(scope, chunk_id, signature)
+        return None
+
+    def remove(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            entry = self.signatures.pop(chunk_id, None)
+            if entry is None:
+                continue
+            scope, signature = entry
+            for key in self._band_keys(scope, signature):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(chunk_id)
+                    if not bucket:
+                        del self.buckets[key]
+
+    def __len__(self):
+        return len(self.signatures)
+
+    # --- Persistence ---
+    def save(self, path: str = NEAR_DUP_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        ids = list(self.signatures)
+        matrix = np.stack([self.signatures[i][1] for i in ids]) if ids \
+            else np.empty((0, self.num_perm), dtype=np.uint64)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            ids=np.array(ids, dtype=str),
+            scopes=np.array([self.signatures[i][0] for i in ids], dtype=str),
+            signatures=matrix,
+            params=np.array([self.threshold, self.num_perm]),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = NEAR_DUP_PATH, threshold: float = NEAR_DUP_THRESHOLD,
+             num_perm: int = NEAR_DUP_NUM_PERM):
+        """Load a persisted index; starts empty if none exists or it was built with other settings."""
+        index = cls(threshold=threshold, num_perm=num_perm)
+        if not os.path.exists(path):
+            return index
+        data = np.load(path)
+        if tuple(data["params"]) != (threshold, num_perm):
+            print(f"Near-duplicate index at {path} was built with other settings; starting fresh")
+            return index
+        for chunk_id, scope, signature in zip(data["ids"], data["scopes"], data["signatures"]):
+            index.add(str(scope), str(chunk_id), signature)
+        return index
@@ -1,34 +1,189 @@
 
-import json
+import asyncio
 import uuid
+from collections import Counter
 from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, AsyncIterator, Optional, Union
 
-async def normalize_records(processed: dict) -> list[dict]:
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from ingestion.blob_store import BODY_FIELDS, resolve_bodies
+
+
+class CrawlPage(BaseModel):
+    """
+    Schema of one flat crawl page. Only metadata and body types are checked; bodies are not
+    copied into the model, so offloaded refs stay unread.
+    """
+    model_config = ConfigDict(extra="ignore")
+
+    restaurant_name: str = Field(min_length=1)
+    url: str = Field(min_length=1)
+    scraper_name: str = "Unknown"
+    base_url: str = ""
+    timestamp: Optional[datetime] = None
+    content_hash: Optional[str] = None
+    markdown: Optional[str] = None
+    html: Optional[str] = None
+    media: Union[dict, str, None] = None
+    markdown_ref: Optional[dict] = None
+    html_ref: Optional[dict] = None
+    media_ref: Optional[dict] = None
+
+
+class NormalizeStats:
+    """Accepted count and rejects by reason, e.g. {"missing:url": 3, "no_body": 1}."""
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = Counter()
+
+    def reject(self, reason: str):
+        self.rejected[reason] += 1
+
+    def summary(self) -> dict:
+        return {"accepted": self.accepted, "rejected": dict(self.rejected)}
+
+
+def flatten_crawl_output(doc, restaurant_name: str = None):
+    """
+    Yield flat page documents from either a flat datalake row or a nested crawl output
+    ({"base_url", "fetched": [{"url", "data": {...}}]}, or a list of those).
+    """
+    if isinstance(doc, list):
+        for item in doc:
+            yield from flatten_crawl_output(item, restaurant_name)
+        return
+    if not isinstance(doc, dict) or "fetched" not in doc:
+        if restaurant_name and isinstance(doc, dict):
+            doc = {**doc, "restaurant_name": restaurant_name}
+        yield doc
+        return
+
+    restaurant_name = restaurant_name or doc.get("restaurant_name")
+    for entry in doc.get("fetched") or []:
+        if not isinstance(entry, dict):
+            yield entry
+            continue
+        data = entry.get("data") or {}
+        content = data.get("content") or {}
+        page = {
+            "restaurant_name": restaurant_name,
+            "scraper_name": entry.get("scraper_name") or doc.get("scraper_name", "Crawl4AIFetcher"),
+            "base_url": doc.get("base_url", ""),
+            "url": entry.get("url"),
+            "timestamp": (data.get("metadata") or {}).get("timestamp"),
+            "media": data.get("media", {}),
+        }
+        for field in ("markdown", "html"):
+            value = data.get(field, content.get(field))
+            if value is not None:
+                page[field] = value
+        yield page
+
+
+def normalize_record(info: Any, restaurant_name: str = None, stats: NormalizeStats = None):
+    """
+    Validate and normalize one flat page document; returns None (and counts the reason)
+    when it is rejected. Bodies offloaded to the blob store stay as refs and are only
+    decompressed when read.
+    """
+    stats = stats if stats is not None else NormalizeStats()
+    if not isinstance(info, dict):
+        stats.reject("not_a_mapping")
+        return None
+    if restaurant_name:
+        info = {**info, "restaurant_name": restaurant_name}
+    try:
+        page = CrawlPage.model_validate(info)
+    except ValidationError as e:
+        err = e.errors()[0]
+        stats.reject(f"{err['type']}:{'.'.join(str(p) for p in err['loc'])}")
+        return None
+    if not any(getattr(page, f) is not None or getattr(page, f"{f}_ref") is not None
+               for f in ("markdown", "html")):
+        stats.reject("no_body")
+        return None
+
+    record = {
+        "chunk_id": f"{page.restaurant_name}_{uuid.uuid4()}",
+        "scraper_name": page.scraper_name,
+        "restaurant_name": page.restaurant_name,
+        "base_url": page.base_url,
+        "url": page.url,
+        "timestamp": page.timestamp or datetime.now(timezone.utc),
+    }
+    if page.content_hash:
+        record["content_hash"] = page.content_hash
+    if "_id" in info and isinstance(info.get("timestamp"), datetime):
+        # Read position in the datalake, so consumers can checkpoint what they processed
+        record["source_position"] = (info.get("timestamp"), info["_id"])
+    for field, default in zip(BODY_FIELDS, ("", "", {})):
+        ref = getattr(page, f"{field}_ref")
+        if ref is not None:
+            record[f"{field}_ref"] = ref
+        else:
+            value = getattr(page, field)
+            record[field] = default if value is None else value
+    stats.accepted += 1
+    return resolve_bodies(record)
+
+
+# --- Async streaming ---
+async def aiter_sync(iterable, chunk_size: int = 100) -> AsyncIterator:
+    """
+    Drive a blocking iterator (e.g. a Mongo cursor) from a worker thread, reading the next
+    chunk while the caller is still working on the current one.
+    """
+    it = iter(iterable)
+    pending = asyncio.ensure_future(asyncio.to_thread(lambda: list(islice(it, chunk_size))))
+    try:
+        while True:
+            chunk = await pending
+            if not chunk:
+                return
+            pending = asyncio.ensure_future(asyncio.to_thread(lambda: list(islice(it, chunk_size))))
+            for item in chunk:
+                yield item
+    finally:
+        pending.cancel()
+
+
+async def normalize_stream(source, batch_size: int = 100, stats: NormalizeStats = None,
+                           restaurant_name: str = None) -> AsyncIterator[list[dict]]:
+    """
+    Normalize documents from an async iterator (plain iterables are read via `aiter_sync`)
+    and yield them in batches of up to `batch_size`. Nested crawl outputs are flattened
+    first; rejects are counted in `stats` instead of being silently dropped.
+    """
+    stats = stats if stats is not None else NormalizeStats()
+    if not hasattr(source, "__aiter__"):
+        source = aiter_sync(source)
+
+    batch = []
+    async for doc in source:
+        for page in flatten_crawl_output(doc, restaurant_name):
+            record = normalize_record(page, stats=stats)
+            if record is None:
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+async def normalize_records(processed: dict, stats: NormalizeStats = None) -> list[dict]:
+    """Normalize a {restaurant_name: document(s)} mapping in one go."""
+    stats = stats if stats is not None else NormalizeStats()
     flattened = []
-    
     for restaurant_name, info in processed.items():
         print(f" Normalizing: {restaurant_name}")
-        base_url = info.get("base_url", "")
-        
-        # Case 1: Direct/Flat document
-        if "markdown" in info or "html" in info:
-            ts = info.get("timestamp")
-            if not isinstance(ts, datetime):
-                try:
-                    ts = datetime.fromisoformat(ts)
-                except:
-                    ts = datetime.now(timezone.utc)
-
-            flattened.append({
-                "chunk_id": f"{restaurant_name}_{uuid.uuid4()}",
-                "scraper_name": info.get("scraper_name", "Unknown"),
-                "restaurant_name": restaurant_name,
-                "base_url": base_url,
-                "url": info.get("url", ""),
-                "markdown": info.get("markdown", ""),
-                "html": info.get("html", ""),
-                "media": info.get("media", {}),
-                "timestamp": ts
-            })
+        for page in flatten_crawl_output(info, restaurant_name):
+            record = normalize_record(page, stats=stats)
+            if record is not None:
+                flattened.append(record)
+    if stats.rejected:
+        print(f" Rejected records: {dict(stats.rejected)}")
     return flattened
-
@@ -0,0 +1,39 @@
+"""
+Chunk text cleaning, applied once at index time so retrieval can use stored text as is.
+
+Strips HTML (with scripts and styles), markdown images and link targets, and collapses
+whitespace, while keeping line breaks: menus are line-oriented ("Paneer Tikka ₹320"),
+and the context packer works line by line.
+"""
+import re
+
+from bs4 import BeautifulSoup
+
+HTML_TAG_RE = re.compile(r"<\s*/?\s*[a-zA-Z][a-zA-Z0-9]*(?:\s[^<>]*)?/?\s*>")
+MD_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+MD_LINK_RE = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+SPACES_RE = re.compile(r"[ \t\u00a0\u200b]+")
+
+
+def looks_like_html(text: str) -> bool:
+    return bool(text) and HTML_TAG_RE.search(text) is not None
+
+
+def clean_chunk_text(text: str) -> str:
+    """Plain, line-preserving text of a chunk."""
+    if not text:
+        return ""
+    if looks_like_html(text):
+        soup = BeautifulSoup(text, "html.parser")
+        for tag in soup(["script", "style", "noscript"]):
+            tag.decompose()
+        text = soup.get_text(separator="\n")
+    text = MD_IMAGE_RE.sub("", text)
+    text = MD_LINK_RE.sub(r"\1", text)
+    lines = []
+    for line in text.splitlines():
+        line = SPACES_RE.sub(" ", line).strip()
+        # Drop blank lines and immediate repeats (nav bars, repeated headers)
+        if line and (not lines or lines[-1] != line):
+            lines.append(line)
+    return "\n".join(lines)
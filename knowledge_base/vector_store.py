@@ -0,0 +1,673 @@
+"""
+Pluggable vector stores behind HybridRAG.
+
+Both backends address the same blue/green index versions (see index_versions):
+
+- "weaviate" (default): one Weaviate Cloud collection per version, hybrid search server-side.
+- "local": an in-process index per version under VECTOR_INDEX_DIR, for single-node
+  deployments and offline tests. Vectors are appended to a raw float32 file that readers
+  memory-map, and chunk properties to an append-only JSON-lines log. Search is exact
+  cosine over the mmap'd matrix, or HNSW when `hnswlib` is installed and the index is large
+  enough. Each version also keeps a BM25 keyword index over the chunk text, fused with
+  the vector ranking (HYBRID_FUSION=alpha|rrf), so hybrid retrieval runs fully in-process.
+  Indexes are loaded lazily on first use and re-read when the builder appends or compacts.
+
+Select the backend with VECTOR_BACKEND=weaviate|local.
+"""
+import os
+import json
+import shutil
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from knowledge_base.index_versions import collection_name, parse_collection_name
+from knowledge_base.bm25_index import BM25Index, fuse_alpha, fuse_rrf
+
+load_dotenv()
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "weaviate")
+VECTOR_INDEX_DIR = os.getenv(
+    "VECTOR_INDEX_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "vector_index")
+)
+# Below this many rows an exact scan is as fast as HNSW and needs no build step
+HNSW_MIN_ROWS = int(os.getenv("HNSW_MIN_ROWS", "5000"))
+# "alpha": Weaviate-style relative score fusion; "rrf": reciprocal rank fusion
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "alpha")
+# Candidates taken from each ranking before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+# Snapshot the keyword index once this many log entries had to be replayed on load
+BM25_SNAPSHOT_EVERY = 1000
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _normalize(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+# -------------------- LOCAL INDEX --------------------
+class LocalVectorIndex:
+    """
+    On-disk index of one version:
+        CURRENT         name of the live generation directory ("g3"); absent until the
+                        first compaction, when the files below sit in the version directory
+        g3/meta.json        {"dim": 384}
+        g3/vectors.f32      unit-normalized float32 rows, appended
+        g3/records.jsonl    {"row", "id", "properties"} per upsert, {"delete": id} per delete
+        g3/bm25.npz         keyword index snapshot plus the log offset it covers
+    Replaying the log gives the live row of every chunk id; superseded rows stay in the
+    matrix (masked out) until `compact()` writes them into a new generation and switches
+    CURRENT over with one atomic rename. Only log entries past the snapshot offset have to
+    be re-tokenized for the keyword index.
+
+    Reloads and writes hold a lock; reads work on the state they picked up under it, so a
+    reload from another thread never changes an index under a running search.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.pointer_path = os.path.join(path, "CURRENT")
+        self._lock = threading.RLock()
+        self._use_generation(self._current_generation())
+        self.dim = None
+        self.row_of = {}         # chunk_id -> live row
+        self.id_at = {}          # live row -> chunk_id
+        self.properties = {}     # live row -> properties
+        self.by_restaurant = {}  # lowercased restaurant_name -> live chunk ids
+        self.bm25 = BM25Index()
+        self._bm25_pending = 0   # keyword updates not yet in the snapshot
+        self.n_rows = 0
+        self.matrix = None
+        self._live = None        # bool mask over rows
+        self._ann = None
+        self._loaded_size = None
+
+    # --- Generations ---
+    def _current_generation(self) -> str:
+        """Live generation directory name; "" for files directly in the version directory."""
+        try:
+            with open(self.pointer_path, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return ""
+
+    def _use_generation(self, generation: str):
+        self.generation = generation
+        self.dir = os.path.join(self.path, generation) if generation else self.path
+        self.meta_path = os.path.join(self.dir, "meta.json")
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.log_path = os.path.join(self.dir, "records.jsonl")
+        self.bm25_path = os.path.join(self.dir, "bm25.npz")
+
+    def _switch_generation(self, generation: str):
+        """Point CURRENT at `generation` (atomic: readers see the old or the new one)."""
+        tmp_path = f"{self.pointer_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(generation)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.pointer_path)
+
+    def _prune_generations(self, keep: set):
+        """
+        Delete generations not in `keep`. The one just replaced is kept until the next
+        compaction, so a reader in another process that read CURRENT just before the switch
+        can still open its files.
+        """
+        for name in os.listdir(self.path):
+            full = os.path.join(self.path, name)
+            if os.path.isdir(full) and name.startswith("g") and name not in keep:
+                shutil.rmtree(full, ignore_errors=True)
+        if "" not in keep:
+            for name in os.listdir(self.path):
+                if name in ("meta.json", "vectors.f32", "records.jsonl", "bm25.npz") or name.startswith("hnsw_"):
+                    os.remove(os.path.join(self.path, name))
+
+    # --- Loading ---
+    def _load(self):
+        size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        self.row_of, self.id_at, self.properties, self.by_restaurant = {}, {}, {}, {}
+        self.n_rows = 0
+        self._loaded_size = size
+        self._invalidate()
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        bm25, extras = BM25Index.load(self.bm25_path)
+        covered = extras.get("log_offset", 0)
+        if bm25 is None or covered > size:
+            bm25, covered = BM25Index(), 0
+        self.bm25 = bm25
+        self._bm25_pending = 0
+        if not size or self.dim is None:
+            return
+
+        self.n_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+        offset = 0
+        with open(self.log_path, "rb") as f:
+            for line in f:
+                offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn last line of an interrupted write
+                replay = offset > covered
+                if "delete" in entry:
+                    self._forget(entry["delete"], keyword=replay)
+                elif entry["row"] < self.n_rows:
+                    self._remember(entry["id"], entry["row"], entry["properties"], keyword=replay)
+        if self._bm25_pending >= BM25_SNAPSHOT_EVERY:
+            self.save_keyword_index()
+
+    def _remember(self, chunk_id, row, properties, keyword: bool = True):
+        self._forget(chunk_id, keyword=False)
+        self.row_of[chunk_id] = row
+        self.id_at[row] = chunk_id
+        self.properties[row] = properties
+        restaurant = (properties.get("restaurant_name") or "").lower()
+        if restaurant:
+            self.by_restaurant.setdefault(restaurant, set()).add(chunk_id)
+        if keyword:
+            self.bm25.add(chunk_id, properties.get("text") or properties.get("markdown") or "")
+            self._bm25_pending += 1
+
+    def _forget(self, chunk_id, keyword: bool = True):
+        row = self.row_of.pop(chunk_id, None)
+        self.id_at.pop(row, None)
+        properties = self.properties.pop(row, None)
+        if properties:
+            self.by_restaurant.get((properties.get("restaurant_name") or "").lower(), set()).discard(chunk_id)
+        if keyword:
+            self.bm25.remove(chunk_id)
+            self._bm25_pending += 1
+
+    def save_keyword_index(self):
+        """Snapshot the keyword index together with the log offset it reflects."""
+        if os.path.isdir(self.dir):
+            self.bm25.save(self.bm25_path, log_offset=self._loaded_size or 0)
+            self._bm25_pending = 0
+
+    def _invalidate(self):
+        self.matrix, self._live, self._ann = None, None, None
+
+    def _ensure_matrix(self):
+        """Memory-map the vectors file and mask out superseded/deleted rows."""
+        if self.matrix is None and self.n_rows:
+            self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                    shape=(self.n_rows, self.dim))
+            self._live = np.zeros(self.n_rows, dtype=bool)
+            self._live[list(self.row_of.values())] = True
+        return self.matrix
+
+    def _maybe_reload(self):
+        with self._lock:
+            for attempt in range(3):
+                generation = self._current_generation()
+                if generation != self.generation:
+                    # Compacted by another process
+                    self._use_generation(generation)
+                    self._loaded_size = None
+                size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+                if size == self._loaded_size:
+                    return
+                try:
+                    self._load()
+                    return
+                except FileNotFoundError:
+                    # Compacted twice more while loading, so the generation read is gone; follow CURRENT
+                    if attempt == 2 or self._current_generation() == generation:
+                        raise
+
+    def _view(self):
+        """
+        (row_of, id_at, properties, matrix, live mask, HNSW index or None, bm25) as of now,
+        for one read. `_load` and `compact` replace these objects rather than clearing them,
+        so a view stays consistent while a reload runs.
+        """
+        with self._lock:
+            for attempt in range(3):
+                self._maybe_reload()
+                try:
+                    self._ensure_matrix()
+                    return (self.row_of, self.id_at, self.properties, self.matrix, self._live,
+                            self._ann_index(), self.bm25)
+                except FileNotFoundError:
+                    # The generation was pruned between loading its log and mapping its vectors
+                    if attempt == 2:
+                        raise
+                    self._invalidate()
+
+    def _ann_index(self):
+        """HNSW over the current rows, built (or loaded from disk) on first use."""
+        if hnswlib is None or self._ensure_matrix() is None or len(self.row_of) < HNSW_MIN_ROWS:
+            return None
+        if self._ann is not None:
+            return self._ann
+        n_rows = self.matrix.shape[0]
+        ann_path = os.path.join(self.dir, f"hnsw_{n_rows}.bin")
+        ann = hnswlib.Index(space="ip", dim=self.dim)
+        if os.path.exists(ann_path):
+            ann.load_index(ann_path, max_elements=n_rows)
+        else:
+            ann.init_index(max_elements=n_rows, ef_construction=200, M=16)
+            ann.add_items(np.asarray(self.matrix), np.arange(n_rows))
+            for stale in (f for f in os.listdir(self.dir) if f.startswith("hnsw_")):
+                os.remove(os.path.join(self.dir, stale))
+            ann.save_index(ann_path)
+        for row in np.flatnonzero(~self._live):
+            ann.mark_deleted(int(row))
+        ann.set_ef(max(64, HNSW_MIN_ROWS // 100))
+        self._ann = ann
+        return ann
+
+    # --- Writes ---
+    def upsert(self, items: list[dict]):
+        """items: [{"id", "vector", "properties"}]; a re-upserted id supersedes its old row."""
+        if not items:
+            return
+        with self._lock:
+            self._upsert(items)
+
+    def _upsert(self, items: list[dict]):
+        self._maybe_reload()
+        os.makedirs(self.dir, exist_ok=True)
+        if self.dim is None:
+            self.dim = len(items[0]["vector"])
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim}, f)
+        row = 0
+        if os.path.exists(self.vectors_path):
+            row_bytes = 4 * self.dim
+            size = os.path.getsize(self.vectors_path)
+            row = size // row_bytes
+            if size % row_bytes:
+                # Drop a partially written row left behind by a crash
+                with open(self.vectors_path, "r+b") as f:
+                    f.truncate(row * row_bytes)
+        # Vectors first: a log entry never points at a row that is not on disk
+        with open(self.vectors_path, "ab") as f:
+            for item in items:
+                f.write(_normalize(item["vector"]).tobytes())
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            for i, item in enumerate(items):
+                f.write(json.dumps({"row": row + i, "id": item["id"], "properties": item["properties"]},
+                                   default=_json_default) + "\n")
+            f.flush()
+            self._loaded_size = f.tell()
+        for i, item in enumerate(items):
+            self._remember(item["id"], row + i, json.loads(json.dumps(item["properties"], default=_json_default)))
+        self.n_rows = row + len(items)
+        self._invalidate()
+
+    def delete(self, chunk_ids):
+        with self._lock:
+            return self._delete(chunk_ids)
+
+    def _delete(self, chunk_ids):
+        self._maybe_reload()
+        chunk_ids = [c for c in chunk_ids if c in self.row_of]
+        if not chunk_ids:
+            return 0
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            for chunk_id in chunk_ids:
+                f.write(json.dumps({"delete": chunk_id}) + "\n")
+            f.flush()
+            self._loaded_size = f.tell()
+        for chunk_id in chunk_ids:
+            self._forget(chunk_id)
+        self._invalidate()
+        return len(chunk_ids)
+
+    def compact(self):
+        """Write the live rows into a new generation and switch CURRENT over to it."""
+        with self._lock:
+            self._maybe_reload()
+            if self._ensure_matrix() is None:
+                return
+            previous = self.generation
+            generation = f"g{int(previous[1:] or 0) + 1}"
+            final = os.path.join(self.path, generation)
+            tmp = f"{final}.tmp"
+            # Leftovers of a compaction that crashed before its switch
+            shutil.rmtree(tmp, ignore_errors=True)
+            shutil.rmtree(final, ignore_errors=True)
+            os.makedirs(tmp)
+            rows = sorted(self.row_of.items(), key=lambda kv: kv[1])
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as mf, \
+                    open(os.path.join(tmp, "vectors.f32"), "wb") as vf, \
+                    open(os.path.join(tmp, "records.jsonl"), "w", encoding="utf-8") as lf:
+                json.dump({"dim": self.dim}, mf)
+                for new_row, (chunk_id, row) in enumerate(rows):
+                    vf.write(np.asarray(self.matrix[row]).tobytes())
+                    lf.write(json.dumps({"row": new_row, "id": chunk_id, "properties": self.properties[row]},
+                                        default=_json_default) + "\n")
+                for f in (mf, vf, lf):
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp, final)
+            self._switch_generation(generation)
+            self._use_generation(generation)
+            self._load()
+            self.save_keyword_index()
+            self._prune_generations({previous, generation})
+
+    # --- Reads ---
+    def __len__(self):
+        self._maybe_reload()
+        return len(self.row_of)
+
+    def chunk_ids(self) -> set:
+        with self._lock:
+            self._maybe_reload()
+            return set(self.row_of)
+
+    def filter_ids(self, filters: dict) -> set:
+        """
+        Live chunk ids matching `filters`: {"restaurant_name": [names]} (case-insensitive)
+        and/or {"chunk_ids": [ids]}; both given means both must hold.
+        """
+        with self._lock:
+            self._maybe_reload()
+            ids = None
+            if filters.get("restaurant_name"):
+                ids = set()
+                for name in filters["restaurant_name"]:
+                    ids |= self.by_restaurant.get(name.lower(), set())
+            if filters.get("chunk_ids") is not None:
+                allowed = {c for c in filters["chunk_ids"] if c in self.row_of}
+                ids = allowed if ids is None else ids & allowed
+            return set(self.row_of) if ids is None else ids
+
+    def search(self, vector, limit: int = 10, chunk_ids=None) -> list[dict]:
+        """
+        Top `limit` live chunks by cosine similarity: [{"chunk_id", "properties", "score"}].
+        `chunk_ids` restricts the search to those chunks (an exact scan over just their rows).
+        """
+        row_of, id_at, properties, matrix, live, ann, _ = self._view()
+        if matrix is None or not row_of:
+            return []
+        q = _normalize(vector)
+        if chunk_ids is not None:
+            rows = np.fromiter((row_of[c] for c in chunk_ids if c in row_of), dtype=np.int64)
+            if not len(rows):
+                return []
+            k = min(limit, len(rows))
+            scores = np.asarray(matrix[rows]) @ q
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            rows, scores = rows[top], scores[top]
+            return [{"chunk_id": id_at[int(r)],
+                     "properties": properties[int(r)],
+                     "score": float(s)} for r, s in zip(rows, scores)]
+        k = min(limit, len(row_of))
+        if ann is not None:
+            labels, distances = ann.knn_query(q, k=k)
+            rows, scores = labels[0], 1.0 - distances[0]
+        else:
+            scores = matrix @ q
+            scores[~live] = -np.inf
+            rows = np.argpartition(-scores, k - 1)[:k]
+            rows = rows[np.argsort(-scores[rows])]
+            scores = scores[rows]
+        return [{"chunk_id": id_at[int(r)],
+                 "properties": properties[int(r)],
+                 "score": float(s)} for r, s in zip(rows, scores)]
+
+    def keyword_search(self, query: str, limit: int = 10, chunk_ids=None) -> list[dict]:
+        """Top `limit` live chunks by BM25: [{"chunk_id", "properties", "score"}]."""
+        row_of, _, properties, _, _, _, bm25 = self._view()
+        return [{"chunk_id": chunk_id,
+                 "properties": properties[row_of[chunk_id]],
+                 "score": score} for chunk_id, score in bm25.search(query, limit, allowed=chunk_ids)
+                if chunk_id in row_of]
+
+    def hybrid_search(self, query: str, vector, limit: int = 10, alpha: float = 0.25,
+                      fusion: str = HYBRID_FUSION, chunk_ids=None) -> list[dict]:
+        """
+        Fuse the vector and BM25 rankings. With "alpha", alpha weighs the vector side as in
+        Weaviate (1 = pure vector, 0 = pure keyword); "rrf" ignores alpha.
+        """
+        depth = max(limit, HYBRID_CANDIDATES)
+        row_of, _, properties, _, _, _, _ = self._view()
+        vector_hits = self.search(vector, depth, chunk_ids=chunk_ids) if vector is not None else []
+        keyword_hits = self.keyword_search(query, depth, chunk_ids=chunk_ids) if query else []
+        if fusion == "rrf":
+            fused = fuse_rrf([[h["chunk_id"] for h in vector_hits], [h["chunk_id"] for h in keyword_hits]])
+        else:
+            fused = fuse_alpha([(h["chunk_id"], h["score"]) for h in vector_hits],
+                               [(h["chunk_id"], h["score"]) for h in keyword_hits], alpha=alpha)
+        return [{"chunk_id": chunk_id,
+                 "properties": properties[row_of[chunk_id]],
+                 "score": score} for chunk_id, score in fused[:limit] if chunk_id in row_of]
+
+
+# -------------------- BACKENDS --------------------
+class LocalVectorBackend:
+    name = "local"
+
+    def __init__(self, root: str = VECTOR_INDEX_DIR):
+        self.root = os.path.abspath(root)
+        self._indexes = {}
+
+    def index(self, version: int) -> LocalVectorIndex:
+        if version not in self._indexes:
+            self._indexes[version] = LocalVectorIndex(os.path.join(self.root, collection_name(version)))
+        return self._indexes[version]
+
+    def ensure_collection(self, version: int, recreate: bool = False):
+        if recreate:
+            self.drop_version(version)
+        os.makedirs(self.index(version).path, exist_ok=True)
+
+    def list_versions(self) -> list[int]:
+        if not os.path.isdir(self.root):
+            return []
+        versions = (parse_collection_name(name) for name in os.listdir(self.root))
+        return sorted(v for v in versions if v is not None)
+
+    def count(self, version: int) -> int:
+        return len(self.index(version))
+
+    def drop_version(self, version: int):
+        shutil.rmtree(self.index(version).path, ignore_errors=True)
+        self._indexes.pop(version, None)
+
+    def upsert(self, version: int, items: list[dict]):
+        self.index(version).upsert(items)
+
+    def delete(self, version: int, chunk_ids) -> int:
+        return self.index(version).delete(chunk_ids)
+
+    def chunk_ids(self, version: int) -> set:
+        return self.index(version).chunk_ids()
+
+    def search(self, version: int, query: str, vector, limit: int = 10, alpha: float = 0.25,
+               filters: dict = None) -> list[dict]:
+        """
+        In-process hybrid search: vector + BM25, fused per HYBRID_FUSION. `filters`
+        ({"restaurant_name": [...], "chunk_ids": [...]}) restricts both rankings.
+        """
+        index = self.index(version)
+        chunk_ids = index.filter_ids(filters) if filters else None
+        return index.hybrid_search(query, vector, limit=limit, alpha=alpha, chunk_ids=chunk_ids)
+
+    def close(self):
+        for index in self._indexes.values():
+            if index._bm25_pending:
+                index.save_keyword_index()
+        self._indexes.clear()
+
+
+class WeaviateVectorBackend:
+    name = "weaviate"
+
+    def __init__(self, client=None):
+        if client is None:
+            import weaviate
+            from weaviate.classes.init import Auth
+            client = weaviate.connect_to_weaviate_cloud(
+                cluster_url=os.getenv("WEAVIATE_URL"),
+                auth_credentials=Auth.api_key(os.getenv("WEAVIATE_API_KEY"))
+            )
+        self.client = client
+        self.async_client = None
+
+    def _collection(self, version: int):
+        return self.client.collections.get(collection_name(version))
+
+    def ensure_collection(self, version: int, recreate: bool = False):
+        import weaviate.classes as wvc
+        from weaviate.classes.config import Property, DataType, Tokenization
+
+        name = collection_name(version)
+        exists = name in self.client.collections.list_all()
+        # Only drop the existing collection when explicitly asked to
+        if exists and recreate:
+            self.client.collections.delete(name)
+            exists = False
+        if exists:
+            return
+        self.client.collections.create(
+            name=name,
+            description="Chunks of menu text + metadata + optionally image captions",
+            properties=[
+                # Identifiers match whole values only: word tokenization would split ids and URLs
+                # into tokens ("https", "menu", ...) that unrelated objects share
+                Property(name="chunk_id", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+                Property(name="restaurant_name", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+                Property(name="url", data_type=DataType.TEXT),
+                Property(name="markdown", data_type=DataType.TEXT),
+                Property(name="vector_emb", data_type=DataType.NUMBER_ARRAY),
+                Property(name="metadata", data_type=DataType.TEXT),
+            ],
+            vectorizer_config=wvc.config.Configure.Vectorizer.none(),  # embeddings come from us
+        )
+
+    def list_versions(self) -> list[int]:
+        versions = (parse_collection_name(name) for name in self.client.collections.list_all())
+        return sorted(v for v in versions if v is not None)
+
+    def count(self, version: int) -> int:
+        if collection_name(version) not in self.client.collections.list_all():
+            return 0
+        return self._collection(version).aggregate.over_all(total_count=True).total_count or 0
+
+    def drop_version(self, version: int):
+        self.client.collections.delete(collection_name(version))
+
+    def upsert(self, version: int, items: list[dict]):
+        import weaviate.util
+        coll = self._collection(version)
+        for item in items:
+            uuid = weaviate.util.generate_uuid5(item["id"])
+            # Upsert, so rewriting a chunk after a crash or an embedding model change works
+            if coll.data.exists(uuid):
+                coll.data.replace(uuid=uuid, properties=item["properties"], vector=item["vector"])
+            else:
+                coll.data.insert(properties=item["properties"], uuid=uuid, vector=item["vector"])
+
+    def delete(self, version: int, chunk_ids, batch_size: int = 100) -> int:
+        import weaviate.util
+        from weaviate.classes.query import Filter
+        # By object uuid (derived from the chunk id on upsert): exact whatever the tokenization
+        # of the chunk_id property in collections created before it was field-tokenized
+        uuids = [weaviate.util.generate_uuid5(chunk_id) for chunk_id in chunk_ids]
+        coll = self._collection(version)
+        for i in range(0, len(uuids), batch_size):
+            coll.data.delete_many(where=Filter.by_id().contains_any(uuids[i:i + batch_size]))
+        return len(uuids)
+
+    def chunk_ids(self, version: int) -> set:
+        ids = set()
+        for obj in self._collection(version).iterator(return_properties=["chunk_id"]):
+            chunk_id = obj.properties.get("chunk_id")
+            if chunk_id:
+                ids.add(chunk_id)
+        return ids
+
+    @staticmethod
+    def _where(filters: dict):
+        """
+        Weaviate filter for {"restaurant_name": [...], "chunk_ids": [...]}, or None. Chunks are
+        matched by object uuid; restaurant names by whole value (field-tokenized property).
+        """
+        import weaviate.util
+        from weaviate.classes.query import Filter
+        if not filters:
+            return None
+        conditions = []
+        if filters.get("restaurant_name"):
+            conditions.append(Filter.any_of([Filter.by_property("restaurant_name").equal(name)
+                                             for name in filters["restaurant_name"]]))
+        if filters.get("chunk_ids") is not None:
+            conditions.append(Filter.by_id().contains_any(
+                [weaviate.util.generate_uuid5(chunk_id) for chunk_id in filters["chunk_ids"]]))
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else Filter.all_of(conditions)
+
+    def search(self, version: int, query: str, vector, limit: int = 10, alpha: float = 0.25,
+               filters: dict = None) -> list[dict]:
+        """Weaviate hybrid search (vector similarity + BM25 keyword matching)."""
+        results = self._collection(version).query.hybrid(
+            query=query,
+            vector=vector,
+            alpha=alpha,
+            limit=limit,
+            filters=self._where(filters)
+        )
+        return [{"chunk_id": obj.properties.get("chunk_id"),
+                 "properties": obj.properties,
+                 "score": obj.metadata.score} for obj in results.objects]
+
+    async def asearch(self, version: int, query: str, vector, limit: int = 10, alpha: float = 0.25,
+                      filters: dict = None) -> list[dict]:
+        """`search` over the async client, for the serving event loop."""
+        if self.async_client is None:
+            import weaviate
+            from weaviate.classes.init import Auth
+            # Connected on first use so it binds to the serving event loop
+            self.async_client = weaviate.use_async_with_weaviate_cloud(
+                cluster_url=os.getenv("WEAVIATE_URL"),
+                auth_credentials=Auth.api_key(os.getenv("WEAVIATE_API_KEY"))
+            )
+            await self.async_client.connect()
+        results = await self.async_client.collections.get(collection_name(version)).query.hybrid(
+            query=query,
+            vector=vector,
+            alpha=alpha,
+            limit=limit,
+            filters=self._where(filters)
+        )
+        return [{"chunk_id": obj.properties.get("chunk_id"),
+                 "properties": obj.properties,
+                 "score": obj.metadata.score} for obj in results.objects]
+
+    async def aclose(self):
+        if self.async_client is not None:
+            await self.async_client.close()
+            self.async_client = None
+
+    def close(self):
+        self.client.close()
+
+
+def get_vector_backend(name: str = None):
+    """Vector backend selected by VECTOR_BACKEND (weaviate|local)."""
+    name = name or VECTOR_BACKEND
+    if name == "local":
+        return LocalVectorBackend()
+    if name == "weaviate":
+        return WeaviateVectorBackend()
+    raise ValueError(f"Unknown VECTOR_BACKEND {name!r}; expected 'weaviate' or 'local'")
@@ -12,6 +12,7 @@ from langchain.agents import initialize_agent
 from langchain.tools import tool
 from langgraph.prebuilt import create_react_agent
 from langgraph.checkpoint.memory import MemorySaver
+from langchain_agent.memory.conversation_memory import history_trimmer
 
 
 @tool("DummyTool", description="dummy NUll")
@@ -20,9 +21,10 @@ def dummy_tool() -> str:
 
 
 class LangchainReactAgent:
-    def __init__(self, session_id):
+    def __init__(self, session_id, checkpointer=None):
         self.llm=get_huggingface_llm()
-        self.memory=MemorySaver()
+        # Persistent checkpointer from SessionStore when given; in-process memory otherwise
+        self.memory=checkpointer if checkpointer is not None else MemorySaver()
         self.messages=load_system_prompt()
         self.tools = [rag_retriever]#, dynamic_scrape] #graph_query
         system_prompt = load_system_prompt()[0]["content"] 
@@ -37,7 +39,9 @@ class LangchainReactAgent:
             )
         self.session_id=session_id
         #agent = create_tool_calling_agent(self.llm, self.tools, prompt)
-        self.agent_executor = create_react_agent(model=self.llm, tools=self.tools, checkpointer=self.memory)
+        # Keep each conversation within the history token budget, summarizing older turns
+        self.agent_executor = create_react_agent(model=self.llm, tools=self.tools, checkpointer=self.memory,
+                                                 pre_model_hook=history_trimmer(self.llm))
        
     def get_agent(self):
         return self.agent_executor
\ No newline at end of file
@@ -7,10 +7,13 @@ import yaml
 
 load_dotenv()
 
+LLM_REPO_ID = "microsoft/Phi-3-mini-4k-instruct"
+_tokenizer = None
+
 
 def get_huggingface_llm():
     llm= HuggingFaceEndpoint(
-        repo_id="microsoft/Phi-3-mini-4k-instruct",
+        repo_id=LLM_REPO_ID,
         task="chat-completion",
         max_new_tokens=512,
         do_sample=False,
@@ -23,3 +26,21 @@ def load_system_prompt():
     prompt_path = os.path.join(os.path.dirname(__file__), "..","prompts", "system_prompt.yaml")
     with open(prompt_path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
+
+def count_tokens(text: str) -> int:
+    """
+    Token count of `text` under the LLM's own tokenizer, for when the endpoint does not
+    report usage. Falls back to ~4 characters per token if the tokenizer can't be loaded.
+    """
+    global _tokenizer
+    if not text:
+        return 0
+    if _tokenizer is None:
+        try:
+            _tokenizer = AutoTokenizer.from_pretrained(LLM_REPO_ID, token=os.getenv("HUGGINGFACE_API_KEY"))
+        except Exception as e:
+            print(f"Tokenizer for {LLM_REPO_ID} unavailable ({e}); estimating token counts")
+            _tokenizer = False
+    if _tokenizer is False:
+        return max(1, len(text) // 4)
+    return len(_tokenizer.encode(text, add_special_tokens=False))
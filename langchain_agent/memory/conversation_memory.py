@@ -0,0 +1,269 @@
+"""
+Persistent, bounded conversation memory for the agent.
+
+- `SessionStore` opens the LangGraph checkpointer chosen by CHECKPOINTER: "sqlite"
+  (default; one WAL-mode file that every worker on the host shares), "redis" (shared
+  across hosts) or "memory" (in-process, lost on restart). Conversations are checkpoint
+  threads keyed by the client's session id.
+- Sessions idle for SESSION_TTL_SECONDS are deleted: Redis expires the keys itself, the
+  other backends are swept every SESSION_SWEEP_SECONDS using the last-seen time recorded
+  by `touch()`.
+- `history_trimmer(llm)` is the agent's pre-model hook. Once a conversation exceeds
+  HISTORY_TOKEN_BUDGET tokens, everything but the most recent HISTORY_KEEP_TOKENS worth of
+  turns is replaced, in the checkpoint itself, by an LLM-written summary; if the current
+  turn alone is still over budget, its oldest tool results are shortened.
+"""
+import os
+import time
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage, SystemMessage, RemoveMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+from langchain_agent.llm.huggingface_llm import count_tokens
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTER = os.getenv("CHECKPOINTER", "sqlite")
+CHECKPOINT_DB_PATH = os.getenv(
+    "CHECKPOINT_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "state", "checkpoints.sqlite")
+)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "86400"))
+SESSION_SWEEP_SECONDS = float(os.getenv("SESSION_SWEEP_SECONDS", "600"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_KEEP_TOKENS = int(os.getenv("HISTORY_KEEP_TOKENS", "600"))
+SUMMARY_TIMEOUT = float(os.getenv("HISTORY_SUMMARY_TIMEOUT", "15"))
+# Each message is quoted at most this long in the summarization prompt
+SUMMARY_MESSAGE_CHARS = 600
+# Tool results of an oversized current turn are shortened, but never below this
+TOOL_RESULT_MIN_TOKENS = 64
+SUMMARY_NAME = "conversation_summary"
+
+SESSION_ACTIVITY_TABLE = """
+CREATE TABLE IF NOT EXISTS session_activity (
+    thread_id TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+)
+"""
+
+
+# --- Checkpointer and session expiry ---
+class SessionStore:
+    """Owns the checkpointer for the app's lifetime and expires idle sessions."""
+
+    def __init__(self, kind: str = None):
+        self.kind = kind or CHECKPOINTER
+        self.checkpointer = None
+        self._stack = AsyncExitStack()
+        self._last_seen = {}
+        self._sweeper = None
+
+    async def open(self):
+        if self.kind == "memory":
+            self.checkpointer = MemorySaver()
+        elif self.kind == "sqlite":
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+            os.makedirs(os.path.dirname(CHECKPOINT_DB_PATH), exist_ok=True)
+            self.checkpointer = await self._stack.enter_async_context(
+                AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB_PATH))
+            # WAL lets several worker processes read while one writes
+            await self.checkpointer.conn.execute("PRAGMA journal_mode=WAL")
+            await self.checkpointer.conn.execute(SESSION_ACTIVITY_TABLE)
+            await self.checkpointer.conn.commit()
+            await self.checkpointer.setup()
+        elif self.kind == "redis":
+            from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+            # Redis expires idle threads itself; reads push the expiry back
+            self.checkpointer = await self._stack.enter_async_context(AsyncRedisSaver.from_conn_string(
+                REDIS_URL, ttl={"default_ttl": SESSION_TTL_SECONDS / 60, "refresh_on_read": True}))
+            await self.checkpointer.asetup()
+        else:
+            raise ValueError(f"Unknown CHECKPOINTER {self.kind!r}; use sqlite, redis or memory")
+
+        if self.kind != "redis":
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+        logger.info("Conversation memory: %s checkpointer, sessions expire after %.0fs idle",
+                    self.kind, SESSION_TTL_SECONDS)
+        return self.checkpointer
+
+    async def touch(self, session_id: str):
+        """Record that a session was just used."""
+        now = time.time()
+        if self.kind == "sqlite":
+            async with self.checkpointer.lock:
+                await self.checkpointer.conn.execute(
+                    "INSERT INTO session_activity (thread_id, last_seen) VALUES (?, ?) "
+                    "ON CONFLICT(thread_id) DO UPDATE SET last_seen = excluded.last_seen",
+                    (session_id, now))
+                await self.checkpointer.conn.commit()
+        elif self.kind == "memory":
+            self._last_seen[session_id] = now
+
+    async def expire_idle(self) -> int:
+        """Delete the checkpoints of sessions idle for longer than SESSION_TTL_SECONDS."""
+        cutoff = time.time() - SESSION_TTL_SECONDS
+        if self.kind == "sqlite":
+            async with self.checkpointer.lock:
+                async with self.checkpointer.conn.execute(
+                        "SELECT thread_id FROM session_activity WHERE last_seen < ?", (cutoff,)) as cursor:
+                    expired = [row[0] for row in await cursor.fetchall()]
+        elif self.kind == "memory":
+            expired = [sid for sid, seen in self._last_seen.items() if seen < cutoff]
+        else:
+            return 0
+
+        for session_id in expired:
+            await self.checkpointer.adelete_thread(session_id)
+            if self.kind == "sqlite":
+                async with self.checkpointer.lock:
+                    # Another worker may have resumed the session meanwhile; only forget it if not
+                    await self.checkpointer.conn.execute(
+                        "DELETE FROM session_activity WHERE thread_id = ? AND last_seen < ?", (session_id, cutoff))
+                    await self.checkpointer.conn.commit()
+            else:
+                self._last_seen.pop(session_id, None)
+        if expired:
+            logger.info("Expired %d idle chat sessions", len(expired))
+        return len(expired)
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(SESSION_SWEEP_SECONDS)
+            try:
+                await self.expire_idle()
+            except Exception:
+                logger.exception("Session expiry sweep failed")
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        await self._stack.aclose()
+
+
+# --- History trimming ---
+def _message_tokens(message) -> int:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    tool_calls = getattr(message, "tool_calls", None)
+    # +4 for the role markers the chat template wraps around each message
+    return count_tokens(content) + (count_tokens(str(tool_calls)) if tool_calls else 0) + 4
+
+
+def split_history(messages: list, token_budget: int = HISTORY_TOKEN_BUDGET,
+                  keep_tokens: int = HISTORY_KEEP_TOKENS):
+    """
+    (older, recent) when `messages` exceed `token_budget`, else None. `recent` is the
+    newest run of whole turns (starting at a user message, so tool calls stay with their
+    results) within `keep_tokens`; the current turn is always kept, so `older` is empty
+    when the whole history is a single turn.
+    """
+    costs = [_message_tokens(m) for m in messages]
+    if sum(costs) <= token_budget:
+        return None
+    start, used = None, 0
+    for i in range(len(messages) - 1, -1, -1):
+        used += costs[i]
+        if isinstance(messages[i], HumanMessage):
+            if start is not None and used > keep_tokens:
+                break
+            start = i
+    if start is None:
+        # No user message to anchor a turn on
+        return None
+    return messages[:start], messages[start:]
+
+
+def cap_tool_results(messages: list, token_budget: int = HISTORY_TOKEN_BUDGET) -> list:
+    """`messages` with the oldest tool results shortened until the total fits `token_budget`."""
+    excess = sum(_message_tokens(m) for m in messages) - token_budget
+    if excess <= 0:
+        return messages
+    capped, changed = [], False
+    for message in messages:
+        if excess > 0 and isinstance(message, ToolMessage) and isinstance(message.content, str):
+            cost = _message_tokens(message)
+            keep = max(TOOL_RESULT_MIN_TOKENS, cost - excess)
+            if keep < cost:
+                # Leave room for the role markers and the truncation mark
+                content = message.content[: len(message.content) * max(0, keep - 8) // cost]
+                message = message.model_copy(update={"content": content + " …[truncated]"})
+                excess -= cost - keep
+                changed = True
+        capped.append(message)
+    return capped if changed else messages
+
+
+def _summary_prompt(older: list) -> list:
+    lines = []
+    for message in older:
+        content = message.content if isinstance(message.content, str) else ""
+        if not content:
+            continue
+        role = "Summary so far" if message.name == SUMMARY_NAME else {"human": "User", "ai": "Assistant"}.get(message.type, "Tool")
+        lines.append(f"{role}: {content[:SUMMARY_MESSAGE_CHARS]}")
+    return [HumanMessage(content=(
+        "Summarize this conversation between a user and a restaurant assistant in at most 120 words. "
+        "Keep restaurant names, dishes, prices and the user's preferences.\n\n" + "\n".join(lines)
+    ))]
+
+
+def _trimmed_update(recent: list, summary: str = None) -> dict:
+    kept = ([SystemMessage(content=f"Summary of the earlier conversation: {summary}", name=SUMMARY_NAME)]
+            if summary else [])
+    kept += recent
+    # Rewrite the stored history (bounded memory) and send the model the same messages
+    return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)] + kept, "llm_input_messages": kept}
+
+
+def history_trimmer(llm, token_budget: int = HISTORY_TOKEN_BUDGET, keep_tokens: int = HISTORY_KEEP_TOKENS):
+    """Pre-model hook for `create_react_agent` keeping each conversation within `token_budget`."""
+
+    def plan(messages):
+        """(older, capped recent), or None when the history can stay as it is."""
+        split = split_history(messages, token_budget, keep_tokens)
+        if split is None:
+            return None
+        older, recent = split
+        capped = cap_tool_results(recent, token_budget)
+        if not older and capped is recent:
+            # A single turn with nothing left to shorten
+            return None
+        return older, capped
+
+    def trim(state):
+        split = plan(state["messages"])
+        if split is None:
+            return {"llm_input_messages": state["messages"]}
+        older, recent = split
+        summary = None
+        if older:
+            try:
+                summary = llm.invoke(_summary_prompt(older)).content
+            except Exception:
+                logger.exception("History summary failed; dropping %d old messages", len(older))
+        return _trimmed_update(recent, summary)
+
+    async def atrim(state):
+        split = plan(state["messages"])
+        if split is None:
+            return {"llm_input_messages": state["messages"]}
+        older, recent = split
+        summary = None
+        if older:
+            try:
+                response = await asyncio.wait_for(llm.ainvoke(_summary_prompt(older)), timeout=SUMMARY_TIMEOUT)
+                summary = response.content
+            except Exception:
+                logger.exception("History summary failed; dropping %d old messages", len(older))
+        return _trimmed_update(recent, summary)
+
+    return RunnableLambda(trim, afunc=atrim, name="history_trimmer")
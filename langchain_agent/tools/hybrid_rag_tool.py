@@ -4,15 +4,28 @@ from langchain.tools import tool
 from dotenv import load_dotenv
 from retrieval.hybridrag import HybridRAG
 from utils.embeddings import create_embeddings
-from flashrank import Ranker, RerankRequest
+from utils.query_processor import preprocess_query
+from utils.models import get_batched_reranker
 
 load_dotenv()
 
-hybrid_rag = HybridRAG()
+# Opened on first use, in the process that uses it: connections must not be created in a
+# preloading gunicorn master and then shared by the forked workers
+hybrid_rag = None
+
+
+def get_hybrid_rag():
+    global hybrid_rag
+    if hybrid_rag is None:
+        hybrid_rag = HybridRAG()
+    return hybrid_rag
 
 @tool("ZomatoRAG", description="Retrieve restaurant info via hybrid RAG (semantic + graph)")
 def rag_retriever(query: str) -> str:
     query_embeddings = create_embeddings(query)
-    reranker = Ranker(max_length=128)
-    results = hybrid_rag.query_hybrid(query, query_embeddings, reranker= reranker)
+    # Shared with the API: concurrent tool calls and chats rerank in one batch
+    reranker = get_batched_reranker()
+    # Local entity recognition (microseconds) lets retrieval pre-filter by restaurant/dish
+    _, entities = preprocess_query(query)
+    results = get_hybrid_rag().query_hybrid(query, query_embeddings, reranker= reranker, entities=entities)
     return json.dumps(results)
@@ -9,7 +9,7 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from crawler_scraper.run_crawler_scraper import crawler_scraper_main
-from ingestion.datalake import DataLake  # adjust based on your ingestion module's function
+from ingestion.iceberg_lake import IcebergDataLake  # local SQLite-catalog lakehouse
 from retrieval.hybridrag import *
 
 load_dotenv()
@@ -30,12 +30,12 @@ async def main():
             rows.append({
                 "scraper_name": scraper,  # e.g., "SeleniumFetcher"
                 "url": u,
-                "content": c,
+                "markdown": c,
                 "timestamp": datetime.now().isoformat()
             })
     
     # 3. Create/load the table and push the rows
-    datalake = DataLake(catalog_name=CATALOG_NAME, warehouse_path=WAREHOUSE_PATH)
+    datalake = IcebergDataLake(catalog_name=CATALOG_NAME or "local_datalake", warehouse_path=WAREHOUSE_PATH)
     table = datalake.create_table(datalake.table_identifier)  # This will check if the table exists or create it.
     datalake.append_rows(table, rows)
     print("Data ingestion complete.")
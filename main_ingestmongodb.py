@@ -51,11 +51,15 @@ import uuid
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from ingestion.datalake import DataLake
+from ingestion.blob_store import offload_bodies
 
 # Load environment variables
 load_dotenv()
 DB_NAME = os.getenv("DB_NAME", "restaurant_data")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME", "scraped_content")
+# "inline" keeps html/markdown/media in the Mongo row; "blob" stores them zstd-compressed
+# in the local content-addressed blob store and keeps only references in Mongo
+BODY_STORAGE = os.getenv("DATALAKE_BODY_STORAGE", "inline")
 
 # Path to the processed JSON file
 PROCESSED_FILE = os.path.join(
@@ -96,12 +100,15 @@ def flatten_rows(processed: dict) -> list[dict]:
 def main():
     processed = load_processed(PROCESSED_FILE)
     rows = flatten_rows(processed)
-    print(f"Prepared {len(rows)} rows for ingestion.")
+    if BODY_STORAGE == "blob":
+        rows = [offload_bodies(row) for row in rows]
+    print(f"Prepared {len(rows)} rows for ingestion ({BODY_STORAGE} bodies).")
 
     dl = DataLake(db_name=DB_NAME, collection_name=COLLECTION_NAME)
     dl.create_collection()
-    dl.append_rows(rows)
-    print("MongoDB ingestion complete.")
+    counts = dl.upsert_rows(rows)
+    print(f"MongoDB ingestion complete: {counts['inserted']} inserted, "
+          f"{counts['updated']} updated, {counts['skipped']} skipped.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
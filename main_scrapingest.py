@@ -48,11 +48,12 @@ import os, json, uuid
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 
-from ingestion.datalake import DataLake
+from ingestion.iceberg_lake import IcebergDataLake
 
 # Load .env
 load_dotenv()
 CATALOG_NAME = os.getenv("CATALOG_NAME", "local_datalake")
+WAREHOUSE_PATH = os.getenv("WAREHOUSE_PATH")  # defaults to iceberg_catalog/warehouse
 
 PROCESSED_FILE = os.path.join(
     os.path.dirname(__file__),
@@ -77,6 +78,7 @@ def flatten_rows(processed: dict) -> list[dict]:
 
             rows.append({
                 "id":           f"{restaurant}_{uuid.uuid4()}",
+                "restaurant_name": restaurant,
                 "scraper_name": "Crawl4AIFetcher",
                 "url":          entry["url"],
                 "markdown":     data.get("markdown", ""),
@@ -91,10 +93,10 @@ def main():
     rows      = flatten_rows(processed)
     print(f"Prepared {len(rows)} rows for ingestion.")
 
-    dl    = DataLake(catalog_name=CATALOG_NAME)
-    table = dl.create_table()          # no args now
-    dl.append_rows(table, rows)
-    print("💾 Iceberg ingestion complete.")
+    dl    = IcebergDataLake(catalog_name=CATALOG_NAME, warehouse_path=WAREHOUSE_PATH)
+    table = dl.create_table()          # partitioned by restaurant_name and crawl day
+    snapshot_id = dl.append_rows(table, rows)
+    print(f"💾 Iceberg ingestion complete (snapshot {snapshot_id}).")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,148 @@
+"""
+Latency and usage metrics for the chat pipeline, exported in Prometheus format.
+
+- `stage_timer(stage)` times one pipeline stage (preprocess_query, embedding, prefilter,
+  vector_search, rerank, neo4j_enrichment, context_packing, llm_stream) into the
+  `chat_stage_seconds{stage}` histogram, and adds a span to the Langfuse trace of the
+  current request when one is bound with `bind_trace`.
+- Each stage also keeps its last LATENCY_WINDOW timings, exposed as
+  `chat_stage_latency_quantile_seconds{stage,quantile}` (p50/p95/p99) so dashboards get
+  percentiles without a PromQL `histogram_quantile` over the buckets.
+- `record_batch` feeds the micro-batcher histograms (`model_batch_size{model}`,
+  `model_batch_queue_wait_seconds{model}`), see utils/batching.py.
+- `render()` returns the /metrics payload; chat concurrency gauges are included.
+"""
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+
+from utils import concurrency
+
+LATENCY_WINDOW = int(os.getenv("METRICS_LATENCY_WINDOW", "1000"))
+QUANTILES = (0.5, 0.95, 0.99)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+QUEUE_WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+registry = CollectorRegistry()
+
+STAGE_SECONDS = Histogram("chat_stage_seconds", "Time spent in each chat pipeline stage",
+                          ["stage"], buckets=STAGE_BUCKETS, registry=registry)
+TTFT_SECONDS = Histogram("chat_time_to_first_token_seconds", "Request start to first streamed answer token",
+                         buckets=STAGE_BUCKETS, registry=registry)
+REQUEST_SECONDS = Histogram("chat_request_seconds", "End-to-end chat request time",
+                            buckets=STAGE_BUCKETS, registry=registry)
+REQUESTS = Counter("chat_requests_total", "Chat requests by outcome", ["outcome"], registry=registry)
+TOKENS = Counter("chat_llm_tokens_total", "LLM tokens by direction", ["kind"], registry=registry)
+BATCH_SIZE = Histogram("model_batch_size", "Requests served by one micro-batched model call",
+                       ["model"], buckets=BATCH_SIZE_BUCKETS, registry=registry)
+BATCH_QUEUE_WAIT = Histogram("model_batch_queue_wait_seconds", "Time a request waited for its model batch to start",
+                             ["model"], buckets=QUEUE_WAIT_BUCKETS, registry=registry)
+
+_windows = {}
+_windows_lock = threading.Lock()
+_current_trace = ContextVar("chat_trace", default=None)
+
+
+def bind_trace(trace):
+    """Attach stage spans created in this context (and tasks/threads it spawns) to `trace`."""
+    return _current_trace.set(trace)
+
+
+def unbind_trace(token):
+    try:
+        _current_trace.reset(token)
+    except ValueError:
+        # The stream was closed from another context (e.g. client disconnect)
+        _current_trace.set(None)
+
+
+def observe(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    with _windows_lock:
+        window = _windows.get(stage)
+        if window is None:
+            window = _windows[stage] = deque(maxlen=LATENCY_WINDOW)
+        window.append(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str, **span_metadata):
+    """Time a block as one pipeline stage (works around sync code and awaits alike)."""
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+        trace = _current_trace.get()
+        if trace is not None:
+            try:
+                trace.span(name=stage, start_time=started_at, end_time=datetime.now(timezone.utc),
+                           metadata=span_metadata or None)
+            except Exception as e:
+                # Tracing must never break a chat
+                print(f"Could not record span {stage}: {e}")
+
+
+def record_request(outcome: str, total_seconds: float = None, ttft_seconds: float = None,
+                   input_tokens: int = 0, output_tokens: int = 0):
+    REQUESTS.labels(outcome=outcome).inc()
+    if total_seconds is not None:
+        REQUEST_SECONDS.observe(total_seconds)
+    if ttft_seconds is not None:
+        TTFT_SECONDS.observe(ttft_seconds)
+        observe("time_to_first_token", ttft_seconds)
+    TOKENS.labels(kind="input").inc(input_tokens)
+    TOKENS.labels(kind="output").inc(output_tokens)
+
+
+def record_batch(model: str, size: int, queue_waits: list):
+    BATCH_SIZE.labels(model=model).observe(size)
+    wait = BATCH_QUEUE_WAIT.labels(model=model)
+    for seconds in queue_waits:
+        wait.observe(seconds)
+
+
+def quantiles() -> dict:
+    """{stage: {"p50": s, "p95": s, "p99": s, "count": n}} over the recent window."""
+    with _windows_lock:
+        snapshot = {stage: sorted(window) for stage, window in _windows.items()}
+    out = {}
+    for stage, values in snapshot.items():
+        if not values:
+            continue
+        out[stage] = {f"p{int(q * 100)}": values[min(len(values) - 1, int(q * len(values)))] for q in QUANTILES}
+        out[stage]["count"] = len(values)
+    return out
+
+
+class _LiveCollector:
+    """Gauges computed at scrape time: stage percentiles and chat queue depths."""
+
+    def collect(self):
+        latency = GaugeMetricFamily("chat_stage_latency_quantile_seconds",
+                                    f"Stage latency percentiles over the last {LATENCY_WINDOW} calls",
+                                    labels=["stage", "quantile"])
+        for stage, values in quantiles().items():
+            for q in QUANTILES:
+                latency.add_metric([stage, str(q)], values[f"p{int(q * 100)}"])
+        yield latency
+        for name, value in concurrency.stats().items():
+            yield GaugeMetricFamily(f"chat_{name}" if not name.startswith("chat") else name,
+                                    f"Chat concurrency: {name.replace('_', ' ')}", value=value)
+
+
+registry.register(_LiveCollector())
+
+
+def render():
+    """(body, content type) for the /metrics endpoint."""
+    return generate_latest(registry), CONTENT_TYPE_LATEST
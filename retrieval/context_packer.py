@@ -0,0 +1,93 @@
+"""
+Token-budgeted assembly of retrieved passages into LLM context.
+
+Passages arrive best-first. The packer walks them in that order and
+- skips a passage that is a near-duplicate of one already packed (word-shingle Jaccard
+  of at least NEAR_DUP_JACCARD),
+- drops single lines already packed from a higher-ranked passage,
+- takes the whole passage when it fits the remaining budget; otherwise only the lines
+  that matter most (price lines and graph facts first), kept in their original order and
+  never cut mid-line,
+until CONTEXT_TOKEN_BUDGET tokens of the LLM's own tokenizer are used.
+
+Chunk text is cleaned at index time (knowledge_base/text_cleaning.py); passages from
+indexes built before that are cleaned here on the fly.
+"""
+import os
+import re
+
+from knowledge_base.bm25_index import PRICE_RE
+from knowledge_base.text_cleaning import clean_chunk_text, looks_like_html
+from langchain_agent.llm.huggingface_llm import count_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+NEAR_DUP_JACCARD = float(os.getenv("CONTEXT_NEAR_DUP_JACCARD", "0.8"))
+# Not worth starting a partial passage with less budget left than this
+MIN_PARTIAL_TOKENS = 24
+# Lines added by the Neo4j enrichment step
+GRAPH_FACT_PREFIXES = ("Restaurant:", "Featured dish", "Menu includes:")
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _is_priority(line: str) -> bool:
+    return line.startswith(GRAPH_FACT_PREFIXES) or PRICE_RE.search(line) is not None
+
+
+def pack_context(passages: list[str], token_budget: int = CONTEXT_TOKEN_BUDGET, count=count_tokens) -> list[str]:
+    """Best-first passages trimmed to fit `token_budget` tokens in total."""
+    packed, packed_shingles, seen_lines = [], [], set()
+    remaining = token_budget
+    for passage in passages:
+        if remaining <= 0:
+            break
+        if looks_like_html(passage):
+            passage = clean_chunk_text(passage)
+        shingles = _shingles(passage)
+        if any(_jaccard(shingles, other) >= NEAR_DUP_JACCARD for other in packed_shingles):
+            continue
+
+        lines = []
+        for line in passage.splitlines():
+            key = " ".join(re.findall(r"\w+", line.lower()))
+            if key and key not in seen_lines:
+                lines.append((line.strip(), key))
+        if not lines:
+            continue
+        # +1 per line for the newline joining it
+        costs = [count(line) + 1 for line, _ in lines]
+
+        if sum(costs) <= remaining:
+            chosen = list(range(len(lines)))
+        elif remaining >= MIN_PARTIAL_TOKENS or not packed:
+            chosen, used = [], 0
+            for i in sorted(range(len(lines)), key=lambda i: (not _is_priority(lines[i][0]), i)):
+                if used + costs[i] <= remaining:
+                    chosen.append(i)
+                    used += costs[i]
+            if not chosen and not packed:
+                # A single line longer than the whole budget: cut it at a word boundary
+                line = lines[0][0]
+                lines[0] = (line[: max(1, len(line) * remaining // costs[0])].rsplit(" ", 1)[0] + "…", lines[0][1])
+                costs[0] = remaining
+                chosen = [0]
+            chosen.sort()
+        else:
+            break
+        if not chosen:
+            continue
+
+        packed.append("\n".join(lines[i][0] for i in chosen))
+        packed_shingles.append(shingles)
+        seen_lines.update(lines[i][1] for i in chosen)
+        remaining -= sum(costs[i] for i in chosen)
+
+    print(f"Packed {len(packed)} of {len(passages)} passages into {token_budget - remaining}/{token_budget} tokens")
+    return packed
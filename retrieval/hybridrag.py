@@ -7,43 +7,110 @@ Neo4j (or your choice of graph DB) captures structured relationships (for instan
 Below is the code with inline comments explaining each step.
 
 """
-import weaviate
-from weaviate.classes.init import Auth
-import weaviate.classes as wvc
-from weaviate.classes.config import Property, DataType, Configure
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, AsyncGraphDatabase
+import asyncio
 import json
 import os 
 import uuid
 import hashlib
-import weaviate.util
+import time
 from dotenv import load_dotenv
 from sentence_transformers import CrossEncoder
 from llama_index.core import VectorStoreIndex
 from llama_index.vector_stores.weaviate import WeaviateVectorStore
-from flashrank import Ranker, RerankRequest
+from flashrank import RerankRequest
+from knowledge_base.index_versions import collection_name, resolve_alias
+from knowledge_base.vector_store import get_vector_backend
+from utils.concurrency import run_blocking
+from utils.models import get_batched_reranker
+from observability.metrics import stage_timer
+from retrieval.context_packer import pack_context, CONTEXT_TOKEN_BUDGET
 
 load_dotenv()
 
 # -------------------- WEAVIATE SETUP --------------------
-# Define your Weaviate endpoint (can be local or cloud)
+# Define your Weaviate endpoint (can be local or cloud); VECTOR_BACKEND=local serves from
+# the embedded on-disk index instead (knowledge_base/vector_store.py)
 WEAVIATE_URL= os.getenv("WEAVIATE_URL")  # e.g., "http://localhost:8080" or your cloud URL
 WEAVIATE_API_KEY=os.getenv("WEAVIATE_API_KEY")
 NEO4J_URI = os.getenv("NEO4J_URI")  # e.g., "bolt://localhost:7687"
 NEO4J_USER = os.getenv("NEO4J_USER")  # e.g., "neo4j"
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")  # e.g., "password"
+# How long a resolved index alias is trusted before re-reading it from Neo4j
+ALIAS_REFRESH_SECONDS = float(os.getenv("ALIAS_REFRESH_SECONDS", "30"))
+
+# Dish questions search only chunks linked to the dish or to restaurants serving it,
+# unless that set is larger than this (then it would not narrow anything)
+PREFILTER_MAX_CANDIDATES = int(os.getenv("PREFILTER_MAX_CANDIDATES", "2000"))
+
+DISH_CANDIDATES_QUERY = """
+CALL {
+    MATCH (d:Dish)-[:HAS_CHUNK]->(c:Chunk {version: $version})
+    WHERE d.name IN $dishes
+    RETURN c
+    UNION
+    MATCH (r:Restaurant)-[:SERVES]->(d:Dish)
+    WHERE d.name IN $dishes
+    MATCH (r)-[:HAS_CHUNK]->(c:Chunk {version: $version})
+    RETURN c
+}
+WITH c WHERE c.tombstoned_at IS NULL
+RETURN c.id AS chunk_id
+LIMIT $cap
+"""
+
+# Adaptive reranking, on first-stage scores min-max normalized within the search the top hit
+# came from: skip it when the top hit leads the runner-up by this fraction of the score
+# range; otherwise rerank the candidates scoring within RERANK_SCORE_WINDOW of the top
+RERANK_ADAPTIVE = os.getenv("RERANK_ADAPTIVE", "1") == "1"
+RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", "0.5"))
+RERANK_SCORE_WINDOW = float(os.getenv("RERANK_SCORE_WINDOW", "0.35"))
+
+# Find the chunk and its connections
+ENRICH_QUERY = """
+MATCH (c:Chunk {id: $chunk_id, version: $version})
+OPTIONAL MATCH (r:Restaurant)-[:HAS_CHUNK]->(c)
+OPTIONAL MATCH (d:Dish)-[:HAS_CHUNK]->(c)
+OPTIONAL MATCH (r:Restaurant)-[s:SERVES]->(d2:Dish)
+WHERE r IS NOT NULL
+RETURN c.markdown AS chunk_text, 
+    r.name AS restaurant_name,
+    COLLECT(DISTINCT {name: d.name}) AS related_dishes,
+    COLLECT(DISTINCT {name: d2.name, price: s.price}) AS menu_items
+"""
 
 class HybridRAG:
     """
     A class to manage the hybrid RAG system using Weaviate and Neo4j.
     """
     def __init__(self):
-        self.weaviate_client = weaviate.connect_to_weaviate_cloud(cluster_url=WEAVIATE_URL, auth_credentials=Auth.api_key(WEAVIATE_API_KEY))
+        self.vectors = get_vector_backend()
         self.neo4j_driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+        self.async_neo4j_driver = None
         # --------------------- WEAVIATE CONNECTION & LlamaIndex Setup ----------------------
+        self.index_version = 0
+        self.collection_name = collection_name(0)
+        self._alias_resolved_at = None
+        self.refresh_alias(force=True)
+
+    def refresh_alias(self, force: bool = False):
+        """
+        Resolve which index version serves reads. Builders write to a fresh version and flip
+        the alias when it validates, so long-lived instances re-check it periodically.
+        """
+        now = time.monotonic()
+        if not force and self._alias_resolved_at is not None \
+                and now - self._alias_resolved_at < ALIAS_REFRESH_SECONDS:
+            return self.index_version
+        version = resolve_alias(self.neo4j_driver) or 0
+        self.index_version = version
+        self.collection_name = collection_name(version)
+        self._alias_resolved_at = now
+        return version
 
             # -------------------- HYBRID QUERY PIPELINE + ReRank--------------------
-    def query_hybrid(self, user_query, user_query_embedding, limit=3, rerank_limit=10, reranker=None):
+    def query_hybrid(self, user_query, user_query_embedding, limit=3, rerank_limit=10, reranker=None, entities=None,
+                     token_budget=CONTEXT_TOKEN_BUDGET):
         """
         Proper Hybrid Search: Uses Weaviate's hybrid search combining vector similarity and BM25 keyword matching with the provided embedding.
         Robust Reranking:
@@ -72,138 +139,288 @@ class HybridRAG:
 
         Added rerank_limit to control how many initial results to fetch for reranking
         Properly uses the provided limit parameter for final results
+
+
+        Entity Pre-filtering:
+
+        Restaurants recognized in the query (`entities` from preprocess_query) become a
+        restaurant_name filter; dishes become a candidate set of chunks from Neo4j
+        Falls back to (and tops up from) the unfiltered search whenever the filtered one returns
+        fewer than the `rerank_limit` hits asked for, so a wrong or too narrow filter can't starve the answer
+
+
+        Adaptive Reranking:
+
+        Rerank depth follows first-stage confidence (see `_rerank_depth`); reranking is skipped when the top hit dominates
+        Returns at most `limit` passages in a deterministic order, packed into `token_budget` tokens
+        (near-duplicates collapsed, price lines kept first; see retrieval/context_packer.py)
         """
         # Step 1: Semantic search in Weaviate with hybrid search
         # First fetch more results than we need for reranking
-        coll = self.weaviate_client.collections.get("RestaurantChunk")
-        vector_results = coll.query.hybrid(
-            query=user_query,
-            vector=user_query_embedding,
-            alpha=0.25,  # Balance between vector and keyword search (adjust as needed)
-            limit=rerank_limit  # Get more results initially for reranking
-        )
-        
+        # Pin one version for the whole query so Weaviate and Neo4j stay consistent
+        version = self.refresh_alias()
+        filters = self._restaurant_filter(entities)
+        if not filters and (entities or {}).get("dishes"):
+            with stage_timer("prefilter"), self.neo4j_driver.session() as session:
+                records = session.run(DISH_CANDIDATES_QUERY, dishes=entities["dishes"], version=version,
+                                      cap=PREFILTER_MAX_CANDIDATES + 1)
+                filters = self._candidate_filter([r["chunk_id"] for r in records])
+        with stage_timer("vector_search", backend=self.vectors.name, filtered=bool(filters)):
+            hits = self.vectors.search(
+                version,
+                user_query,
+                user_query_embedding,
+                limit=rerank_limit,  # Get more results initially for reranking
+                alpha=0.25,  # Balance between vector and keyword search (adjust as needed)
+                filters=filters
+            ) if filters else []
+            if len(hits) < rerank_limit:
+                # Nothing (or too little) matched the entities: search everything
+                hits = self._merge_hits(hits, self.vectors.search(
+                    version, user_query, user_query_embedding, limit=rerank_limit, alpha=0.25), rerank_limit)
+        initial_results = self._initial_results(hits)
+
+        # Step 2: Rerank the results using the cross-encoder, only as deep as needed
+        depth = self._rerank_depth(initial_results, limit, rerank_limit)
+        if depth:
+            with stage_timer("rerank", candidates=len(initial_results), depth=depth):
+                initial_results = self._rerank(user_query, initial_results, reranker, depth)
+
+        # Step 3: Enrich with related content from Neo4j
+        enriched_results = []
+        with stage_timer("neo4j_enrichment"), self.neo4j_driver.session() as session:
+            # For prioritized chunk IDs, find related information in the graph
+            for result in initial_results[:limit]:
+                chunk_id = result.get("chunk_id")
+                if not chunk_id:
+                    continue
+                graph_result = session.run(ENRICH_QUERY, chunk_id=chunk_id, version=version).single()
+                entry = self._enriched_entry(result, graph_result)
+                if entry:
+                    enriched_results.append(entry)
+
+        # Step 4: Extract just the text for final results
+        return self._final_context(enriched_results, limit, token_budget)
+
+    async def aquery_hybrid(self, user_query, user_query_embedding, limit=3, rerank_limit=10, reranker=None,
+                            entities=None, token_budget=CONTEXT_TOKEN_BUDGET):
+        """
+        Same pipeline as `query_hybrid` without blocking the event loop: the vector search and
+        Neo4j enrichment use async clients (enrichment queries run concurrently), and the
+        remaining sync work (alias lookup, reranking, local index search) runs on the bounded
+        blocking pool.
+        """
+        version = await run_blocking(self.refresh_alias)
+        driver = self._async_driver()
+        filters = self._restaurant_filter(entities)
+        if not filters and (entities or {}).get("dishes"):
+            with stage_timer("prefilter"):
+                async with driver.session() as session:
+                    res = await session.run(DISH_CANDIDATES_QUERY, dishes=entities["dishes"], version=version,
+                                            cap=PREFILTER_MAX_CANDIDATES + 1)
+                    filters = self._candidate_filter([r["chunk_id"] async for r in res])
+
+        async def search(filters=None):
+            if hasattr(self.vectors, "asearch"):
+                return await self.vectors.asearch(version, user_query, user_query_embedding,
+                                                  limit=rerank_limit, alpha=0.25, filters=filters)
+            return await run_blocking(self.vectors.search, version, user_query, user_query_embedding,
+                                      limit=rerank_limit, alpha=0.25, filters=filters)
+
+        with stage_timer("vector_search", backend=self.vectors.name, filtered=bool(filters)):
+            hits = await search(filters) if filters else []
+            if len(hits) < rerank_limit:
+                hits = self._merge_hits(hits, await search(), rerank_limit)
+        initial_results = self._initial_results(hits)
+        depth = self._rerank_depth(initial_results, limit, rerank_limit)
+        if depth:
+            with stage_timer("rerank", candidates=len(initial_results), depth=depth):
+                initial_results = await self._arerank(user_query, initial_results, reranker, depth)
+
+        async def enrich(result):
+            async with driver.session() as session:
+                res = await session.run(ENRICH_QUERY, chunk_id=result["chunk_id"], version=version)
+                return self._enriched_entry(result, await res.single())
+
+        with stage_timer("neo4j_enrichment"):
+            entries = await asyncio.gather(*(enrich(r) for r in initial_results[:limit] if r.get("chunk_id")))
+        enriched_results = [e for e in entries if e]
+        return self._final_context(enriched_results, limit, token_budget)
+
+    # -------------------- PIPELINE STEPS --------------------
+    @staticmethod
+    def _restaurant_filter(entities):
+        restaurants = (entities or {}).get("restaurants")
+        return {"restaurant_name": restaurants} if restaurants else None
+
+    @staticmethod
+    def _candidate_filter(chunk_ids):
+        # An oversized candidate set would not narrow the search; skip the filter
+        if not chunk_ids or len(chunk_ids) > PREFILTER_MAX_CANDIDATES:
+            return None
+        return {"chunk_ids": chunk_ids}
+
+    @staticmethod
+    def _merge_hits(filtered, unfiltered, limit):
+        """
+        Entity-filtered hits first, then unfiltered ones not already in, up to `limit`. Each
+        hit records which search it came from ("ranking": 0 filtered, 1 unfiltered), since
+        the two searches' scores are normalized separately and can't be compared.
+        """
+        seen = {h["chunk_id"] for h in filtered}
+        merged = [{**h, "ranking": 0} for h in filtered]
+        merged += [{**h, "ranking": 1} for h in unfiltered if h["chunk_id"] not in seen]
+        return merged[:limit]
+
+    @staticmethod
+    def _initial_results(hits):
         # Extract chunk IDs and initial context
         initial_results = []
-        chunk_ids = []
-        
-        for obj in vector_results.objects:
+        for hit in hits:
             # Get metadata and text content from each result
-            metadata = obj.properties
-            chunk_id = metadata.get("chunk_id")
+            metadata = hit["properties"]
+            chunk_id = hit["chunk_id"]
             text_content = metadata.get("text", metadata.get("markdown", ""))
-            score = obj.metadata.score  # Get the hybrid search score
-            
+            score = hit["score"]  # Get the hybrid search score
+
             # Store all information for reranking
             if text_content:
                 initial_results.append({
                     "chunk_id": chunk_id,
                     "text": text_content,
                     "score": score,
+                    "rank": len(initial_results),  # first-stage position, the tie-breaker later on
+                    "ranking": hit.get("ranking", 0),
                     "metadata": metadata
                 })
-                if chunk_id:
-                    chunk_ids.append(chunk_id)
-        
-        # Step 2: Rerank the results using the cross-encoder
-        if len(initial_results) > 0:
-            try:
-                if reranker is None:
-                    from transformers import AutoModelForSequenceClassification
-
-                    reranker = AutoModelForSequenceClassification.from_pretrained(
-                            'BAAI/bge-reranker-base',
-                            torch_dtype="auto",
-                            trust_remote_code=True,
-                        )
-        
-                # Prepare pairs for reranking
-                pairs = [(user_query, result["text"]) for result in initial_results]
-                
-                # Get reranking scores
-                rerankrequest = RerankRequest(query=user_query, passages=initial_results)
-                rerank_scores = reranker.rerank(rerankrequest)
-                #rerank_scores = reranker.compute_score(pairs)
-                
-                # Add reranking scores to results
-                for i, score in enumerate(rerank_scores):
-                    #initial_results[i]["rerank_score"] = float(score) ---> For huggingfacehub rerankers
-                    score=score.get("score")
-                    initial_results[i]["score"] = float(score)  # Assuming the first score is the relevant one
-                
-                # Sort by reranking score
-                initial_results = sorted(initial_results, key=lambda x: x["score"], reverse=True)
-                
-            except ImportError:
-                print("Cross-encoder not available. Using original ranking.")
-                # If reranker is not available, sort by original score
-                initial_results = sorted(initial_results, key=lambda x: x["score"], reverse=True)
-        
-        # Step 3: Enrich with related content from Neo4j
-        enriched_results = []
-        
-        with self.neo4j_driver.session() as session:
-            # For prioritized chunk IDs, find related information in the graph
-            for result in initial_results[:limit]:
-                chunk_id = result.get("chunk_id")
-                if not chunk_id:
-                    continue
-                    
-                # Find the chunk and its connections
-                graph_query = """
-                MATCH (c:Chunk {id: $chunk_id})
-                OPTIONAL MATCH (r:Restaurant)-[:HAS_CHUNK]->(c)
-                OPTIONAL MATCH (d:Dish)-[:HAS_CHUNK]->(c)
-                OPTIONAL MATCH (r:Restaurant)-[s:SERVES]->(d2:Dish)
-                WHERE r IS NOT NULL
-                RETURN c.markdown AS chunk_text, 
-                    r.name AS restaurant_name,
-                    COLLECT(DISTINCT {name: d.name}) AS related_dishes,
-                    COLLECT(DISTINCT {name: d2.name, price: s.price}) AS menu_items
-                """
-                graph_result = session.run(graph_query, chunk_id=chunk_id).single()
-                
-                if graph_result:
-                    # Get the original chunk text
-                    chunk_text = result["text"]
-                    
-                    # Create a summary of related information
-                    restaurant = graph_result["restaurant_name"]
-                    dishes = graph_result["related_dishes"]
-                    menu = graph_result["menu_items"]
-                    
-                    graph_context = ""
-                    if restaurant:
-                        graph_context += f"Restaurant: {restaurant}\n"
-                        
-                        if dishes and dishes[0].get("name"):
-                            dish_names = [d["name"] for d in dishes if d.get("name")]
-                            if dish_names:
-                                graph_context += f"Featured dish(es): {', '.join(dish_names)}\n"
-                        
-                        if menu and menu[0].get("name"):
-                            menu_items = [f"{m['name']} (₹{m['price']})" for m in menu if m.get("name") and m.get("price")]
-                            if menu_items:
-                                graph_context += f"Menu includes: {', '.join(menu_items)}\n"
-                    
-                    # Combine the original text with the graph context
-                    combined_text = f"{chunk_text}\n\n{graph_context}" if graph_context else chunk_text
-                    enriched_results.append({
-                        "text": combined_text,
-                        "score": result.get("rerank_score", result.get("score", 0)),
-                        "chunk_id": chunk_id
-                    })
-        
-        # Step 4: Extract just the text for final results
+        return initial_results
+
+    @staticmethod
+    def _rerank_depth(initial_results, limit, rerank_limit):
+        """
+        How many first-stage results to rerank; 0 keeps the first-stage order. Rerank only
+        as deep as the scores are ambiguous (within RERANK_SCORE_WINDOW of the top score),
+        never fewer than `limit`, and not at all when the top hit clearly dominates.
+
+        Scores are only compared within the search that produced the top hit, min-max
+        normalized over its hits: filtered and unfiltered searches normalize their scores
+        separately, and alpha and RRF fusion use different scales, so raw scores from a
+        merged list say nothing about confidence. Hits from the other search count as
+        ambiguous. With fewer than three comparable scores there is no range to judge by,
+        and everything up to `rerank_limit` is reranked.
+        """
+        if len(initial_results) <= 1:
+            return 0
+        depth = min(len(initial_results), rerank_limit)
+        if not RERANK_ADAPTIVE:
+            return depth
+        ranking = initial_results[0]["ranking"]
+        scores = sorted((r["score"] or 0.0 for r in initial_results if r["ranking"] == ranking), reverse=True)
+        spread = scores[0] - scores[-1]
+        if len(scores) < 3 or spread <= 0:
+            return depth
+        normalized = [(s - scores[-1]) / spread for s in scores]
+        if normalized[0] - normalized[1] >= RERANK_SKIP_MARGIN:
+            return 0
+        close = sum(1 for s in normalized if s >= 1 - RERANK_SCORE_WINDOW) + len(initial_results) - len(scores)
+        return min(depth, max(limit, close))
+
+    @staticmethod
+    def _rerank(user_query, initial_results, reranker=None, depth=None):
+        if reranker is None:
+            # Same lightweight FlashRank model the API uses, batched with concurrent queries
+            reranker = get_batched_reranker()
+        head, tail, rerankrequest = HybridRAG._rerank_request(user_query, initial_results, depth)
+        return HybridRAG._apply_rerank(head, tail, reranker.rerank(rerankrequest))
+
+    @staticmethod
+    async def _arerank(user_query, initial_results, reranker=None, depth=None):
+        if reranker is None:
+            reranker = get_batched_reranker()
+        if not hasattr(reranker, "arerank"):
+            return await run_blocking(HybridRAG._rerank, user_query, initial_results, reranker, depth)
+        # Wait for the batch without holding a blocking-pool thread
+        head, tail, rerankrequest = HybridRAG._rerank_request(user_query, initial_results, depth)
+        return HybridRAG._apply_rerank(head, tail, await reranker.arerank(rerankrequest))
+
+    @staticmethod
+    def _rerank_request(user_query, initial_results, depth=None):
+        depth = len(initial_results) if depth is None else depth
+        head, tail = initial_results[:depth], initial_results[depth:]
+        passages = [{"id": i, "text": result["text"]} for i, result in enumerate(head)]
+        return head, tail, RerankRequest(query=user_query, passages=passages)
+
+    @staticmethod
+    def _apply_rerank(head, tail, ranked_passages):
+        # FlashRank returns the passages sorted by score, carrying their ids
+        for ranked in ranked_passages:
+            head[ranked["id"]]["rerank_score"] = float(ranked["score"])
+
+        # Sort by reranking score; ties keep the first-stage order, and the unreranked tail follows
+        head = sorted(head, key=lambda x: (-x.get("rerank_score", 0.0), x["rank"]))
+        return head + tail
+
+    @staticmethod
+    def _enriched_entry(result, graph_result):
+        if not graph_result:
+            # Nothing in the graph for this chunk: pass its text through as is
+            return {"text": result["text"], "score": result.get("rerank_score", result.get("score", 0)),
+                    "chunk_id": result.get("chunk_id")}
+        # Get the original chunk text
+        chunk_text = result["text"]
+
+        # Create a summary of related information
+        restaurant = graph_result["restaurant_name"]
+        dishes = graph_result["related_dishes"]
+        menu = graph_result["menu_items"]
+
+        graph_context = ""
+        if restaurant:
+            graph_context += f"Restaurant: {restaurant}\n"
+
+            if dishes and dishes[0].get("name"):
+                dish_names = [d["name"] for d in dishes if d.get("name")]
+                if dish_names:
+                    graph_context += f"Featured dish(es): {', '.join(dish_names)}\n"
+
+            if menu and menu[0].get("name"):
+                menu_items = [f"{m['name']} (₹{m['price']})" for m in menu if m.get("name") and m.get("price")]
+                if menu_items:
+                    graph_context += f"Menu includes: {', '.join(menu_items)}\n"
+
+        # Combine the original text with the graph context
+        combined_text = f"{chunk_text}\n\n{graph_context}" if graph_context else chunk_text
+        return {
+            "text": combined_text,
+            "score": result.get("rerank_score", result.get("score", 0)),
+            "chunk_id": result.get("chunk_id")
+        }
+
+    @staticmethod
+    def _final_context(enriched_results, limit, token_budget=None):
+        """The top `limit` passages in rank order, packed into `token_budget` tokens when given."""
         final_context = [result["text"] for result in enriched_results[:limit]]
-        final_context= [initial_results[i]["text"] for i in range(len(initial_results))]
-        print("final_context", final_context)
-    
+        if token_budget:
+            with stage_timer("context_packing"):
+                final_context = pack_context(final_context, token_budget)
         return final_context
-    
+
+    def _async_driver(self):
+        # Created on first async use so it binds to the serving event loop
+        if self.async_neo4j_driver is None:
+            self.async_neo4j_driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+        return self.async_neo4j_driver
+
+    async def aclose(self):
+        if self.async_neo4j_driver is not None:
+            await self.async_neo4j_driver.close()
+            self.async_neo4j_driver = None
+        if hasattr(self.vectors, "aclose"):
+            await self.vectors.aclose()
+
     def close(self):
         if self.neo4j_driver:
             self.neo4j_driver.close()
-        if self.weaviate_client:
-            self.weaviate_client.close()
+        if self.vectors:
+            self.vectors.close()
 
@@ -0,0 +1,92 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from utils.batching import MicroBatcher
+
+
+class Recorder:
+    """batch_fn that records the batches it was given."""
+
+    def __init__(self, fn=lambda items: [item * 2 for item in items], delay: float = 0.0):
+        self.fn = fn
+        self.delay = delay
+        self.batches = []
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        time.sleep(self.delay)
+        return self.fn(items)
+
+
+def test_each_caller_gets_its_own_result():
+    recorder = Recorder(delay=0.01)
+    batcher = MicroBatcher("test", recorder, max_items=8, max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(20)]
+    assert [f.result(timeout=5) for f in futures] == [i * 2 for i in range(20)]
+    assert sum(len(b) for b in recorder.batches) == 20
+    assert max(len(b) for b in recorder.batches) <= 8
+    assert len(recorder.batches) < 20
+
+
+def test_concurrent_threads_share_batches():
+    recorder = Recorder()
+    batcher = MicroBatcher("test", recorder, max_items=16, max_wait_ms=100)
+    results = {}
+    barrier = threading.Barrier(8)
+
+    def call(i):
+        barrier.wait()
+        results[i] = batcher(i)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+    assert results == {i: i * 2 for i in range(8)}
+    assert len(recorder.batches) < 8
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    def fail(items):
+        raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher("test", Recorder(fail), max_items=4, max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            future.result(timeout=5)
+    # The worker survives a failed batch
+    batcher.batch_fn = Recorder()
+    assert batcher(5) == 10
+
+
+def test_partial_batch_is_flushed_after_the_wait():
+    recorder = Recorder()
+    batcher = MicroBatcher("test", recorder, max_items=100, max_wait_ms=20)
+    started = time.perf_counter()
+    assert batcher(1) == 2
+    # Well before max_items would ever arrive
+    assert time.perf_counter() - started < 1
+    assert recorder.batches == [[1]]
+
+
+def test_full_batch_does_not_wait():
+    recorder = Recorder()
+    batcher = MicroBatcher("test", recorder, max_items=2, max_wait_ms=10_000)
+    futures = [batcher.submit(i) for i in range(2)]
+    assert [f.result(timeout=5) for f in futures] == [0, 2]
+
+
+def test_acall():
+    batcher = MicroBatcher("test", Recorder(), max_items=8, max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(*(batcher.acall(i) for i in range(5)))
+
+    assert asyncio.run(main()) == [0, 2, 4, 6, 8]
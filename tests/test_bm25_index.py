@@ -0,0 +1,87 @@
+import pytest
+
+from knowledge_base.bm25_index import (BM25Index, _decode_varints, _put_varint, fuse_alpha, fuse_rrf,
+                                       tokenize)
+
+
+@pytest.mark.parametrize("values", [[0], [1, 127, 128, 255, 16384], [2 ** 31 - 1, 0, 2 ** 40, 3]])
+def test_varint_round_trip(values):
+    buf = bytearray()
+    for n in values:
+        _put_varint(buf, n)
+    assert _decode_varints(buf) == values
+
+
+def test_varint_sizes():
+    for n, size in ((0, 1), (127, 1), (128, 2), (16383, 2), (16384, 3)):
+        buf = bytearray()
+        _put_varint(buf, n)
+        assert len(buf) == size
+
+
+def test_tokenize_menu_prices_and_spellings():
+    assert tokenize("Rs. 320", bigrams=False) == ["₹320"]
+    assert tokenize("320/-", bigrams=False) == ["₹320"]
+    assert tokenize("biriyani", bigrams=False) == tokenize("biryani", bigrams=False)
+    assert "buter_chicken" in tokenize("Butter Chicken")
+
+
+def _index():
+    index = BM25Index()
+    index.add("a", "Butter chicken with garlic naan, Rs. 320")
+    index.add("b", "Paneer tikka and dal makhani")
+    index.add("c", "Chicken biryani with raita")
+    return index
+
+
+def test_search_ranks_matching_chunks():
+    index = _index()
+    assert index.search("butter chicken")[0][0] == "a"
+    assert {c for c, _ in index.search("chicken")} == {"a", "c"}
+    assert index.search("₹320") == index.search("320/-")
+    assert index.search("chicken", allowed={"c"}) == [("c", dict(index.search("chicken"))["c"])]
+
+
+def test_remove_compact_and_persist(tmp_path):
+    index = _index()
+    index.remove("a")
+    assert [c for c, _ in index.search("chicken")] == ["c"]
+    before = index.search("paneer")
+    index.compact()
+    assert index.doc_ids == ["b", "c"]
+    assert index.search("paneer") == before
+    # Re-adding replaces the text
+    index.add("c", "Masala dosa")
+    assert index.search("biryani") == []
+
+    path = str(tmp_path / "bm25.npz")
+    index.save(path, log_offset=7)
+    loaded, extras = BM25Index.load(path)
+    assert extras == {"log_offset": 7}
+    assert loaded.search("dosa") == index.search("dosa")
+    assert len(loaded) == 2
+
+
+def test_rrf_uses_ranks_only():
+    fused = fuse_rrf([["a", "b", "c"], ["b", "c", "d"]])
+    assert [c for c, _ in fused] == ["b", "c", "a", "d"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+
+
+def test_alpha_weighs_normalized_scores():
+    vector = [("a", 0.9), ("b", 0.5), ("c", 0.1)]
+    keyword = [("c", 40.0), ("b", 30.0), ("a", 0.0)]
+    assert fuse_alpha(vector, keyword, alpha=1.0)[0][0] == "a"
+    assert fuse_alpha(vector, keyword, alpha=0.0)[0][0] == "c"
+    fused = dict(fuse_alpha(vector, keyword, alpha=0.25))
+    assert fused["c"] == pytest.approx(0.75)
+    assert fused["b"] == pytest.approx(0.25 * 0.5 + 0.75 * 0.75)
+
+
+def test_alpha_and_rrf_differ_on_score_gaps():
+    # A keyword hit far ahead on score wins alpha fusion but only ties on rank under RRF
+    vector = [("a", 0.80), ("b", 0.79)]
+    keyword = [("b", 50.0), ("a", 1.0)]
+    assert fuse_alpha(vector, keyword, alpha=0.25)[0][0] == "b"
+    rrf = dict(fuse_rrf([[c for c, _ in vector], [c for c, _ in keyword]]))
+    assert rrf["a"] == pytest.approx(rrf["b"])
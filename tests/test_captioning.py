@@ -0,0 +1,63 @@
+import hashlib
+import io
+import json
+
+import pytest
+
+pytest.importorskip("requests")
+Image = pytest.importorskip("PIL.Image")
+
+from knowledge_base.captioning import ImageCaptioner
+
+
+def _png(color) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (4, 4), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def captioner(tmp_path, monkeypatch):
+    bodies = {"https://img/a.png": _png("red"), "https://img/b.png": _png("red"),
+              "https://img/c.png": _png("blue"), "https://img/broken.png": None}
+    captioner = ImageCaptioner(cache_path=str(tmp_path / "captions.json"))
+    monkeypatch.setattr(captioner, "_fetch_all", lambda urls: {u: bodies[u] for u in urls})
+    captioner.generated = []
+
+    def generate(images):
+        captioner.generated.extend(images)
+        return [f"caption {len(captioner.generated) - len(images) + i}" for i in range(len(images))]
+
+    monkeypatch.setattr(captioner, "_generate", generate)
+    return captioner
+
+
+def test_same_picture_is_captioned_once(captioner):
+    result = captioner.caption_urls(["https://img/a.png", "https://img/b.png", "https://img/c.png",
+                                     "https://img/broken.png", ""])
+    assert len(captioner.generated) == 2
+    assert result["https://img/a.png"] == result["https://img/b.png"] != result["https://img/c.png"]
+    assert "https://img/broken.png" not in result
+
+    assert captioner.caption_urls(["https://img/b.png"]) == {"https://img/b.png": result["https://img/b.png"]}
+    assert len(captioner.generated) == 2
+
+
+def test_cache_is_written_on_flush_only(captioner, tmp_path):
+    path = tmp_path / "captions.json"
+    captioner.caption_urls(["https://img/a.png"])
+    captioner.caption_urls(["https://img/c.png"])
+    assert not path.exists()
+
+    captioner.flush()
+    saved = json.loads(path.read_text())
+    digest = hashlib.sha256(_png("red")).hexdigest()
+    assert saved["url_hashes"]["https://img/a.png"] == digest
+    assert saved["captions"][digest] == "caption 0"
+    assert ImageCaptioner(cache_path=str(path)).captions == captioner.captions
+
+    # Nothing new: flushing again does not rewrite the file
+    path.unlink()
+    captioner.caption_urls(["https://img/a.png"])
+    captioner.flush()
+    assert not path.exists()
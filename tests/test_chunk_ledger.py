@@ -0,0 +1,114 @@
+import pytest
+
+from knowledge_base.chunk_ledger import ChunkLedger
+
+MODEL = "all-MiniLM-L6-v2"
+
+
+@pytest.fixture
+def ledger_path(tmp_path):
+    return str(tmp_path / "ledger.sqlite")
+
+
+@pytest.fixture
+def ledger(ledger_path):
+    ledger = ChunkLedger(ledger_path)
+    yield ledger
+    ledger.close()
+
+
+def test_new_chunk_is_pending_in_every_sink(ledger):
+    assert ledger.pending_sinks("c1", 1, MODEL) == {"vector", "graph"}
+    ledger.record("c1", 1, "fp1", MODEL)
+    assert ledger.pending_sinks("c1", 1, MODEL) == {"vector", "graph"}
+
+
+def test_resume_only_redoes_missing_writes(ledger_path):
+    ledger = ChunkLedger(ledger_path)
+    ledger.record("c1", 1, "fp1", MODEL)
+    ledger.mark_written("c1", 1, "vector", MODEL)
+    ledger.record("c2", 1, "fp2", MODEL)
+    ledger.mark_written("c2", 1, "vector", MODEL)
+    ledger.mark_written("c2", 1, "graph")
+    # Crash: reopen without closing
+    resumed = ChunkLedger(ledger_path)
+    assert resumed.pending_sinks("c1", 1, MODEL) == {"graph"}
+    assert resumed.pending_sinks("c2", 1, MODEL) == set()
+    assert resumed.stats(1) == {"written/pending": 1, "written/written": 1}
+    resumed.close()
+    ledger.close()
+
+
+def test_vectors_from_another_model_are_redone(ledger):
+    ledger.record("c1", 1, "fp1", MODEL)
+    ledger.mark_written("c1", 1, "vector", "old-model")
+    ledger.mark_written("c1", 1, "graph")
+    assert ledger.pending_sinks("c1", 1, MODEL) == {"vector"}
+
+
+def test_record_is_idempotent_and_keeps_statuses(ledger):
+    ledger.record("c1", 1, "fp1", MODEL, url="u")
+    ledger.mark_written("c1", 1, "vector", MODEL)
+    ledger.record("c1", 1, "fp1", MODEL, url="u")
+    ledger.mark_written("c1", 1, "vector", MODEL)
+    assert ledger.pending_sinks("c1", 1, MODEL) == {"graph"}
+    assert ledger.stats(1) == {"written/pending": 1}
+
+
+def test_versions_are_independent(ledger):
+    ledger.record("c1", 1, "fp1", MODEL)
+    ledger.mark_written("c1", 1, "vector", MODEL)
+    ledger.mark_written("c1", 1, "graph")
+    assert ledger.pending_sinks("c1", 2, MODEL) == {"vector", "graph"}
+    ledger.drop_version(1)
+    assert not ledger.has_version(1)
+
+
+def test_mark_written_rejects_unknown_sink(ledger):
+    with pytest.raises(ValueError):
+        ledger.mark_written("c1", 1, "cache")
+
+
+def test_unfinished_build_resumes_same_version(ledger):
+    ledger.start_build(3, "full")
+    assert ledger.unfinished_build("full") == 3
+    ledger.start_build(3, "full")
+    assert ledger.conn.execute("SELECT COUNT(*) FROM builds").fetchone()[0] == 1
+    assert ledger.unfinished_build("incremental") is None
+    ledger.finish_build(3)
+    assert ledger.unfinished_build("full") is None
+
+
+def test_seed_adopts_existing_chunks(ledger):
+    ledger.seed(1, {"a_1", "b_2"}, {"b_2"}, MODEL)
+    ledger.seed(1, {"a_1", "b_2"}, {"b_2"}, MODEL)
+    assert ledger.pending_sinks("a_1", 1, MODEL) == {"graph"}
+    assert ledger.pending_sinks("b_2", 1, MODEL) == set()
+
+
+def test_duplicates_follow_their_original(ledger):
+    chunk = {"chunk_id": "d1", "markdown": "text", "url": "u"}
+    ledger.record_duplicate("d1", 1, "c1", chunk, strategy="section")
+    ledger.record_duplicate("d1", 1, "c1", chunk, strategy="section")
+    ledger.record_duplicate("d2", 1, "c2", {"chunk_id": "d2"})
+    assert ledger.duplicates_of(["c1"], 1) == [("d1", chunk, "section")]
+    assert ledger.duplicates_of(["c1"], 2) == []
+
+    assert ledger.forget_duplicates(["d1", "c1"], 1) == {"d1"}
+    assert ledger.duplicates_of(["c1", "c2"], 1) == [("d2", {"chunk_id": "d2"}, None)]
+
+
+def test_tombstone_marks_both_sinks(ledger):
+    ledger.record("c1", 1, "fp1", MODEL)
+    ledger.mark_tombstoned(["c1"], 1)
+    assert ledger.stats(1) == {"tombstoned/tombstoned": 1}
+
+
+def test_record_stores_the_embedding_model(ledger):
+    ledger.record("c1", 1, "fp1", MODEL)
+    row = ledger.conn.execute("SELECT embed_model FROM chunks WHERE chunk_id = 'c1'").fetchone()
+    assert row == (MODEL,)
+    ledger.mark_written("c1", 1, "vector", "old-model")
+    # Re-recording under a new model leaves the model of the vector actually written
+    ledger.record("c1", 1, "fp1", "new-model")
+    assert ledger.pending_sinks("c1", 1, "new-model") == {"vector", "graph"}
@@ -0,0 +1,64 @@
+import pytest
+
+for module in ("bs4", "transformers", "langchain_huggingface", "yaml"):
+    pytest.importorskip(module)
+
+from retrieval.context_packer import pack_context
+
+
+def words(text: str) -> int:
+    return len(text.split())
+
+
+def _cost(packed: list[str]) -> int:
+    return sum(words(line) + 1 for passage in packed for line in passage.splitlines())
+
+
+def test_everything_fits():
+    passages = ["Paneer tikka is smoky", "Dal makhani is slow cooked"]
+    assert pack_context(passages, token_budget=100, count=words) == passages
+
+
+def test_budget_is_never_exceeded():
+    passages = [f"line {i} of passage {p} with some words" for p in range(10) for i in range(3)]
+    passages = ["\n".join(passages[i:i + 3]) for i in range(0, len(passages), 3)]
+    packed = pack_context(passages, token_budget=50, count=words)
+    assert packed
+    assert _cost(packed) <= 50
+
+
+def test_near_duplicate_passages_are_skipped():
+    first = "Butter chicken is cooked in a rich tomato and cream gravy with butter and spices"
+    near_dup = first + " today"
+    other = "Masala dosa comes with sambar and coconut chutney"
+    assert pack_context([first, near_dup, other], token_budget=100, count=words) == [first, other]
+
+
+def test_repeated_lines_are_dropped():
+    a = "Restaurant: Saffron\nOpen till midnight"
+    b = "restaurant:  saffron\nGarlic naan is soft and buttery"
+    assert pack_context([a, b], token_budget=100, count=words) == [a, "Garlic naan is soft and buttery"]
+
+
+def test_partial_passage_keeps_priority_lines_in_order():
+    story = " ".join(["story"] * 20)
+    passage = "\n".join([story, "Paneer tikka ₹320", story + " again", "Menu includes: naan, dal"])
+    # 28 tokens left: both priority lines (4 + 5) fit, neither 21-token story line does after them
+    packed = pack_context(["Intro line", passage], token_budget=3 + 28, count=words)
+    assert packed == ["Intro line", "Paneer tikka ₹320\nMenu includes: naan, dal"]
+
+
+def test_small_leftover_budget_stops_packing():
+    big = " ".join(["word"] * 30)
+    tail = "Paneer tikka ₹320\nSomething else entirely here and there too"
+    packed = pack_context([big, tail], token_budget=40, count=words)
+    # 9 tokens left is below MIN_PARTIAL_TOKENS
+    assert packed == [big]
+
+
+def test_oversized_first_line_is_cut():
+    line = " ".join(f"w{i}" for i in range(100))
+    packed = pack_context([line], token_budget=10, count=words)
+    assert len(packed) == 1
+    assert packed[0].endswith("…")
+    assert line.startswith(packed[0][:-1])
@@ -0,0 +1,74 @@
+import pytest
+
+for module in ("langchain_core", "langgraph", "transformers", "langchain_huggingface", "yaml"):
+    pytest.importorskip(module)
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from langchain_agent.memory import conversation_memory
+from langchain_agent.memory.conversation_memory import (TOOL_RESULT_MIN_TOKENS, _message_tokens,
+                                                        cap_tool_results, split_history)
+
+
+@pytest.fixture(autouse=True)
+def four_chars_per_token(monkeypatch):
+    monkeypatch.setattr(conversation_memory, "count_tokens", lambda text: len(text) // 4)
+
+
+def _turn(i: int, tool_chars: int = 400) -> list:
+    return [
+        HumanMessage(content=f"question {i} " + "q" * 40),
+        AIMessage(content="", tool_calls=[{"name": "search", "args": {"q": str(i)}, "id": f"call{i}"}]),
+        ToolMessage(content="r" * tool_chars, tool_call_id=f"call{i}"),
+        AIMessage(content=f"answer {i} " + "a" * 40),
+    ]
+
+
+def _tokens(messages) -> int:
+    return sum(_message_tokens(m) for m in messages)
+
+
+def test_history_within_budget_is_left_alone():
+    assert split_history(_turn(0), token_budget=1000) is None
+
+
+def test_split_keeps_whole_recent_turns():
+    messages = _turn(0) + _turn(1) + _turn(2)
+    older, recent = split_history(messages, token_budget=200, keep_tokens=150)
+    assert older + recent == messages
+    assert isinstance(recent[0], HumanMessage)
+    assert recent == messages[8:]
+
+
+def test_single_turn_history_has_no_older_part():
+    # The only user message is the first one; the turn is kept whole
+    messages = _turn(0, tool_chars=4000)
+    assert split_history(messages, token_budget=200, keep_tokens=150) == ([], messages)
+
+
+def test_history_without_user_message_is_not_split():
+    messages = _turn(0, tool_chars=4000)[1:]
+    assert split_history(messages, token_budget=200, keep_tokens=150) is None
+
+
+def test_cap_shortens_oldest_tool_results_first():
+    messages = _turn(0, tool_chars=2000)[:3] + [ToolMessage(content="s" * 2000, tool_call_id="x")]
+    capped = cap_tool_results(messages, token_budget=700)
+    assert _tokens(capped) <= 700
+    assert capped[2].content.endswith("…[truncated]")
+    assert capped[3].content == messages[3].content
+    assert capped[0] is messages[0]
+
+
+def test_cap_never_goes_below_the_minimum():
+    messages = _turn(0, tool_chars=4000)
+    capped = cap_tool_results(messages, token_budget=10)
+    assert _message_tokens(capped[2]) <= TOOL_RESULT_MIN_TOKENS + 8
+    assert len(capped[2].content) > 0
+
+
+def test_cap_returns_the_same_list_when_nothing_can_be_cut():
+    messages = [HumanMessage(content="q" * 8000)]
+    assert cap_tool_results(messages, token_budget=100) is messages
+    fitting = _turn(0)
+    assert cap_tool_results(fitting, token_budget=10_000) is fitting
@@ -0,0 +1,68 @@
+import pytest
+
+from utils import gazetteer as gazetteer_module
+from utils.gazetteer import VOCABULARY, Gazetteer, _Automaton, is_generic_name, normalize
+
+
+@pytest.fixture(autouse=True)
+def pure_python_automaton(monkeypatch):
+    # Test the fallback automaton whether or not pyahocorasick is installed
+    monkeypatch.setattr(gazetteer_module, "ahocorasick", None)
+
+
+def _gazetteer(**graph_names):
+    return Gazetteer({**VOCABULARY, **graph_names})
+
+
+def test_automaton_reports_every_match_with_its_end():
+    automaton = _Automaton()
+    for word in ("he", "she", "his", "hers"):
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    assert sorted(automaton.iter("ushers")) == [(3, "he"), (3, "she"), (5, "hers")]
+
+
+def test_normalize_pads_and_folds():
+    assert normalize("Panner  TIKKA!") == " paner tika "
+    assert normalize("Domino's") == " dominos "
+
+
+def test_match_finds_names_on_word_boundaries():
+    gaz = _gazetteer(dish={"Paneer Tikka": "Paneer Tikka"})
+    assert gaz.match("any good panner tika?") == [("dish", "Paneer Tikka", "paner tika")]
+    # "thai" inside "thaili" is no match
+    assert gaz.match("thaili") == []
+
+
+def test_longest_match_wins_over_overlaps():
+    gaz = _gazetteer(dish={"Butter Chicken": "Butter Chicken", "Chicken Biryani": "Chicken Biryani"})
+    found = gaz.match("south indian butter chicken biryani")
+    # Leftmost-longest: "indian" is inside "south indian", "Chicken Biryani" overlaps "Butter Chicken"
+    assert [(kind, name) for kind, name, _ in found] == [
+        ("cuisine", "south indian"), ("dish", "Butter Chicken"), ("cuisine", "biryani")]
+
+
+def test_adjacent_matches_share_the_space_between():
+    gaz = _gazetteer()
+    assert [name for _, name, _ in gaz.match("spicy veg starters")] == ["spicy", "vegetarian", "starter"]
+
+
+def test_one_key_can_name_several_kinds():
+    gaz = _gazetteer(restaurant={"Biryani Blues": "Biryani Blues"}, dish={"Biryani Blues": "Biryani Blues"})
+    kinds = {kind for kind, _, _ in gaz.match("biryani blues menu")}
+    assert kinds == {"restaurant", "dish"}
+
+
+def test_generic_restaurant_names_are_not_loaded():
+    assert is_generic_name("indian_restaurants")
+    assert is_generic_name("Best Cafe")
+    assert not is_generic_name("Haldiram's")
+    gaz = _gazetteer(restaurant={"indian restaurants": "indian_restaurants", "Haldiram's": "Haldiram's"})
+    assert gaz.match("best indian restaurants near me") == [("cuisine", "indian", "indian")]
+    assert gaz.match("haldirams thali")[0][:2] == ("restaurant", "Haldiram's")
+
+
+def test_short_names_are_skipped():
+    gaz = Gazetteer({"dish": {"Ok": "Ok"}})
+    assert gaz.size == 0
+    assert gaz.match("ok") == []
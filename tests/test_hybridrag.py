@@ -0,0 +1,151 @@
+import pytest
+
+for module in ("neo4j", "sentence_transformers", "llama_index.vector_stores.weaviate", "flashrank",
+               "prometheus_client", "bs4", "transformers", "langchain_huggingface", "yaml"):
+    pytest.importorskip(module)
+
+from retrieval import hybridrag
+from retrieval.hybridrag import DISH_CANDIDATES_QUERY, ENRICH_QUERY, PREFILTER_MAX_CANDIDATES, HybridRAG
+
+
+def _hit(chunk_id, score):
+    return {"chunk_id": chunk_id, "properties": {"markdown": f"text of {chunk_id}"}, "score": score}
+
+
+class FakeVectors:
+    """Vector backend returning canned hits for the filtered and the unfiltered search."""
+    name = "fake"
+
+    def __init__(self, filtered, unfiltered):
+        self.filtered, self.unfiltered = filtered, unfiltered
+        self.searches = []
+
+    def search(self, version, query, vector, limit=10, alpha=0.25, filters=None):
+        self.searches.append(filters)
+        return (self.filtered if filters else self.unfiltered)[:limit]
+
+
+class _Result(list):
+    def single(self):
+        return None
+
+
+class FakeGraph:
+    """Neo4j driver stand-in: dish candidates from a fixed list, no enrichment."""
+
+    def __init__(self, candidates=()):
+        self.candidates = list(candidates)
+        self.queries = []
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        self.queries.append((query, params))
+        if query == DISH_CANDIDATES_QUERY:
+            return _Result({"chunk_id": c} for c in self.candidates[:params["cap"]])
+        assert query == ENRICH_QUERY
+        return _Result()
+
+
+class KeepOrder:
+    """Reranker scoring passages in their first-stage order."""
+
+    def rerank(self, request):
+        return [{"id": p["id"], "score": 1.0 / (1 + p["id"])} for p in request.passages]
+
+
+def _rag(vectors, graph):
+    rag = HybridRAG.__new__(HybridRAG)
+    rag.vectors, rag.neo4j_driver = vectors, graph
+    rag.refresh_alias = lambda: 1
+    return rag
+
+
+def _query(rag, entities, limit=3, rerank_limit=4):
+    return rag.query_hybrid("paneer tikka at saffron", [1.0, 0.0], limit=limit, rerank_limit=rerank_limit,
+                            reranker=KeepOrder(), entities=entities, token_budget=None)
+
+
+def test_restaurant_filter_is_topped_up_from_the_unfiltered_search():
+    vectors = FakeVectors([_hit("s1", 0.9), _hit("s2", 0.8)],
+                          [_hit("s1", 0.7), _hit("o1", 0.6), _hit("o2", 0.5), _hit("o3", 0.4)])
+    context = _query(_rag(vectors, FakeGraph()), {"restaurants": ["Saffron"]})
+
+    assert vectors.searches == [{"restaurant_name": ["Saffron"]}, None]
+    assert context == ["text of s1", "text of s2", "text of o1"]
+
+
+def test_enough_filtered_hits_skip_the_unfiltered_search():
+    vectors = FakeVectors([_hit(f"s{i}", 1 - i / 10) for i in range(4)], [_hit("o1", 0.9)])
+    context = _query(_rag(vectors, FakeGraph()), {"restaurants": ["Saffron"]})
+
+    assert vectors.searches == [{"restaurant_name": ["Saffron"]}]
+    assert context == ["text of s0", "text of s1", "text of s2"]
+
+
+def test_dishes_filter_by_graph_candidates():
+    graph = FakeGraph(["d1", "d2"])
+    vectors = FakeVectors([_hit("d1", 0.9), _hit("d2", 0.8)], [_hit("o1", 0.6), _hit("d2", 0.5)])
+    context = _query(_rag(vectors, graph), {"dishes": ["paneer tikka"]})
+
+    query, params = graph.queries[0]
+    assert query == DISH_CANDIDATES_QUERY
+    assert params == {"dishes": ["paneer tikka"], "version": 1, "cap": PREFILTER_MAX_CANDIDATES + 1}
+    assert "tombstoned_at IS NULL" in DISH_CANDIDATES_QUERY
+    assert vectors.searches == [{"chunk_ids": ["d1", "d2"]}, None]
+    assert context == ["text of d1", "text of d2", "text of o1"]
+
+
+def test_oversized_or_empty_candidate_sets_do_not_filter():
+    graph = FakeGraph(f"d{i}" for i in range(PREFILTER_MAX_CANDIDATES + 5))
+    vectors = FakeVectors([], [_hit("o1", 0.6)])
+    assert _query(_rag(vectors, graph), {"dishes": ["dal"]}) == ["text of o1"]
+    assert vectors.searches == [None]
+
+    assert HybridRAG._candidate_filter([]) is None
+    assert HybridRAG._restaurant_filter({"restaurants": []}) is None
+    assert HybridRAG._restaurant_filter(None) is None
+
+
+def test_merge_hits_tags_the_search_each_hit_came_from():
+    merged = HybridRAG._merge_hits([_hit("a", 0.9)], [_hit("a", 0.8), _hit("b", 0.7), _hit("c", 0.6)], 2)
+    assert [(h["chunk_id"], h["ranking"], h["score"]) for h in merged] == [("a", 0, 0.9), ("b", 1, 0.7)]
+
+
+def _results(*scores, ranking=0):
+    return [{"score": s, "ranking": ranking} for s in scores]
+
+
+def test_rerank_depth_skips_a_dominant_top_hit():
+    assert HybridRAG._rerank_depth(_results(0.95, 0.3, 0.25, 0.2), limit=2, rerank_limit=10) == 0
+    assert HybridRAG._rerank_depth(_results(0.9), limit=2, rerank_limit=10) == 0
+
+
+def test_rerank_depth_covers_the_ambiguous_head():
+    # Normalized: 1.0, 0.9, 0.8, 0.1, 0.0 -> three within the window
+    results = _results(0.9, 0.85, 0.8, 0.45, 0.4)
+    assert HybridRAG._rerank_depth(results, limit=2, rerank_limit=10) == 3
+    # Never shallower than the number of passages returned, never deeper than rerank_limit
+    assert HybridRAG._rerank_depth(results, limit=4, rerank_limit=10) == 4
+    assert HybridRAG._rerank_depth(results, limit=2, rerank_limit=2) == 2
+
+
+def test_rerank_depth_only_compares_scores_from_one_search():
+    # Unfiltered hits score on another scale; they count as ambiguous, not as runners-up
+    results = _results(0.9, 0.85, 0.8, 0.4) + _results(0.99, 0.98, ranking=1)
+    assert HybridRAG._rerank_depth(results, limit=2, rerank_limit=10) == 5
+    # Fewer than three comparable scores: no range to judge by
+    assert HybridRAG._rerank_depth(_results(0.9, 0.1) + _results(0.5, ranking=1), 1, 10) == 3
+    assert HybridRAG._rerank_depth(_results(0.5, 0.5, 0.5), 1, 10) == 3
+
+
+def test_rerank_depth_without_adaptive_reranking(monkeypatch):
+    monkeypatch.setattr(hybridrag, "RERANK_ADAPTIVE", False)
+    assert HybridRAG._rerank_depth(_results(0.95, 0.3, 0.25, 0.2), limit=2, rerank_limit=3) == 3
@@ -0,0 +1,162 @@
+from datetime import datetime
+
+import pytest
+
+from ingestion.datalake import content_hash
+from knowledge_base.index_manifest import MAX_RUN_HISTORY, IndexManifest, page_hash
+from knowledge_base.vector_store import LocalVectorBackend
+
+
+def _page(markdown, url="https://saffron.example/menu"):
+    return {"url": url, "restaurant_name": "Saffron", "markdown": markdown, "html": ""}
+
+
+def test_page_hash_follows_the_bodies():
+    page = _page("Paneer tikka ₹320")
+    assert page_hash(page) == content_hash(page)
+    assert page_hash(page) != page_hash(_page("Paneer tikka ₹340"))
+    # Rows upserted into the datalake carry their hash; it is trusted as is
+    assert page_hash({**page, "content_hash": "abc"}) == "abc"
+
+
+def test_unchanged_pages_are_skipped(tmp_path):
+    manifest = IndexManifest(str(tmp_path / "manifest.json"))
+    page = _page("Paneer tikka ₹320")
+    assert not manifest.is_unchanged(page["url"], page_hash(page))
+    manifest.record_page(page["url"], "Saffron", page_hash(page), {"c1", "c2"})
+    assert manifest.is_unchanged(page["url"], page_hash(page))
+    assert not manifest.is_unchanged(page["url"], page_hash(_page("Paneer tikka ₹340")))
+
+
+def test_watermark_only_moves_forward(tmp_path):
+    manifest = IndexManifest(str(tmp_path / "manifest.json"))
+    manifest.advance_watermark(None)
+    assert manifest.watermark is None
+    manifest.advance_watermark(datetime(2025, 4, 22, 8, 0))
+    manifest.advance_watermark(datetime(2025, 4, 21, 8, 0))
+    assert manifest.watermark == "2025-04-22T08:00:00"
+    manifest.advance_watermark("2025-04-23T00:00:00")
+    assert manifest.watermark == "2025-04-23T00:00:00"
+
+
+def test_save_load_and_reset(tmp_path):
+    path = str(tmp_path / "state" / "manifest.json")
+    manifest = IndexManifest(path)
+    manifest.version = 2
+    manifest.record_page("u", "Saffron", "h", {"c2", "c1"})
+    manifest.advance_watermark("2025-04-22T08:00:00")
+    for _ in range(MAX_RUN_HISTORY + 3):
+        manifest.start_run("incremental")["pages_indexed"] = 1
+        manifest.finish_run()
+    manifest.save()
+
+    loaded = IndexManifest(path)
+    assert loaded.version == 2
+    assert loaded.chunk_ids("u") == {"c1", "c2"}
+    assert loaded.watermark == "2025-04-22T08:00:00"
+    assert len(loaded.runs) == MAX_RUN_HISTORY
+    assert loaded.runs[-1]["watermark"] == "2025-04-22T08:00:00"
+
+    loaded.reset(version=3)
+    assert (loaded.urls(), loaded.watermark, loaded.version) == (set(), None, 3)
+
+
+def test_incremental_run_retires_stale_and_removed_chunks(tmp_path):
+    """The steps index_record and the removed-page sweep take, against the local backend."""
+    backend = LocalVectorBackend(str(tmp_path / "vectors"))
+    backend.ensure_collection(1)
+    manifest = IndexManifest(str(tmp_path / "manifest.json"))
+
+    def index(page, chunks):
+        url = page["url"]
+        if manifest.is_unchanged(url, page_hash(page)):
+            return "skipped"
+        backend.upsert(1, [{"id": c, "vector": [1.0, float(i)], "properties": {"markdown": c}}
+                           for i, c in enumerate(chunks)])
+        stale = manifest.chunk_ids(url) - set(chunks)
+        backend.delete(1, stale)
+        manifest.record_page(url, page["restaurant_name"], page_hash(page), chunks)
+        return "indexed"
+
+    menu, about = _page("v1"), _page("about us", url="https://saffron.example/about")
+    assert index(menu, ["m1", "m2"]) == "indexed"
+    assert index(about, ["a1"]) == "indexed"
+    assert index(menu, ["m1", "m2"]) == "skipped"
+
+    # The menu changed: m2 is gone, m3 is new, m1 is unchanged
+    assert index(_page("v2"), ["m1", "m3"]) == "indexed"
+    assert backend.chunk_ids(1) == {"m1", "m3", "a1"}
+
+    # The about page disappeared from the datalake
+    for url in manifest.urls() - {menu["url"]}:
+        backend.delete(1, manifest.drop_page(url))
+    assert backend.chunk_ids(1) == {"m1", "m3"}
+    assert manifest.urls() == {menu["url"]}
+
+
+class _ChunkGraph:
+    """Neo4j driver stand-in holding Chunk nodes as {chunk_id: tombstoned?}."""
+
+    def __init__(self, chunk_ids):
+        self.tombstoned = dict.fromkeys(chunk_ids, False)
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, chunk_ids=None, version=None):
+        if "SET c.tombstoned_at" in query:
+            self.tombstoned.update(dict.fromkeys(chunk_ids, True))
+            return []
+        assert "WHERE c.tombstoned_at IS NULL" in query
+        return [{"id": c} for c, dead in self.tombstoned.items() if not dead]
+
+
+def test_tombstoned_chunks_leave_both_stores(tmp_path):
+    pytest.importorskip("neo4j")
+    pytest.importorskip("sentence_transformers")
+    from knowledge_base.hybrid_rag import HybridRAG
+
+    rag = HybridRAG.__new__(HybridRAG)
+    rag.version = 1
+    rag.vectors = LocalVectorBackend(str(tmp_path))
+    rag.vectors.ensure_collection(1)
+    rag.vectors.upsert(1, [{"id": c, "vector": [1.0, 0.0], "properties": {}} for c in ("c1", "c2", "c3")])
+    rag.neo4j_driver = _ChunkGraph(["c1", "c2", "c3"])
+
+    assert rag.tombstone_chunks(["c2", None]) == 1
+    assert rag.existing_chunk_ids() == ({"c1", "c3"}, {"c1", "c3"})
+    assert rag.tombstone_chunks([]) == 0
+
+
+def test_weaviate_delete_targets_object_uuids():
+    pytest.importorskip("weaviate")
+    import weaviate.util
+    from weaviate.classes.query import Filter
+    from knowledge_base.vector_store import WeaviateVectorBackend
+
+    deleted = []
+
+    class Data:
+        def delete_many(self, where):
+            deleted.append(where)
+
+    class Collections:
+        def get(self, name):
+            assert name == "RestaurantChunk_v2"
+            collection = type("Collection", (), {})()
+            collection.data = Data()
+            return collection
+
+    client = type("Client", (), {})()
+    client.collections = Collections()
+    ids = [f"saffron-menu-{i}" for i in range(5)]
+
+    assert WeaviateVectorBackend(client).delete(2, ids, batch_size=2) == 5
+    uuids = [weaviate.util.generate_uuid5(c) for c in ids]
+    assert deleted == [Filter.by_id().contains_any(uuids[i:i + 2]) for i in (0, 2, 4)]
@@ -0,0 +1,96 @@
+from knowledge_base.index_versions import (
+    collection_name, garbage_collect, parse_collection_name, resolve_alias, switch_alias, validate_version
+)
+from knowledge_base.vector_store import LocalVectorBackend
+
+
+class _Result(list):
+    def single(self):
+        return self[0] if self else None
+
+
+class FakeGraph:
+    """Just enough of a Neo4j driver for the alias and Chunk-count queries of index_versions."""
+
+    def __init__(self):
+        self.alias = {}     # alias name -> {"version": ..., "previous": ...}
+        self.chunks = {}    # version -> number of live Chunk nodes
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, alias=None, version=None, **params):
+        if "MERGE (a:IndexAlias" in query:
+            node = self.alias.setdefault(alias, {})
+            node["previous"], node["version"] = node.get("version"), version
+            return _Result()
+        if "MATCH (a:IndexAlias" in query:
+            node = self.alias.get(alias)
+            return _Result([{"version": node["version"]}] if node else [])
+        if "count(c)" in query:
+            return _Result([{"n": self.chunks.get(version, 0)}])
+        if "DETACH DELETE" in query:
+            self.chunks.pop(version, None)
+            return _Result()
+        raise AssertionError(f"unexpected query: {query}")
+
+
+def _build(vectors, graph, version, n_chunks, n_nodes=None):
+    vectors.ensure_collection(version)
+    vectors.upsert(version, [{"id": f"v{version}-c{i}", "vector": [1.0, float(i)], "properties": {}}
+                             for i in range(n_chunks)])
+    graph.chunks[version] = n_chunks if n_nodes is None else n_nodes
+
+
+def test_collection_names_round_trip():
+    assert collection_name(0) == "RestaurantChunk"
+    assert collection_name(3) == "RestaurantChunk_v3"
+    assert parse_collection_name("RestaurantChunk_v3") == 3
+    assert parse_collection_name("RestaurantChunk") == 0
+    assert parse_collection_name("RestaurantChunk_v3_old") is None
+
+
+def test_switch_alias_keeps_the_previous_version():
+    graph = FakeGraph()
+    assert resolve_alias(graph) is None
+    switch_alias(graph, 1)
+    switch_alias(graph, 2)
+    assert resolve_alias(graph) == 2
+    assert graph.alias["RestaurantChunk"]["previous"] == 1
+
+
+def test_validate_version(tmp_path):
+    vectors, graph = LocalVectorBackend(str(tmp_path)), FakeGraph()
+    vectors.ensure_collection(1)
+    graph.chunks[1] = 0
+    assert validate_version(vectors, graph, 1) == (False, "empty index (vectors=0, neo4j=0)")
+
+    _build(vectors, graph, 1, 10)
+    assert validate_version(vectors, graph, 1) == (True, "10 chunks")
+
+    _build(vectors, graph, 2, 4, n_nodes=3)
+    ok, reason = validate_version(vectors, graph, 2, live_version=1)
+    assert not ok and reason.startswith("stores disagree")
+
+    # Consistent, but less than half of what is serving now
+    graph.chunks[2] = 4
+    ok, reason = validate_version(vectors, graph, 2, live_version=1)
+    assert not ok and "live version 1" in reason
+    assert validate_version(vectors, graph, 2, live_version=1, min_ratio=0.4)[0]
+
+
+def test_garbage_collect_never_drops_the_live_version(tmp_path):
+    vectors, graph = LocalVectorBackend(str(tmp_path)), FakeGraph()
+    for version in (1, 2, 3, 4):
+        _build(vectors, graph, version, 2)
+    switch_alias(graph, 1)
+
+    assert garbage_collect(vectors, graph, keep=2) == [2]
+    assert vectors.list_versions() == [1, 3, 4]
+    assert sorted(graph.chunks) == [1, 3, 4]
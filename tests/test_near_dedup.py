@@ -0,0 +1,88 @@
+import random
+
+from knowledge_base.near_dedup import NearDuplicateIndex, _lsh_params
+
+WORDS = ("paneer tikka butter chicken dal makhani naan roti biryani raita lassi gulab jamun "
+         "masala dosa idli sambar chutney kulfi samosa chole bhature rajma chawal").split()
+
+
+def _menu(seed: int, n: int = 120) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) + str(rng.randint(0, 50)) for _ in range(n))
+
+
+def _edit(text: str, n: int, seed: int = 0) -> str:
+    """`text` with `n` words replaced."""
+    rng = random.Random(seed)
+    words = text.split()
+    for i in rng.sample(range(len(words)), n):
+        words[i] = f"changed{i}"
+    return " ".join(words)
+
+
+def test_lsh_params_midpoint_below_threshold():
+    for threshold in (0.5, 0.8, 0.9):
+        bands, rows = _lsh_params(threshold, 128)
+        assert bands * rows == 128
+        assert (1 / bands) ** (1 / rows) <= threshold
+
+
+def test_near_duplicates_are_found():
+    index = NearDuplicateIndex(threshold=0.8)
+    misses = 0
+    for seed in range(20):
+        text = _menu(seed)
+        assert index.check("r", f"orig{seed}", text) is None
+        # One word in 120 changed leaves ~97% of the 3-shingles in common
+        if index.check("r", f"copy{seed}", _edit(text, 1, seed)) != f"orig{seed}":
+            misses += 1
+    assert misses <= 1
+    assert index.skipped == 20 - misses
+
+
+def test_dissimilar_texts_are_kept():
+    index = NearDuplicateIndex(threshold=0.9)
+    text = _menu(1)
+    index.check("r", "orig", text)
+    # A fifth of the words changed is far below 0.9 shingle similarity
+    assert index.check("r", "edited", _edit(text, 24)) is None
+    assert index.check("r", "other", _menu(2)) is None
+    assert len(index) == 3
+
+
+def test_scopes_are_separate():
+    index = NearDuplicateIndex()
+    text = _menu(3)
+    index.check("restaurant a", "a1", text)
+    assert index.check("restaurant b", "b1", text) is None
+    assert index.check("restaurant a", "a2", text) == "a1"
+
+
+def test_same_id_is_never_its_own_duplicate():
+    index = NearDuplicateIndex()
+    text = _menu(4)
+    assert index.check("r", "c1", text) is None
+    assert index.check("r", "c1", text) is None
+
+
+def test_removed_chunk_no_longer_suppresses():
+    index = NearDuplicateIndex()
+    text = _menu(5)
+    index.check("r", "c1", text)
+    assert index.check("r", "c2", text) == "c1"
+    index.remove(["c1"])
+    assert not index.buckets
+    assert index.check("r", "c2", text) is None
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "near_dup.npz")
+    index = NearDuplicateIndex(threshold=0.9, num_perm=64)
+    text = _menu(6)
+    index.check("r", "c1", text)
+    index.save(path)
+
+    loaded = NearDuplicateIndex.load(path, threshold=0.9, num_perm=64)
+    assert loaded.check("r", "c2", text) == "c1"
+    # Other settings start fresh
+    assert len(NearDuplicateIndex.load(path, threshold=0.8, num_perm=64)) == 0
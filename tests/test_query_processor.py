@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("huggingface_hub")
+
+from utils import query_processor
+from utils.gazetteer import VOCABULARY, Gazetteer
+from utils.query_processor import _expand, preprocess_query
+
+
+@pytest.fixture(autouse=True)
+def gazetteer(monkeypatch):
+    gaz = Gazetteer({
+        **VOCABULARY,
+        "restaurant": {"Haldiram's": "Haldiram's"},
+        "dish": {"Paneer Tikka": "Paneer Tikka", "Butter Chicken": "Butter Chicken"},
+    })
+    monkeypatch.setattr(query_processor, "get_gazetteer", lambda: gaz)
+    return gaz
+
+
+def test_entities_are_canonical():
+    _, entities = preprocess_query("spicy panner tika at haldirams under 300")
+    assert entities["dishes"] == ["Paneer Tikka"]
+    assert entities["restaurants"] == ["Haldiram's"]
+    assert entities["tastes"] == ["spicy"]
+    assert entities["max_price"] == 300
+    assert "keywords" not in entities
+
+
+def test_overlapping_names_resolve_to_the_longest():
+    _, entities = preprocess_query("south indian breakfast")
+    assert entities["cuisines"] == ["south indian"]
+    assert entities["courses"] == ["breakfast"]
+
+
+def test_query_is_expanded_with_canonical_names_and_related_terms():
+    processed, _ = preprocess_query("panner tika")
+    assert processed.startswith("panner tika ")
+    assert "Paneer Tikka" in processed
+
+    processed, _ = preprocess_query("cheap pure veg food")
+    assert "veg" not in processed[len("cheap pure veg food"):].split()
+    assert "affordable" in processed
+
+
+def test_unknown_queries_fall_back_to_keywords():
+    processed, entities = preprocess_query("Where is Zaffran?")
+    assert processed == "Where is Zaffran?"
+    assert "Zaffran" in entities["keywords"]
+
+
+def test_expand_skips_terms_already_present():
+    assert _expand("butter chicken", ["Butter Chicken", "makhani"]) == "butter chicken makhani"
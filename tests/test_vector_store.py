@@ -0,0 +1,145 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from knowledge_base.vector_store import LocalVectorBackend, LocalVectorIndex
+
+
+def _item(chunk_id, vector, text="", restaurant="Saffron"):
+    return {"id": chunk_id, "vector": vector,
+            "properties": {"chunk_id": chunk_id, "markdown": text, "restaurant_name": restaurant}}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LocalVectorIndex(str(tmp_path / "RestaurantChunk_v1"))
+    index.upsert([
+        _item("a", [1, 0, 0], "butter chicken with garlic naan"),
+        _item("b", [0, 1, 0], "paneer tikka and dal makhani", restaurant="Dhaba"),
+        _item("c", [0.9, 0.1, 0], "chicken biryani with raita"),
+    ])
+    return index
+
+
+def test_search_ranks_by_cosine(index):
+    hits = index.search([1, 0, 0], limit=2)
+    assert [h["chunk_id"] for h in hits] == ["a", "c"]
+    assert hits[0]["score"] == pytest.approx(1.0)
+    assert hits[0]["properties"]["markdown"] == "butter chicken with garlic naan"
+    assert [h["chunk_id"] for h in index.search([1, 0, 0], limit=5, chunk_ids=["b", "c"])] == ["c", "b"]
+
+
+def test_upsert_supersedes_and_delete_removes(index):
+    index.upsert([_item("a", [0, 0, 1], "masala dosa")])
+    assert index.search([0, 0, 1], limit=1)[0]["chunk_id"] == "a"
+    assert [h["chunk_id"] for h in index.keyword_search("dosa")] == ["a"]
+    assert index.keyword_search("garlic") == []
+
+    assert index.delete(["b", "missing"]) == 1
+    assert index.chunk_ids() == {"a", "c"}
+    assert index.delete(["b"]) == 0
+
+
+def test_filters_and_hybrid_search(index):
+    assert index.filter_ids({"restaurant_name": ["dhaba"]}) == {"b"}
+    assert index.filter_ids({"restaurant_name": ["Saffron"], "chunk_ids": ["a", "b"]}) == {"a"}
+    hits = index.hybrid_search("paneer", [1, 0, 0], limit=3, alpha=0.0)
+    assert hits[0]["chunk_id"] == "b"
+    hits = index.hybrid_search("chicken", [1, 0, 0], limit=3, fusion="rrf")
+    assert {h["chunk_id"] for h in hits} == {"a", "b", "c"}
+
+
+def test_state_survives_reopening(index):
+    index.upsert([_item("a", [0, 0, 1], "masala dosa")])
+    index.delete(["c"])
+    reopened = LocalVectorIndex(index.path)
+    assert reopened.chunk_ids() == {"a", "b"}
+    assert reopened.search([0, 0, 1], limit=1)[0]["chunk_id"] == "a"
+    assert [h["chunk_id"] for h in reopened.keyword_search("dosa")] == ["a"]
+
+
+def test_compact_round_trip(index):
+    index.upsert([_item("a", [0, 0, 1], "masala dosa")])
+    index.delete(["c"])
+    before = index.search([0.5, 0.5, 0.5], limit=3)
+    index.compact()
+
+    assert index.generation == "g1"
+    assert os.path.getsize(index.vectors_path) == 2 * 3 * 4
+    assert index.search([0.5, 0.5, 0.5], limit=3) == before
+    assert [h["chunk_id"] for h in index.keyword_search("dosa")] == ["a"]
+    # Writes after a compaction land in the new generation
+    index.upsert([_item("d", [0, 1, 1], "gulab jamun")])
+    assert LocalVectorIndex(index.path).chunk_ids() == {"a", "b", "d"}
+
+
+def test_compaction_keeps_the_previous_generation_only(index):
+    index.compact()
+    index.compact()
+    assert sorted(n for n in os.listdir(index.path) if n.startswith("g")) == ["g1", "g2"]
+    assert "records.jsonl" not in os.listdir(index.path)
+    index.compact()
+    assert sorted(n for n in os.listdir(index.path) if n.startswith("g")) == ["g2", "g3"]
+
+
+def test_reader_follows_compaction_by_another_process(index):
+    reader = LocalVectorIndex(index.path)
+    assert reader.chunk_ids() == {"a", "b", "c"}
+    index.delete(["c"])
+    index.compact()
+    assert reader.chunk_ids() == {"a", "b"}
+    assert reader.generation == "g1"
+    assert [h["chunk_id"] for h in reader.search([1, 0, 0], limit=3)] == ["a", "b"]
+
+
+def test_interrupted_compaction_leaves_the_index_readable(index):
+    # A crash after writing the new generation but before switching CURRENT
+    os.makedirs(os.path.join(index.path, "g1.tmp"))
+    assert LocalVectorIndex(index.path).chunk_ids() == {"a", "b", "c"}
+    index.compact()
+    assert LocalVectorIndex(index.path).chunk_ids() == {"a", "b", "c"}
+    assert not os.path.exists(os.path.join(index.path, "g1.tmp"))
+
+
+def test_searches_run_during_reloads(tmp_path):
+    path = str(tmp_path / "RestaurantChunk_v1")
+    writer = LocalVectorIndex(path)
+    rng = np.random.default_rng(0)
+    writer.upsert([_item(f"c{i}", rng.normal(size=8), f"dish {i}") for i in range(200)])
+    reader = LocalVectorIndex(path)
+    errors, stop = [], threading.Event()
+
+    def search():
+        while not stop.is_set():
+            try:
+                assert len(reader.hybrid_search("dish", rng.normal(size=8), limit=5)) == 5
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for i in range(20):
+        writer.upsert([_item(f"c{i}", rng.normal(size=8), f"dish {i} again")])
+        if i % 5 == 0:
+            writer.compact()
+    stop.set()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def test_backend_versions(tmp_path):
+    backend = LocalVectorBackend(str(tmp_path))
+    backend.ensure_collection(1)
+    backend.upsert(1, [_item("a", [1, 0])])
+    backend.ensure_collection(2)
+    assert backend.list_versions() == [1, 2]
+    assert backend.count(1) == 1
+    assert backend.search(1, "", [1, 0], filters={"restaurant_name": ["nowhere"]}) == []
+    backend.drop_version(1)
+    assert backend.list_versions() == [2]
+    backend.close()
@@ -0,0 +1,119 @@
+"""
+Concurrency controls for the async chat path.
+
+- `run_blocking` runs a synchronous dependency (HF inference client, model encode, reranker,
+  local index) on a bounded thread pool, so it never stalls the event loop and can never
+  spawn more threads than CHAT_BLOCKING_THREADS.
+- `ChatLimiter` caps how many chats run at once (MAX_CONCURRENT_CHATS); further requests
+  wait in line, and once MAX_QUEUED_CHATS are waiting new ones are turned away.
+
+`stats()` reports the current queue depths for the metrics endpoint.
+"""
+import os
+import asyncio
+import threading
+import functools
+import contextvars
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+CHAT_BLOCKING_THREADS = int(os.getenv("CHAT_BLOCKING_THREADS", "8"))
+MAX_CONCURRENT_CHATS = int(os.getenv("MAX_CONCURRENT_CHATS", "16"))
+MAX_QUEUED_CHATS = int(os.getenv("MAX_QUEUED_CHATS", "64"))
+
+_blocking_pool = ThreadPoolExecutor(max_workers=CHAT_BLOCKING_THREADS, thread_name_prefix="chat-blocking")
+_blocking_lock = threading.Lock()
+_blocking_submitted = 0
+_blocking_running = 0
+
+
+def _tracked(fn, *args, **kwargs):
+    global _blocking_running
+    with _blocking_lock:
+        _blocking_running += 1
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        with _blocking_lock:
+            _blocking_running -= 1
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    Await a synchronous call executed on the bounded blocking pool. The call runs in a copy
+    of the caller's context, so contextvars (the request's trace binding) follow it into the
+    worker thread; `run_in_executor` alone would not carry them.
+    """
+    global _blocking_submitted
+    with _blocking_lock:
+        _blocking_submitted += 1
+    try:
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(_blocking_pool, context.run,
+                                          functools.partial(_tracked, fn, *args, **kwargs))
+    finally:
+        with _blocking_lock:
+            _blocking_submitted -= 1
+
+
+class ChatQueueFull(Exception):
+    """Raised when MAX_QUEUED_CHATS requests are already waiting for a slot."""
+
+
+class ChatLimiter:
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_CHATS, max_queued: int = MAX_QUEUED_CHATS):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self._semaphore = None
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def full(self) -> bool:
+        """True when a new request would be turned away right now."""
+        return self._semaphore is not None and self._semaphore.locked() and self.waiting >= self.max_queued
+
+    async def acquire(self):
+        """Wait for a chat slot; raises ChatQueueFull when the wait line is already full."""
+        # Created lazily so it binds to the serving event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if self.full():
+            self.rejected += 1
+            raise ChatQueueFull(f"{self.waiting} chats already waiting")
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+chat_limiter = ChatLimiter()
+
+
+def stats() -> dict:
+    with _blocking_lock:
+        running, submitted = _blocking_running, _blocking_submitted
+    return {
+        "chats_active": chat_limiter.active,
+        "chats_waiting": chat_limiter.waiting,
+        "chats_rejected": chat_limiter.rejected,
+        "max_concurrent_chats": chat_limiter.max_concurrent,
+        "blocking_running": running,
+        "blocking_queued": submitted - running,
+        "blocking_threads": CHAT_BLOCKING_THREADS,
+    }
@@ -18,8 +18,9 @@ def create_embeddings_hf(user_query):
 
 # In utils/embeddings.py
 def create_embeddings(text: str):
-    from sentence_transformers import SentenceTransformer
-    model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")  # 80MB model
-    return model.encode(text)
+    from utils.models import get_encoder
+    # Shared process-wide model (preloaded by the gunicorn master when serving), batched
+    # with concurrent callers
+    return get_encoder().encode(text)
 
 
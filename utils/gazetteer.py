@@ -0,0 +1,247 @@
+"""
+Gazetteer of known restaurants, dishes and cuisines, matched against queries with an
+Aho-Corasick automaton (one pass over the query, whatever the number of names).
+
+Names come from the knowledge graph (Restaurant and Dish nodes in Neo4j) plus a built-in
+vocabulary of cuisines and food terms. Names and queries are normalized the same way the
+BM25 index tokenizes (lowercase, Hindi transliterations folded), so "panner tika" finds
+"Paneer Tikka". The last names loaded from Neo4j are cached on disk (GAZETTEER_PATH) so the
+API can start when the graph is unreachable; the gazetteer reloads itself in the background
+every GAZETTEER_REFRESH_SECONDS.
+
+Uses `pyahocorasick` when installed, otherwise a pure-python automaton.
+"""
+import os
+import json
+import time
+import threading
+import unicodedata
+from collections import deque
+
+from dotenv import load_dotenv
+
+from knowledge_base.bm25_index import WORD_RE, fold_word
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+load_dotenv()
+
+NEO4J_URI = os.getenv("NEO4J_URI")
+NEO4J_USER = os.getenv("NEO4J_USER")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "knowledge_base", "state", "gazetteer.json")
+)
+GAZETTEER_REFRESH_SECONDS = float(os.getenv("GAZETTEER_REFRESH_SECONDS", "3600"))
+MIN_NAME_CHARS = 3
+# Words that make a "restaurant name" generic when it has nothing else ("indian_restaurants",
+# "best cafe"); such names come from URL slugs and would turn cuisine queries into filters
+GENERIC_NAME_WORDS = {"restaurant", "restaurants", "food", "foods", "best", "top", "near", "me",
+                      "places", "place", "menu", "online", "order", "delivery", "in", "the", "and", "of"}
+
+# Built-in vocabulary: kind -> {surface form: canonical term}
+VOCABULARY = {
+    "cuisine": {
+        "north indian": "north indian", "south indian": "south indian", "indian": "indian",
+        "mughlai": "mughlai", "punjabi": "punjabi", "chinese": "chinese", "indo chinese": "chinese",
+        "italian": "italian", "continental": "continental", "mexican": "mexican", "thai": "thai",
+        "japanese": "japanese", "korean": "korean", "lebanese": "lebanese", "street food": "street food",
+        "fast food": "fast food", "biryani": "biryani", "desserts": "desserts", "bakery": "bakery",
+        "cafe": "cafe", "pizza": "pizza", "burger": "burger", "rolls": "rolls", "momos": "momos",
+    },
+    "dietary": {
+        "veg": "vegetarian", "vegetarian": "vegetarian", "pure veg": "vegetarian",
+        "non veg": "non-vegetarian", "nonveg": "non-vegetarian", "non vegetarian": "non-vegetarian",
+        "vegan": "vegan", "jain": "jain", "eggless": "eggless", "gluten free": "gluten free",
+        "healthy": "healthy",
+    },
+    "course": {
+        "starter": "starter", "starters": "starter", "appetizer": "starter", "appetizers": "starter",
+        "main course": "main course", "mains": "main course", "dessert": "dessert", "sweet dish": "dessert",
+        "breakfast": "breakfast", "lunch": "lunch", "dinner": "dinner", "snacks": "snacks",
+        "beverages": "beverages", "drinks": "beverages",
+    },
+    "taste": {
+        "spicy": "spicy", "mild": "mild", "sweet": "sweet", "sour": "sour", "tangy": "tangy",
+        "creamy": "creamy", "crispy": "crispy",
+    },
+}
+
+
+def is_generic_name(name: str) -> bool:
+    """True for a restaurant name made only of vocabulary terms and generic words."""
+    words = normalize(name).split()
+    return all(w in GENERIC_NAME_WORDS or w in _VOCABULARY_WORDS for w in words)
+
+
+def normalize(text: str) -> str:
+    """Space-padded, folded word sequence, so matches always fall on word boundaries."""
+    text = unicodedata.normalize("NFKC", text or "").lower().replace("'", "").replace("’", "")
+    words = WORD_RE.findall(text)
+    return " " + " ".join(fold_word(w) for w in words) + " "
+
+
+_VOCABULARY_WORDS = {w for entries in VOCABULARY.values() for surface in entries for w in normalize(surface).split()}
+
+
+# --- Aho-Corasick ---
+class _Automaton:
+    """Minimal Aho-Corasick automaton with the pyahocorasick calls used here."""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+
+    def add_word(self, key: str, value):
+        state = 0
+        for ch in key:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            state = nxt
+        self.out[state].append(value)
+
+    def make_automaton(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def iter(self, text: str):
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for value in self.out[state]:
+                yield i, value
+
+
+class Gazetteer:
+    def __init__(self, names: dict):
+        """`names`: kind -> {surface form: canonical name}."""
+        self.names = names
+        self.automaton = ahocorasick.Automaton() if ahocorasick else _Automaton()
+        keys = {}
+        for kind, entries in names.items():
+            for surface, canonical in entries.items():
+                key = normalize(surface)
+                if len(key.strip()) < MIN_NAME_CHARS:
+                    continue
+                if kind == "restaurant" and is_generic_name(surface):
+                    # A hard restaurant filter must come from a distinctive name
+                    continue
+                # One key can name several things (a dish and a restaurant called "Biryani")
+                keys.setdefault(key, []).append((kind, canonical))
+        for key, entries in keys.items():
+            self.automaton.add_word(key, (len(key), tuple(entries)))
+        if keys:
+            self.automaton.make_automaton()
+        self.size = len(keys)
+
+    def match(self, text: str) -> list[tuple[str, str, str]]:
+        """
+        Leftmost-longest, non-overlapping (kind, canonical name, matched text) in `text`.
+        """
+        if not self.size:
+            return []
+        norm = normalize(text)
+        spans = []
+        for end, (length, entries) in self.automaton.iter(norm):
+            # Keys are space-padded; the padding is shared with neighbouring matches
+            spans.append((end - length + 2, end, entries))
+        spans.sort(key=lambda s: (s[0], -(s[1] - s[0])))
+        found, last_end = [], 0
+        for start, stop, entries in spans:
+            if start < last_end:
+                continue
+            last_end = stop
+            for kind, canonical in entries:
+                found.append((kind, canonical, norm[start:stop]))
+        return found
+
+    # --- Loading ---
+    @classmethod
+    def from_neo4j(cls, driver=None):
+        """Restaurant and dish names from the graph, merged with the built-in vocabulary."""
+        from neo4j import GraphDatabase
+        own_driver = driver is None
+        if own_driver:
+            driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+        try:
+            with driver.session() as session:
+                restaurants = [r["name"] for r in session.run("MATCH (r:Restaurant) RETURN DISTINCT r.name AS name") if r["name"]]
+                dishes = [r["name"] for r in session.run("MATCH (d:Dish) RETURN DISTINCT d.name AS name") if r["name"]]
+        finally:
+            if own_driver:
+                driver.close()
+        graph_names = {"restaurant": {n: n for n in restaurants}, "dish": {n: n for n in dishes}}
+        save_graph_names(graph_names)
+        print(f"Gazetteer loaded {len(restaurants)} restaurants and {len(dishes)} dishes from Neo4j")
+        return cls({**VOCABULARY, **graph_names})
+
+    @classmethod
+    def from_cache(cls):
+        graph_names = {}
+        if os.path.exists(GAZETTEER_PATH):
+            with open(GAZETTEER_PATH, "r", encoding="utf-8") as f:
+                graph_names = json.load(f)
+        return cls({**VOCABULARY, **graph_names})
+
+
+def save_graph_names(graph_names: dict):
+    os.makedirs(os.path.dirname(GAZETTEER_PATH), exist_ok=True)
+    tmp_path = f"{GAZETTEER_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(graph_names, f, ensure_ascii=False)
+    os.replace(tmp_path, GAZETTEER_PATH)
+
+
+# --- Shared instance ---
+_gazetteer = None
+_loaded_at = 0.0
+_refreshing = threading.Lock()
+
+
+def _reload():
+    global _gazetteer, _loaded_at
+    try:
+        _gazetteer = Gazetteer.from_neo4j()
+    except Exception as e:
+        print(f"Could not load gazetteer from Neo4j ({e}); using cached names")
+        if _gazetteer is None:
+            _gazetteer = Gazetteer.from_cache()
+    _loaded_at = time.monotonic()
+
+
+def _background_reload():
+    try:
+        _reload()
+    finally:
+        _refreshing.release()
+
+
+def get_gazetteer() -> Gazetteer:
+    """The process-wide gazetteer; loaded on first use, then refreshed without blocking queries."""
+    if _gazetteer is None:
+        with _refreshing:
+            if _gazetteer is None:
+                _reload()
+    elif time.monotonic() - _loaded_at > GAZETTEER_REFRESH_SECONDS and _refreshing.acquire(blocking=False):
+        threading.Thread(target=_background_reload, name="gazetteer-refresh", daemon=True).start()
+    return _gazetteer
@@ -0,0 +1,85 @@
+"""
+Process-wide model singletons shared by the API, the agent's tools and retrieval.
+
+Under gunicorn (gunicorn.conf.py) the master calls `preload()` before forking, so every
+worker maps the same copy-on-write weights instead of loading its own copy; `gc.freeze()`
+afterwards keeps the garbage collector from writing to (and so duplicating) those pages.
+Served any other way, each getter loads its model on first use, once per process.
+
+`get_encoder()` and `get_batched_reranker()` wrap the models in micro-batchers
+(utils/batching.py) so concurrent chats share model calls; the batchers are created
+lazily, inside each worker.
+"""
+import gc
+import threading
+
+from langchain_agent.llm.huggingface_llm import count_tokens
+
+# Must match the model the knowledge base was embedded with (knowledge_base/embeddings.py)
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+RERANK_MAX_LENGTH = 128
+
+_lock = threading.Lock()
+_embed_model = None
+_reranker = None
+_encoder = None
+_batched_reranker = None
+
+
+def get_embed_model():
+    """The query SentenceTransformer (CPU)."""
+    global _embed_model
+    if _embed_model is None:
+        with _lock:
+            if _embed_model is None:
+                from sentence_transformers import SentenceTransformer
+                _embed_model = SentenceTransformer(EMBED_MODEL_NAME, device="cpu")  # 80MB model
+    return _embed_model
+
+
+def get_reranker():
+    """The FlashRank lightweight pairwise reranker."""
+    global _reranker
+    if _reranker is None:
+        with _lock:
+            if _reranker is None:
+                from flashrank import Ranker
+                _reranker = Ranker(max_length=RERANK_MAX_LENGTH)
+    return _reranker
+
+
+def get_encoder():
+    """Micro-batched `encode` over the shared embedding model."""
+    global _encoder
+    if _encoder is None:
+        from utils.batching import BatchedEncoder
+        model = get_embed_model()
+        with _lock:
+            if _encoder is None:
+                _encoder = BatchedEncoder(model)
+    return _encoder
+
+
+def get_batched_reranker():
+    """Micro-batched `rerank` over the shared FlashRank model."""
+    global _batched_reranker
+    if _batched_reranker is None:
+        from utils.batching import BatchedReranker
+        ranker = get_reranker()
+        with _lock:
+            if _batched_reranker is None:
+                _batched_reranker = BatchedReranker(ranker)
+    return _batched_reranker
+
+
+def preload(freeze: bool = True):
+    """Load every model now (in a preloading master, before workers fork)."""
+    get_embed_model()
+    get_reranker()
+    # Tokenizer used for token accounting and history/context budgets
+    count_tokens("warm up")
+    if freeze:
+        gc.collect()
+        # Move everything loaded so far out of GC tracking so workers never touch those pages
+        gc.freeze()
+    print(f"Preloaded {EMBED_MODEL_NAME} and FlashRank for the worker processes")
@@ -1,89 +1,204 @@
 # utils/query_processor.py
-from huggingface_hub import InferenceClient
+"""
+Local query understanding for retrieval.
+
+`preprocess_query` finds entities with the gazetteer (restaurants and dishes from the
+knowledge graph, plus cuisines, dietary/course/taste terms), reads price limits, and
+expands the query with related terms by rule. It makes no network calls and runs in tens
+of microseconds.
+
+`apreprocess_query` optionally adds terms from an LLM rewrite (QUERY_REWRITE_LLM=1). The
+rewrite is cached per normalized query, bounded by QUERY_REWRITE_TIMEOUT, and skipped for
+QUERY_REWRITE_BACKOFF seconds after a failure, so a slow endpoint never holds up a chat.
+"""
+from huggingface_hub import AsyncInferenceClient
+import re
 import json
 import os
+import time
+import asyncio
+from collections import OrderedDict
 from dotenv import load_dotenv
 
+from utils.gazetteer import get_gazetteer, normalize
+from knowledge_base.bm25_index import STOPWORDS
+
 load_dotenv()
 
+QUERY_REWRITE_LLM = os.getenv("QUERY_REWRITE_LLM", "0") == "1"
+QUERY_REWRITE_MODEL = os.getenv("QUERY_REWRITE_MODEL", "microsoft/Phi-3-mini-4k-instruct")
+QUERY_REWRITE_TIMEOUT = float(os.getenv("QUERY_REWRITE_TIMEOUT", "0.8"))
+QUERY_REWRITE_BACKOFF = float(os.getenv("QUERY_REWRITE_BACKOFF", "30"))
+QUERY_REWRITE_CACHE_SIZE = int(os.getenv("QUERY_REWRITE_CACHE_SIZE", "1024"))
+
+PRICE = r"(?:₹|rs\.?|inr)?\s*(\d+)"
+MAX_PRICE_RE = re.compile(r"\b(?:under|below|less than|within|up ?to|max(?:imum)?|at most)\s*" + PRICE, re.IGNORECASE)
+MIN_PRICE_RE = re.compile(r"\b(?:above|over|more than|min(?:imum)?|at least)\s*" + PRICE, re.IGNORECASE)
+BUDGET_RE = re.compile(r"\b(?:cheap|budget|affordable|inexpensive|pocket friendly)\b", re.IGNORECASE)
+
+# Canonical entity -> related terms that help both keyword and vector matching
+EXPANSIONS = {
+    "vegetarian": ["veg", "pure veg"],
+    "non-vegetarian": ["chicken", "mutton", "egg", "fish"],
+    "vegan": ["plant based", "dairy free"],
+    "jain": ["no onion no garlic"],
+    "healthy": ["salad", "grilled", "low calorie"],
+    "south indian": ["dosa", "idli", "vada", "uttapam"],
+    "north indian": ["curry", "naan", "roti", "paneer"],
+    "mughlai": ["kebab", "biryani", "korma"],
+    "chinese": ["noodles", "manchurian", "fried rice"],
+    "italian": ["pasta", "pizza"],
+    "street food": ["chaat", "pani puri", "pav bhaji"],
+    "dessert": ["sweets", "ice cream", "gulab jamun"],
+    "desserts": ["sweets", "ice cream", "gulab jamun"],
+    "starter": ["appetizer", "snacks"],
+    "main course": ["curry", "thali"],
+    "breakfast": ["poha", "paratha", "idli"],
+    "beverages": ["drinks", "lassi", "shake"],
+    "spicy": ["chilli", "hot"],
+    "creamy": ["makhani", "malai"],
+}
+ENTITY_KEYS = {"restaurant": "restaurants", "dish": "dishes", "cuisine": "cuisines",
+               "dietary": "dietary", "course": "courses", "taste": "tastes"}
+
+_rewrite_cache = OrderedDict()
+_rewrite_client = None
+_rewrite_failed_at = 0.0
+
+
 def preprocess_query(user_query: str):
     """
-    Process user query using a Hugging Face model to improve retrieval.
-    Uses free Hugging Face inference API.
-    
+    Understand the query locally to improve retrieval.
+
     Returns:
-        tuple: (processed_query, entities)
-    """
-    # Initialize the Hugging Face Inference client (no API key needed for free tier)
-    client = InferenceClient(token=os.getenv("HUGGINGFACE_API_KEY"))
-    
-    # Using a smaller open model that's available for free inference
-    model_id = "gpt2" 
-    
-    prompt = f"""
-    Task: Improve this restaurant search query for database retrieval.
-    
-    Original query: "{user_query}"
-    
-    1. Rewrite the query to be more specific.
-    2. Identify key entities (restaurants, dishes, cuisine types).
-    3. List related terms that could improve search.
-    
-    Format your response as JSON with keys:
-    - processed_query
-    - entities
-    - expansion_terms
+        tuple: (processed_query, entities) where processed_query is the original query
+        plus expansion terms, and entities maps restaurants/dishes/cuisines/dietary/
+        courses/tastes to canonical names, with max_price/min_price/budget when stated.
     """
-    
+    entities = {key: [] for key in ENTITY_KEYS.values()}
+    expansion = []
+    gazetteer = get_gazetteer()
+
+    for kind, canonical, _ in gazetteer.match(user_query):
+        bucket = entities[ENTITY_KEYS[kind]]
+        if canonical not in bucket:
+            bucket.append(canonical)
+        # Misspelled or transliterated names also search under their canonical spelling
+        expansion.append(canonical)
+        expansion.extend(EXPANSIONS.get(canonical, []))
+
+    max_price = MAX_PRICE_RE.search(user_query)
+    if max_price:
+        entities["max_price"] = int(max_price.group(1))
+    min_price = MIN_PRICE_RE.search(user_query)
+    if min_price:
+        entities["min_price"] = int(min_price.group(1))
+    if BUDGET_RE.search(user_query):
+        entities["budget"] = True
+        expansion.extend(["affordable", "budget"])
+
+    if not gazetteer.size or not any(entities[key] for key in ENTITY_KEYS.values()):
+        # Nothing known matched: keep capitalized words as candidate names
+        entities["keywords"] = extract_keywords_from_query(user_query)
+
+    return _expand(user_query, expansion), {k: v for k, v in entities.items() if v}
+
+
+async def apreprocess_query(user_query: str):
+    """`preprocess_query`, plus LLM-suggested terms when QUERY_REWRITE_LLM is enabled."""
+    processed_query, entities = preprocess_query(user_query)
+    if QUERY_REWRITE_LLM:
+        terms = await arewrite_query(user_query)
+        if terms:
+            processed_query = _expand(processed_query, terms)
+            entities["llm_terms"] = terms
+    return processed_query, entities
+
+
+async def arewrite_query(user_query: str) -> list[str]:
+    """Related search terms from the LLM; [] on timeout, error or during backoff."""
+    global _rewrite_client, _rewrite_failed_at
+    key = normalize(user_query)
+    if key in _rewrite_cache:
+        _rewrite_cache.move_to_end(key)
+        return _rewrite_cache[key]
+    if time.monotonic() - _rewrite_failed_at < QUERY_REWRITE_BACKOFF:
+        return []
+    if _rewrite_client is None:
+        _rewrite_client = AsyncInferenceClient(token=os.getenv("HUGGINGFACE_API_KEY"))
+
+    prompt = (
+        "List up to 5 short search terms (dish names, cuisines, ingredients) that would help find "
+        f"restaurant menu passages for this query: \"{user_query}\". "
+        "Answer with a JSON array of strings only."
+    )
     try:
-        # Use the Hugging Face text generation API
-        response = client.text_generation(
-            prompt,
-            model=model_id,
-            max_new_tokens=256,
-            temperature=0.1
+        response = await asyncio.wait_for(
+            _rewrite_client.chat_completion(
+                messages=[{"role": "user", "content": prompt}],
+                model=QUERY_REWRITE_MODEL,
+                max_tokens=64,
+                temperature=0.1
+            ),
+            timeout=QUERY_REWRITE_TIMEOUT
         )
-        
-        # Try to extract JSON from the response
-        # The response might not be perfectly formatted JSON
-        response_text = response.strip()
-        
-        # Find JSON-like content between braces
-        import re
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        
-        if json_match:
-            try:
-                parsed = json.loads(json_match.group(0))
-                expanded_query = f"{user_query} {parsed.get('processed_query', '')} {' '.join(parsed.get('expansion_terms', []))}"
-                return expanded_query, parsed.get('entities', {})
-            except json.JSONDecodeError:
-                pass
-        
-        # If JSON parsing fails, try rule-based extraction
-        # Simple keyword extraction fallback
-        keywords = extract_keywords_from_query(user_query)
-        return f"{user_query} {' '.join(keywords)}", {}
-        
+        terms = _parse_terms(response.choices[0].message.content or "")
     except Exception as e:
-        print(f"Query preprocessing failed: {e}, using original query")
-        return user_query, {}
+        _rewrite_failed_at = time.monotonic()
+        print(f"Query rewrite skipped: {type(e).__name__} {e}")
+        return []
+
+    _rewrite_cache[key] = terms
+    if len(_rewrite_cache) > QUERY_REWRITE_CACHE_SIZE:
+        _rewrite_cache.popitem(last=False)
+    return terms
+
+
+def _parse_terms(text: str) -> list[str]:
+    json_match = re.search(r'\[.*?\]', text, re.DOTALL)
+    if json_match:
+        try:
+            terms = json.loads(json_match.group(0))
+            return [str(t).strip() for t in terms if str(t).strip()][:5]
+        except json.JSONDecodeError:
+            pass
+    return [t.strip(" -*\"'") for t in re.split(r"[,\n]", text) if t.strip(" -*\"'")][:5]
+
+
+def _words(text: str) -> str:
+    return " " + " ".join(re.findall(r"\w+", text.lower())) + " "
+
+
+def _expand(query: str, terms: list[str]) -> str:
+    """Append terms the query does not already contain (spelled exactly so)."""
+    seen = _words(query)
+    added = []
+    for term in terms:
+        norm = _words(term)
+        if norm.strip() and norm not in seen:
+            seen += norm
+            added.append(term)
+    return f"{query} {' '.join(added)}" if added else query
+
 
 def extract_keywords_from_query(query):
-    """Simple keyword extraction fallback if the model fails"""
+    """Simple keyword extraction fallback if the gazetteer finds nothing"""
     # List of food-related terms to look for
-    food_terms = ["spicy", "sweet", "sour", "vegetarian", "vegan", "non-veg", 
+    food_terms = ["spicy", "sweet", "sour", "vegetarian", "vegan", "non-veg",
                  "appetizer", "main course", "dessert", "breakfast", "lunch", "dinner"]
-    
+
     # List of cuisine types
     cuisines = ["indian", "chinese", "italian", "mexican", "thai", "japanese"]
-    
+
     # Extract words that match our lists or are capitalized (potential restaurant/dish names)
-    words = query.lower().split()
     extracted = []
-    
-    for word in words:
-        if word in food_terms or word in cuisines or word[0].isupper():
+
+    for word in query.split():
+        word = word.strip(".,!?;:\"'()")
+        if not word:
+            continue
+        # Check capitalization on the original word, before lowercasing
+        if word.lower() in food_terms or word.lower() in cuisines or (word[0].isupper() and word.lower() not in STOPWORDS):
             extracted.append(word)
-    
-    return extracted
\ No newline at end of file
+
+    return extracted